@@ -25,7 +25,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 2
 
 ENV_FILE = "/var/snap/microovn/common/data/env/ovn.env"
 CONNECT_ENV_NAME = "OVN_{0}_CONNECT"
@@ -114,8 +114,13 @@ class OVSDBProvides(Object):
 
         connect_str = self.get_connection_strings()
         if connect_str:
-            relation.data[self.charm.app][CONNECT_STR_KEY.format("nb")] = connect_str.nb
-            relation.data[self.charm.app][CONNECT_STR_KEY.format("sb")] = connect_str.sb
+            # One relation-set for both, ops leaves out the unchanged keys.
+            relation.data[self.charm.app].update(
+                {
+                    CONNECT_STR_KEY.format("nb"): connect_str.nb,
+                    CONNECT_STR_KEY.format("sb"): connect_str.sb,
+                }
+            )
             logger.info("connection strings updated")
 
     def get_connection_strings(self) -> Optional[OVSDBConnectionString]:
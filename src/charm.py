@@ -8,6 +8,7 @@ This charm provides logic for managing a microovn cluster and any relations with
 other charms it may need
 """
 
+import json
 import logging
 import os
 import socket
@@ -16,40 +17,56 @@ from functools import cached_property
 
 import ops
 from charms.grafana_agent.v0.cos_agent import COSAgentProvider
-from charms.microcluster_token_distributor.v0.token_distributor import TokenConsumer
 from charms.microovn.v0.ovsdb import OVSDBProvides
 from charms.ovn_central_k8s.v0.ovsdb import OVSDBCMSRequires
 from charms.tls_certificates_interface.v4.tls_certificates import Mode, TLSCertificatesRequiresV4
 
+from command_runner import CommandRunner, parse_timeouts
 from config import CharmConfig
 from constants import (
     ALERT_RULES_DIR,
     APT_OVS_CONF_DB,
     APT_OVS_PACKAGES,
     APT_OVS_SERVICE,
+    BASE_SNAP_RESOURCE,
     CERTIFICATES_RELATION,
+    COMMAND_LATENCY_FILE,
     CSR_ATTRIBUTES,
     DASHBOARDS_DIR,
     MICROOVN_OVS_CONF_DB,
     MICROOVN_OVSDB_DIR,
     MICROOVN_SNAP_COMMON,
+    MICROOVN_SNAP_RESOURCE,
     MICROOVN_TRACK,
     OVN_EXPORTER_METRICS_ENDPOINT,
     OVN_EXPORTER_METRICS_PATH,
     OVN_EXPORTER_PLUGS,
     OVN_EXPORTER_PORT,
+    OVN_EXPORTER_SNAP_RESOURCE,
     OVN_EXPORTER_TRACK,
     OVSDB_RELATION,
     OVSDBCMD_RELATION,
+    PEER_RELATION,
     ROLE_ASSIGNMENT_RELATION,
+    SNAP_ASSERTIONS_RESOURCE,
     SNAPD_CHANNEL,
+    SNAPD_SNAP_RESOURCE,
+    UPDATE_STATUS_DEADLINE,
     WORKER_RELATION,
 )
+from microovn_client import MicroovnClient
 from role_handler import RoleHandler
+from rolling_refresh import RollingRefresh
 from snap_manager import SnapManager
+from snapd_client import ChangeProgress
+from token_consumer import MicroovnTokenConsumer
 from utils import (
+    METRICS_PROBE_DEADLINE,
+    CommandCache,
+    ProbeRunner,
     call_microovn_command,
     check_metrics_endpoint,
+    cluster_status,
     microovn_central_exists,
     wait_for_microovn_ready,
 )
@@ -63,6 +80,12 @@ class MicroovnCharm(ops.CharmBase):
     def __init__(self, framework: ops.Framework):
         super().__init__(framework)
 
+        # Every dispatch starts from a fresh view of the installed snaps and
+        # of the cluster.
+        SnapManager.reset_cache()
+        CommandCache.reset()
+        MicroovnClient.reset_stats()
+
         self.certificates = TLSCertificatesRequiresV4(
             charm=self,
             relationship_name=CERTIFICATES_RELATION,
@@ -75,7 +98,7 @@ class MicroovnCharm(ops.CharmBase):
             relation_name=OVSDB_RELATION,
         )
 
-        self.token_consumer = TokenConsumer(
+        self.token_consumer = MicroovnTokenConsumer(
             charm=self, relation_name=WORKER_RELATION, command_name=["microovn", "cluster"]
         )
 
@@ -104,7 +127,10 @@ class MicroovnCharm(ops.CharmBase):
             refresh_events=[self.on.config_changed],
         )
 
+        # The attached snap resources by name, fetched once per dispatch.
+        self._snap_resources: dict[str, str | None] = {}
         self.typed_config = self.load_config(CharmConfig, errors="blocked")
+        CommandRunner.reset(parse_timeouts(self.typed_config.command_timeouts))
         self.role_handler = RoleHandler(charm=self, relation_name=ROLE_ASSIGNMENT_RELATION)
         framework.observe(
             self.role_handler.requirer.on.role_assignment_changed,
@@ -114,6 +140,10 @@ class MicroovnCharm(ops.CharmBase):
             self.role_handler.requirer.on.role_assignment_revoked,
             self._on_role_assignment_revoked,
         )
+        self.rolling_refresh = RollingRefresh(
+            self, PEER_RELATION, refresh=self._refresh_microovn, healthy=self._is_healthy
+        )
+        framework.observe(self.rolling_refresh.on.refreshed, self._on_update_status)
         framework.observe(self.on.install, self._on_install)
         framework.observe(self.on[WORKER_RELATION].relation_changed, self._on_cluster_changed)
         framework.observe(self.on.update_status, self._on_update_status)
@@ -129,6 +159,8 @@ class MicroovnCharm(ops.CharmBase):
         framework.observe(self.token_consumer.on.prejoin, self._on_prebootstrap_or_prejoin)
         framework.observe(self.token_consumer.on.prebootstrap, self._on_prebootstrap_or_prejoin)
         framework.observe(self.on.config_changed, self._on_config_changed)
+        framework.observe(self.on.command_latency_action, self._on_command_latency_action)
+        framework.observe(framework.on.commit, self._on_commit)
 
     # PROPERTIES
 
@@ -178,30 +210,61 @@ class MicroovnCharm(ops.CharmBase):
 
     # HANDLERS
 
+    def _on_commit(self, _: ops.EventBase) -> None:
+        """Report the caches usage, snapd and microovn latencies of this dispatch."""
+        SnapManager.log_stats()
+        MicroovnClient.log_stats()
+        CommandCache.log_stats()
+        CommandRunner.save(self.charm_dir / COMMAND_LATENCY_FILE)
+
+    def _on_command_latency_action(self, event: ops.ActionEvent) -> None:
+        """Dump the latency histograms of the workload commands."""
+        event.set_results(
+            {"histograms": json.dumps(CommandRunner.load(self.charm_dir / COMMAND_LATENCY_FILE))}
+        )
+
     def _on_update_status(self, _: ops.EventBase) -> None:
         """Update the unit status."""
+        # One deadline for the whole hook, which every probe is waited on within.
+        probes = ProbeRunner(UPDATE_STATUS_DEADLINE)
         if not self.is_in_cluster:
             self.unit.status = ops.BlockedStatus(
                 "Not in cluster. Waiting for token distrbutor relation"
             )
             return
 
+        # The token consumer observed this event first and may have left its
+        # work to a later hook, waiting on pending nodes to join.
+        if self.token_consumer.waiting_on_pending:
+            self.unit.status = ops.WaitingStatus("Waiting on pending nodes to join the cluster")
+            return
+
+        # Neither probe depends on the roles, so they run while the roles are
+        # enforced. They are given the time left, so none outlives the hook.
+        probes.start(
+            "metrics",
+            lambda: check_metrics_endpoint(
+                OVN_EXPORTER_METRICS_ENDPOINT, min(METRICS_PROBE_DEADLINE, probes.remaining())
+            ),
+        )
+        if not self.has_ovsdbcmd_relation:
+            probes.start("central", lambda: microovn_central_exists(probes.remaining()))
+
         # Re-evaluate role assignment constraints on every status check
         if self.role_handler.has_relation:
             self.role_handler.enforce_roles()
             if isinstance(self.unit.status, (ops.BlockedStatus, ops.WaitingStatus)):
                 return
 
-        if self.is_in_cluster and not self.has_ovsdbcmd_relation and not microovn_central_exists():
-            self.unit.status = ops.BlockedStatus(
-                (
-                    "microovn has no central nodes, this could either be due to a "
-                    "recently broken ovsdb-cms relation or a configuration issue"
-                )
-            )
+        if not self.has_ovsdbcmd_relation and (status := self._central_probe_status(probes)):
+            self.unit.status = status
             return
 
-        if self.is_in_cluster and not check_metrics_endpoint(OVN_EXPORTER_METRICS_ENDPOINT):
+        metrics = probes.result("metrics")
+        if metrics is None:
+            self.unit.status = self._probe_timed_out("ovn-exporter metrics")
+            return
+        if not metrics:
             self.unit.status = ops.BlockedStatus(
                 "ovn-exporter metrics endpoint is not responding, check snap service status"
             )
@@ -209,12 +272,40 @@ class MicroovnCharm(ops.CharmBase):
 
         self.unit.status = ops.ActiveStatus()
 
+    def _central_probe_status(self, probes: ProbeRunner) -> ops.StatusBase | None:
+        """Return the status a failed central probe calls for, None if it passed."""
+        central = probes.result("central")
+        if central is None:
+            return self._probe_timed_out("microovn central")
+        if not central:
+            return ops.BlockedStatus(
+                (
+                    "microovn has no central nodes, this could either be due to a "
+                    "recently broken ovsdb-cms relation or a configuration issue"
+                )
+            )
+        return None
+
+    @staticmethod
+    def _probe_timed_out(probe: str) -> ops.StatusBase:
+        return ops.WaitingStatus(f"{probe} check timed out, checking again on next update-status")
+
     def _on_config_changed(self, event: ops.ConfigChangedEvent):
-        if self.microovn_snap_channel != self.microovn_snap_client.snap_client.channel:
-            self.unit.status = ops.MaintenanceStatus("Refreshing MicroOVN snap")
-            self.microovn_snap_client.install()
-            self._on_update_status(event)
-        if self.ovn_exporter_snap_channel != self.ovn_exporter_snap_client.snap_client.channel:
+        # Snaps installed from an attached resource are pinned to its revision.
+        if (
+            self.microovn_snap_channel != self.microovn_snap_client.snap_client.channel
+            and self._snap_resource(MICROOVN_SNAP_RESOURCE) is None
+        ):
+            # Refreshing restarts ovn-controller, so the units take turns unless
+            # there are no peers to coordinate with yet.
+            if not self.rolling_refresh.request(self.microovn_snap_channel):
+                self.unit.status = ops.MaintenanceStatus("Refreshing MicroOVN snap")
+                self.microovn_snap_client.install()
+                self._on_update_status(event)
+        if (
+            self.ovn_exporter_snap_channel != self.ovn_exporter_snap_client.snap_client.channel
+            and self._snap_resource(OVN_EXPORTER_SNAP_RESOURCE) is None
+        ):
             self.unit.status = ops.MaintenanceStatus("Refreshing OVN exporter snap")
             self.ovn_exporter_snap_client.install()
             self._on_update_status(event)
@@ -292,7 +383,7 @@ class MicroovnCharm(ops.CharmBase):
         if os.path.exists(MICROOVN_OVS_CONF_DB) or not os.path.exists(APT_OVS_CONF_DB):
             return
 
-        service_check = subprocess.run(
+        service_check = CommandRunner.run(
             ["systemctl", "list-unit-files", APT_OVS_SERVICE],
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
@@ -301,11 +392,11 @@ class MicroovnCharm(ops.CharmBase):
         if service_check.returncode != 0:
             return
 
-        subprocess.run(["mkdir", "-p", MICROOVN_OVSDB_DIR])
-        subprocess.run(["cp", APT_OVS_CONF_DB, MICROOVN_OVSDB_DIR])
-        subprocess.run(["systemctl", "disable", "--now", APT_OVS_SERVICE])
-        subprocess.run(["modprobe", "-r", "openvswitch"])
-        subprocess.run(["modprobe", "openvswitch"])
+        CommandRunner.run(["mkdir", "-p", MICROOVN_OVSDB_DIR])
+        CommandRunner.run(["cp", APT_OVS_CONF_DB, MICROOVN_OVSDB_DIR])
+        CommandRunner.run(["systemctl", "disable", "--now", APT_OVS_SERVICE])
+        CommandRunner.run(["modprobe", "-r", "openvswitch"])
+        CommandRunner.run(["modprobe", "openvswitch"])
 
         # Some services such as netplan check for ovs-vsctl in usr/bin before
         # snap/bin to work out which to use, we want it using ovs-vsctl provided
@@ -314,11 +405,13 @@ class MicroovnCharm(ops.CharmBase):
         # and is a bad solution but we do not have a better one.
         #
         # I hope this code is not here for long. (17/04/26)
-        subprocess.run(["rm", "-f", "/usr/bin/ovs-vsctl"])
+        CommandRunner.run(["rm", "-f", "/usr/bin/ovs-vsctl"])
 
         # Removes existing OVS as two versions of openvswitch running at once
         # causes many issues we would like to avoid.
-        subprocess.run(["apt", "remove", "-y", "--allow-change-held-packages", *APT_OVS_PACKAGES])
+        CommandRunner.run(
+            ["apt", "remove", "-y", "--allow-change-held-packages", *APT_OVS_PACKAGES]
+        )
 
     def _on_prebootstrap_or_prejoin(self, event: ops.EventBase) -> None:
         """Handle the pre join/pre bootstrap hook."""
@@ -341,21 +434,35 @@ class MicroovnCharm(ops.CharmBase):
         """Handle the install event."""
         # Allow the user to force install microovn alongside possible existing
         # Open vSwitch instance.
-        subprocess.run(["mkdir", "-p", MICROOVN_SNAP_COMMON])
-        subprocess.run(["touch", MICROOVN_SNAP_COMMON + "/break_system_ovs"])
+        CommandRunner.run(["mkdir", "-p", MICROOVN_SNAP_COMMON])
+        CommandRunner.run(["touch", MICROOVN_SNAP_COMMON + "/break_system_ovs"])
+
+        dangerous = self._use_snap_resources()
+        if dangerous is None:
+            # Tried again once the assertions are attached or dangerous snaps allowed.
+            event.defer()
+            return
 
         self.unit.status = ops.MaintenanceStatus(f"Installing {self.snapd_snap_client.name} snap")
         if not self.snapd_snap_client.install():
             logger.error("Failed to install %s snap", self.snapd_snap_client.name)
             raise RuntimeError(f"Failed to install {self.snapd_snap_client.name} snap")
 
-        snaps = [self.ovn_exporter_snap_client, self.microovn_snap_client]
+        base = self._snap_resource(BASE_SNAP_RESOURCE)
+        if base is not None and not SnapManager.install_local(base, dangerous):
+            logger.error(
+                "Failed to install the base snap from the %s resource", BASE_SNAP_RESOURCE
+            )
+            raise RuntimeError("Failed to install the base snap")
 
-        for snap in snaps:
-            self.unit.status = ops.MaintenanceStatus(f"Installing {snap.name} snap")
-            if not snap.install():
-                logger.error("Failed to install %s snap", snap.name)
-                raise RuntimeError(f"Failed to install {snap.name} snap")
+        # snapd restarts itself when refreshed, so the remaining snaps are only
+        # submitted together once it is in place.
+        snaps = [self.ovn_exporter_snap_client, self.microovn_snap_client]
+        names = ", ".join(snap.name for snap in snaps)
+        self.unit.status = ops.MaintenanceStatus(f"Installing {names} snaps")
+        for snap in SnapManager.install_many(snaps, progress=self._on_snap_progress):
+            logger.error("Failed to install %s snap", snap.name)
+            raise RuntimeError(f"Failed to install {snap.name} snap")
 
         # Stop the services until microovn is bootstrapped
         self.ovn_exporter_snap_client.disable_and_stop()
@@ -400,6 +507,101 @@ class MicroovnCharm(ops.CharmBase):
 
     # HELPERS
 
+    def _refresh_microovn(self, channel: str) -> bool:
+        """Refresh the microovn snap once this unit holds the refresh lock."""
+        self.microovn_snap_client.channel = channel
+        return self.microovn_snap_client.install()
+
+    def _is_healthy(self) -> bool:
+        """Check microovn, and its exporter once in the cluster, are healthy."""
+        if not wait_for_microovn_ready():
+            return False
+        # The refresh restarted the daemon, what was read before it is stale.
+        CommandCache.invalidate()
+        status = cluster_status()
+        if status is None or (status.local is not None and not status.local.online):
+            return False
+        return not self.is_in_cluster or check_metrics_endpoint(OVN_EXPORTER_METRICS_ENDPOINT)
+
+    def _snap_resource(self, name: str) -> str | None:
+        """Return the path of an attached snap resource, None to use the store instead.
+
+        Each resource is only fetched once per dispatch.
+        """
+        if name not in self._snap_resources:
+            self._snap_resources[name] = self._fetch_snap_resource(name)
+        return self._snap_resources[name]
+
+    def _fetch_snap_resource(self, name: str) -> str | None:
+        try:
+            path = self.model.resources.fetch(name)
+        except (ops.ModelError, NameError):
+            return None
+        # An empty file is attached when the snap should come from the store.
+        if path.stat().st_size == 0:
+            return None
+        return str(path)
+
+    def _use_snap_resources(self) -> bool | None:
+        """Install the snaps from their attached resources rather than the store.
+
+        Snaps attached without their assertions are only installed in
+        dangerous mode when allow_dangerous_snaps is set, the unit is blocked
+        otherwise.
+
+        Returns:
+            Whether the snaps have to be installed in dangerous mode, None
+            when they cannot be installed yet.
+        """
+        assertions = self._snap_resource(SNAP_ASSERTIONS_RESOURCE)
+        attached = [
+            resource
+            for resource in (
+                SNAPD_SNAP_RESOURCE,
+                OVN_EXPORTER_SNAP_RESOURCE,
+                MICROOVN_SNAP_RESOURCE,
+                BASE_SNAP_RESOURCE,
+            )
+            if self._snap_resource(resource) is not None
+        ]
+        dangerous = assertions is None
+        if attached and dangerous:
+            if not self.typed_config.allow_dangerous_snaps:
+                logger.error(
+                    "Refusing to install %s without the %s resource",
+                    ", ".join(attached),
+                    SNAP_ASSERTIONS_RESOURCE,
+                )
+                self.unit.status = ops.BlockedStatus(
+                    f"Attach the {SNAP_ASSERTIONS_RESOURCE} resource or set allow_dangerous_snaps"
+                )
+                return None
+            logger.warning(
+                "Installing %s in dangerous mode, without their assertions", ", ".join(attached)
+            )
+        if assertions is not None and not SnapManager.ack_assertions(assertions):
+            raise RuntimeError("Failed to acknowledge the attached snap assertions")
+
+        for snap, resource in (
+            (self.snapd_snap_client, SNAPD_SNAP_RESOURCE),
+            (self.ovn_exporter_snap_client, OVN_EXPORTER_SNAP_RESOURCE),
+            (self.microovn_snap_client, MICROOVN_SNAP_RESOURCE),
+        ):
+            if (path := self._snap_resource(resource)) is not None:
+                logger.info("Installing %s snap from the %s resource", snap.name, resource)
+                snap.use_local_snap(path, dangerous)
+        return dangerous
+
+    def _on_snap_progress(self, progress: ChangeProgress) -> None:
+        """Show the progress of the slowest running snap change in the unit status."""
+        if progress.total <= 0:
+            return
+        # Only update the status in steps of 10% to limit status-set calls.
+        percent = int(progress.fraction * 10) * 10
+        message = f"{progress.summary} ({percent}%)"
+        if self.unit.status.message != message:
+            self.unit.status = ops.MaintenanceStatus(message)
+
     def _set_central_ips_config(self) -> bool:
         """Set the ovn.central-ips config in microovn."""
         address = self.ovsdbcms_requires.loadbalancer_address()
@@ -415,6 +617,12 @@ class MicroovnCharm(ops.CharmBase):
             return False
         return True
 
+    def _central_enabled_locally(self) -> bool:
+        """Return whether central may be enabled on this unit, as the cluster status shows."""
+        status = cluster_status()
+        local = status.local if status is not None else None
+        return local is None or "central" in local.services
+
     def _dataplane_mode(self) -> bool:
         """Try to switch microovn to dataplane mode."""
         logger.info("Checking dataplane mode")
@@ -429,20 +637,20 @@ class MicroovnCharm(ops.CharmBase):
             )
             return True
 
-        res = call_microovn_command("disable", "central", "--allow-disable-last-central")
-        if res.returncode != 0:
-            if "this service is not enabled" in res.stderr:
-                logger.info("Central service already disabled")
-            else:
+        if self._central_enabled_locally():
+            res = call_microovn_command("disable", "central", "--allow-disable-last-central")
+            if res.returncode != 0 and "this service is not enabled" not in res.stderr:
                 logger.error(
                     "Disabling central failed with error code %s, stderr: %s",
                     res.returncode,
                     res.stderr,
                 )
                 raise RuntimeError(f"Disabling central failed with error code {res.returncode}")
+        else:
+            logger.info("Central service already disabled")
 
-        # Central was disabled (or already was) outside RoleHandler,
-        # invalidate the applied-roles cache so enforce_roles() re-applies.
+        # Central was disabled (or already was) outside RoleHandler, drop the
+        # workload it observed so enforce_roles() reads it again.
         self.role_handler.invalidate_applied_roles()
 
         if self.unit.is_leader():
@@ -0,0 +1,92 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""A typed model of the MicroOVN cluster status."""
+
+from __future__ import annotations
+
+import re
+import socket
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+from microovn_client import ClusterMember, ServiceLocation
+
+MEMBER_LINE = re.compile(r"^- (?P<name>\S+) \((?P<address>[^)]*)\)\s*$")
+SERVICES_LINE = re.compile(r"^\s+Services:(?P<services>.*)$")
+
+ONLINE = "ONLINE"
+
+
+@dataclass(frozen=True)
+class Member:
+    """A member of the MicroOVN cluster and the services enabled on it."""
+
+    name: str
+    address: str
+    services: FrozenSet[str]
+    online: bool = True
+
+
+@dataclass(frozen=True)
+class ClusterStatus:
+    """The members of the MicroOVN cluster, as reported by `microovn status`."""
+
+    members: Tuple[Member, ...]
+
+    @classmethod
+    def from_text(cls, text: str) -> ClusterStatus:
+        """Parse the deployment summary printed by `microovn status`.
+
+        The summary does not report the state of the members, they are
+        assumed online as the daemon answered for them.
+        """
+        members: List[Member] = []
+        for line in text.splitlines()[1:]:
+            if match := MEMBER_LINE.match(line):
+                members.append(Member(match["name"], match["address"], frozenset()))
+            elif (match := SERVICES_LINE.match(line)) and members:
+                services = frozenset(s.strip() for s in match["services"].split(",") if s.strip())
+                last = members.pop()
+                members.append(Member(last.name, last.address, services, last.online))
+            elif line.strip() and not line.startswith(" "):
+                # The database summaries that follow the deployment one.
+                break
+        return cls(tuple(members))
+
+    @classmethod
+    def from_api(
+        cls, members: Iterable[ClusterMember], services: Iterable[ServiceLocation]
+    ) -> ClusterStatus:
+        """Build the status from the cluster members and services the daemon reports."""
+        located: Dict[str, set[str]] = {}
+        for service in services:
+            located.setdefault(service.location, set()).add(service.service)
+        return cls(
+            tuple(
+                Member(
+                    name=member.name,
+                    address=member.address.rsplit(":", 1)[0],
+                    services=frozenset(located.get(member.name, ())),
+                    online=member.status.upper() == ONLINE,
+                )
+                for member in members
+            )
+        )
+
+    @property
+    def local(self) -> Member | None:
+        """Return the member of this unit, which joined the cluster under its hostname."""
+        return self.member(socket.gethostname())
+
+    def member(self, name: str) -> Member | None:
+        """Return the member of the given name, if it is in the cluster."""
+        return next((member for member in self.members if member.name == name), None)
+
+    def members_with(self, service: str) -> List[str]:
+        """Return the names of the members a service is enabled on."""
+        return [member.name for member in self.members if service in member.services]
+
+    def has_service(self, service: str) -> bool:
+        """Return whether a service is enabled on any member of the cluster."""
+        return bool(self.members_with(service))
@@ -0,0 +1,163 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Run workload commands with a timeout, keeping a latency histogram per command."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import signal
+import subprocess
+import time
+from typing import Any, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 120.0
+
+# Commands that are expected to take longer, by command name prefix.
+DEFAULT_TIMEOUTS = {
+    "apt": 600.0,
+    "microovn cluster bootstrap": 300.0,
+    "microovn cluster join": 300.0,
+    "microovn waitready": 60.0,
+}
+
+# Upper bounds in seconds of the histogram buckets, the last one is unbounded.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+INF_BUCKET = "+Inf"
+
+# The words of a command that make up its name, ie subcommands but not
+# options, paths or values.
+NAME_WORD = re.compile(r"[a-z][a-z-]{0,31}")
+NAME_WORDS = 3
+
+
+def command_name(args: Sequence[str]) -> str:
+    """Return the name a command's timeout and latencies are kept under.
+
+    This is the program and the subcommands that follow it, such as
+    "microovn cluster list" or "systemctl disable".
+    """
+    words = [os.path.basename(args[0])] if args else []
+    for arg in args[1:NAME_WORDS]:
+        if not NAME_WORD.fullmatch(arg):
+            break
+        words.append(arg)
+    return " ".join(words)
+
+
+def parse_timeouts(setting: str) -> Dict[str, float]:
+    """Parse per-command timeouts such as "microovn status=10, apt=900".
+
+    Raises:
+        ValueError: when the setting is not a list of positive timeouts.
+    """
+    timeouts: Dict[str, float] = {}
+    for item in filter(None, (item.strip() for item in setting.split(","))):
+        name, _, seconds = item.rpartition("=")
+        try:
+            timeout = float(seconds)
+        except ValueError:
+            timeout = 0
+        if not name.strip() or timeout <= 0:
+            raise ValueError(f"{item} is not a command name and a positive number of seconds")
+        timeouts[" ".join(name.split())] = timeout
+    return timeouts
+
+
+class CommandRunner:
+    """Run workload commands, killing them once they run for too long.
+
+    The latency of every command is kept for the hook dispatch and added to
+    the histograms on disk when it commits.
+    """
+
+    timeouts: Dict[str, float] = dict(DEFAULT_TIMEOUTS)
+    latencies: Dict[str, List[float]] = {}
+
+    @classmethod
+    def reset(cls, timeouts: Dict[str, float] | None = None) -> None:
+        """Drop the latencies gathered so far and apply the configured timeouts."""
+        cls.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        cls.latencies = {}
+
+    @classmethod
+    def timeout(cls, name: str) -> float:
+        """Return the timeout of a command, from its longest configured name prefix."""
+        prefixes = [
+            prefix for prefix in cls.timeouts if name == prefix or name.startswith(prefix + " ")
+        ]
+        if not prefixes:
+            return DEFAULT_TIMEOUT
+        return cls.timeouts[max(prefixes, key=len)]
+
+    @classmethod
+    def run(
+        cls, args: Sequence[str], *, timeout: float | None = None, **kwargs: Any
+    ) -> subprocess.CompletedProcess:
+        """Run a command, the keyword arguments are passed on to subprocess.run.
+
+        A command still running after its timeout is killed, and fails as if
+        by SIGKILL rather than raising.
+        """
+        name = command_name(args)
+        if timeout is None:
+            timeout = cls.timeout(name)
+        start = time.monotonic()
+        try:
+            result = subprocess.run(list(args), timeout=timeout, **kwargs)
+        except subprocess.TimeoutExpired:
+            logger.error("%s timed out after %.0fs and was killed", name, timeout)
+            result = subprocess.CompletedProcess(
+                list(args), -signal.SIGKILL, "", f"Error: timed out after {timeout:.0f}s\n"
+            )
+        cls.record(name, time.monotonic() - start)
+        return result
+
+    @classmethod
+    def record(cls, name: str, seconds: float) -> None:
+        """Add a latency to the histogram of the given name, for waits other than commands."""
+        cls.latencies.setdefault(name, []).append(seconds)
+
+    @staticmethod
+    def load(path: str | os.PathLike) -> Dict[str, Dict[str, Any]]:
+        """Load the latency histograms from a file, empty if there is none yet."""
+        try:
+            with open(path) as histograms:
+                return json.load(histograms)
+        except (OSError, ValueError):
+            return {}
+
+    @classmethod
+    def save(cls, path: str | os.PathLike) -> None:
+        """Add the latencies gathered during this dispatch to the histograms in a file.
+
+        Each histogram counts the calls of a command by the smallest bucket
+        bound their latency is within, along with their total and maximum.
+        """
+        if not cls.latencies:
+            return
+        histograms = cls.load(path)
+        for name, latencies in cls.latencies.items():
+            histogram = histograms.setdefault(
+                name,
+                {"count": 0, "sum": 0.0, "max": 0.0, "buckets": {}},
+            )
+            for latency in latencies:
+                bucket = next(
+                    (str(bound) for bound in LATENCY_BUCKETS if latency <= bound), INF_BUCKET
+                )
+                histogram["buckets"][bucket] = histogram["buckets"].get(bucket, 0) + 1
+            histogram["count"] += len(latencies)
+            histogram["sum"] = round(histogram["sum"] + sum(latencies), 3)
+            histogram["max"] = round(max(histogram["max"], *latencies), 3)
+        try:
+            with open(path, "w") as file:
+                json.dump(histograms, file, sort_keys=True)
+        except OSError as err:
+            logger.warning("Failed to save the command latencies to %s: %s", path, err)
+        cls.latencies = {}
@@ -4,8 +4,11 @@
 
 """File containing config helper functions and classes."""
 
+import re
+
 import pydantic
 
+from command_runner import parse_timeouts
 from constants import VALID_SNAP_RISKS
 
 
@@ -14,6 +17,9 @@ class CharmConfig(pydantic.BaseModel):
 
     microovn_risk: str = pydantic.Field("edge")
     ovn_exporter_risk: str = pydantic.Field("edge")
+    refresh_batch: str = pydantic.Field("1")
+    command_timeouts: str = pydantic.Field("")
+    allow_dangerous_snaps: bool = pydantic.Field(False)
 
     @pydantic.field_validator("microovn_risk", "ovn_exporter_risk")
     @classmethod
@@ -29,3 +35,21 @@ class CharmConfig(pydantic.BaseModel):
         if len(risk_parts) > 1 and risk_parts[1] == "":
             raise ValueError("risk branch cannot be an empty string")
         return risk
+
+    @pydantic.field_validator("refresh_batch")
+    @classmethod
+    def validate_refresh_batch(cls, batch: str):
+        """Ensure the refresh batch is a number of units or a percentage of them."""
+        match = re.fullmatch(r"(\d+)(%?)", batch)
+        if match is None or int(match.group(1)) == 0:
+            raise ValueError(batch + " is not a positive number of units or a percentage")
+        if match.group(2) and int(match.group(1)) > 100:
+            raise ValueError(batch + " is more than 100%")
+        return batch
+
+    @pydantic.field_validator("command_timeouts")
+    @classmethod
+    def validate_command_timeouts(cls, timeouts: str):
+        """Ensure the command timeouts are command names and positive numbers of seconds."""
+        parse_timeouts(timeouts)
+        return timeouts
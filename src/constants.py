@@ -12,6 +12,7 @@ WORKER_RELATION = "cluster"
 CERTIFICATES_RELATION = "certificates"
 OVSDBCMD_RELATION = "ovsdb-external"
 ROLE_ASSIGNMENT_RELATION = "role-assignment"
+PEER_RELATION = "microovn-peers"
 MICROOVN_TRACK = "latest"
 SNAPD_CHANNEL = "latest/edge"
 VALID_SNAP_RISKS = ["stable", "candidate", "beta", "edge"]
@@ -23,9 +24,30 @@ OVN_EXPORTER_TRACK = "latest"
 APT_OVS_CONF_DB = "/var/lib/openvswitch/conf.db"
 APT_OVS_SERVICE = "openvswitch-switch.service"
 MICROOVN_SNAP_COMMON = "/var/snap/microovn/common"
+MICROOVN_CONTROL_SOCKET = f"{MICROOVN_SNAP_COMMON}/state/control.socket"
 MICROOVN_OVSDB_DIR = f"{MICROOVN_SNAP_COMMON}/data/switch/db"
 MICROOVN_OVS_CONF_DB = f"{MICROOVN_OVSDB_DIR}/conf.db"
+MICROOVN_OVS_DB_SOCKET = f"{MICROOVN_SNAP_COMMON}/run/switch/db.sock"
 APT_OVS_PACKAGES = ["openvswitch-switch", "python3-openvswitch"]
+SNAP_BASE_CHANNEL = "latest/edge"
+SNAP_BASE_CACHE_FILE = "/var/cache/microovn-operator/snap-bases.json"
+# Seconds each update-status health probe has to finish.
+UPDATE_STATUS_DEADLINE = 20.0
+# How many cluster join tokens are generated at once on a bulk scale out.
+TOKEN_WORKERS = 8
+# How long a hook waits for pending cluster members to join, the wait is then
+# left to a later hook rather than holding this one. Members already pending
+# for longer than that when a hook starts are not waited for again.
+PENDING_WAIT_TIMEOUT = 60
+PENDING_BACKOFF_INITIAL = 0.5
+PENDING_BACKOFF_MAX = 8
+# Relative to the charm directory, which the unit state is kept in as well.
+COMMAND_LATENCY_FILE = ".command-latency.json"
+MICROOVN_SNAP_RESOURCE = "microovn-snap"
+OVN_EXPORTER_SNAP_RESOURCE = "ovn-exporter-snap"
+SNAPD_SNAP_RESOURCE = "snapd-snap"
+BASE_SNAP_RESOURCE = "base-snap"
+SNAP_ASSERTIONS_RESOURCE = "snap-assertions"
 
 OVN_EXPORTER_PLUGS: List[Tuple[str, str | None]] = [
     ("ovn-chassis", "microovn:ovn-chassis"),
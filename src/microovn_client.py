@@ -0,0 +1,244 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""A client for the MicroOVN daemon's REST API on its control socket."""
+
+from __future__ import annotations
+
+import http.client
+import json
+import logging
+import os
+import re
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence
+
+from constants import MICROOVN_CONTROL_SOCKET
+from snapd_client import RECONNECT_ERRORS, ConnectionPool, RequestStats
+
+logger = logging.getLogger(__name__)
+
+# Statuses the daemon answers a request it does not implement with, ie an
+# older MicroOVN, in which case the CLI is used instead. Any other error, such
+# as a 400 for a request it refused, is the command's own result.
+UNSUPPORTED_STATUSES = (404, 405, 501)
+
+READY_POLL_INTERVAL = 0.5
+
+PEM_BLOCK = re.compile(r"-----BEGIN ([A-Z ]+)-----.*?-----END \1-----", re.S)
+
+
+class MicroovnAPIError(Exception):
+    """Raised when the MicroOVN daemon fails a request."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+    @property
+    def unsupported(self) -> bool:
+        """Return whether the daemon does not implement the request."""
+        return self.status in UNSUPPORTED_STATUSES
+
+
+@dataclass(frozen=True)
+class ClusterMember:
+    """A member of the MicroOVN cluster."""
+
+    name: str
+    address: str
+    role: str
+    status: str
+
+
+@dataclass(frozen=True)
+class ServiceLocation:
+    """A MicroOVN service enabled on a cluster member."""
+
+    service: str
+    location: str
+
+
+class MicroovnClient:
+    """Talk to the MicroOVN daemon over its control socket.
+
+    Requests go over keep-alive connections shared by every client of the
+    same socket, rather than forking the microovn CLI which then makes the
+    very same requests.
+    """
+
+    _pools: Dict[str, ConnectionPool] = {}
+    stats: Dict[str, RequestStats] = {}
+
+    def __init__(self, socket_path: str = MICROOVN_CONTROL_SOCKET, timeout: float = 30.0):
+        self.socket_path = socket_path
+        if socket_path not in self._pools:
+            self._pools[socket_path] = ConnectionPool(socket_path, timeout)
+        self._pool = self._pools[socket_path]
+
+    @classmethod
+    def reset_stats(cls) -> None:
+        """Drop the request latencies gathered so far."""
+        cls.stats = {}
+
+    @classmethod
+    def log_stats(cls) -> None:
+        """Log the latencies of the requests made since the last reset."""
+        for kind, stats in sorted(cls.stats.items()):
+            logger.info(
+                "microovn %s: %d requests, %.3fs total, %.3fs max",
+                kind,
+                stats.count,
+                stats.total,
+                stats.max,
+            )
+
+    @property
+    def available(self) -> bool:
+        """Return whether the daemon's control socket exists."""
+        return os.path.exists(self.socket_path)
+
+    def _request(self, method: str, path: str, body: Dict[str, Any] | None = None) -> Any:
+        """Make a request to the daemon and return the metadata of its response.
+
+        A reused connection may have been closed by the daemon while idle, in
+        which case the request is sent again over a fresh connection.
+        """
+        headers = {"Accept": "application/json"}
+        data = None
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            data = json.dumps(body).encode()
+
+        start = time.monotonic()
+        while True:
+            connection, reused = self._pool.acquire()
+            try:
+                connection.request(method, path, body=data, headers=headers)
+                response = connection.getresponse()
+                raw = response.read()
+            except (http.client.HTTPException, OSError) as err:
+                connection.close()
+                if reused and isinstance(err, RECONNECT_ERRORS):
+                    continue
+                raise MicroovnAPIError(503, f"cannot reach the MicroOVN daemon: {err}") from err
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._pool.release(connection)
+        self.stats.setdefault(f"{method} {path}", RequestStats()).record(time.monotonic() - start)
+
+        try:
+            result = json.loads(raw.decode())
+        except ValueError:
+            result = {}
+        if response.status >= 400 or result.get("type") == "error":
+            message = result.get("error") or response.reason
+            raise MicroovnAPIError(result.get("error_code") or response.status, message)
+        return result.get("metadata")
+
+    def ready(self) -> bool:
+        """Return whether the daemon finished starting up."""
+        try:
+            self._request("GET", "/core/1.0/ready")
+        except MicroovnAPIError as err:
+            if err.unsupported:
+                raise
+            return False
+        return True
+
+    def wait_ready(self, timeout: float = 30.0) -> bool:
+        """Wait for the daemon to finish starting up."""
+        deadline = time.monotonic() + timeout
+        while not self.ready():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(READY_POLL_INTERVAL)
+        return True
+
+    def cluster_members(self) -> List[ClusterMember]:
+        """Return the members of the cluster."""
+        return [
+            ClusterMember(
+                name=member.get("name", ""),
+                address=member.get("address", ""),
+                role=member.get("role", ""),
+                status=member.get("status", ""),
+            )
+            for member in self._request("GET", "/core/1.0/cluster") or []
+        ]
+
+    def services(self) -> List[ServiceLocation]:
+        """Return the services enabled on every member of the cluster."""
+        return [
+            ServiceLocation(
+                service=service.get("service", ""), location=service.get("location", "")
+            )
+            for service in self._request("GET", "/1.0/services") or []
+        ]
+
+    def enable_service(self, service: str) -> None:
+        """Enable a service on this member."""
+        self._request("PUT", f"/1.0/service/{service}")
+
+    def disable_service(self, service: str) -> None:
+        """Disable a service on this member."""
+        self._request("DELETE", f"/1.0/service/{service}")
+
+    def set_config(self, key: str, value: str) -> None:
+        """Set a cluster wide configuration option."""
+        self._request("PUT", "/1.0/config", {"key": key, "value": value})
+
+    def delete_config(self, key: str) -> None:
+        """Reset a cluster wide configuration option."""
+        self._request("DELETE", "/1.0/config", {"key": key})
+
+    def set_ca(self, combined: str) -> None:
+        """Replace the CA with the certificate and private key of a combined PEM."""
+        pems = [(pem.group(1), pem.group(0)) for pem in PEM_BLOCK.finditer(combined)]
+        certificates = [pem for kind, pem in pems if kind == "CERTIFICATE"]
+        keys = [pem for kind, pem in pems if kind.endswith("PRIVATE KEY")]
+        if not certificates or not keys:
+            raise MicroovnAPIError(400, "expected a certificate and a private key")
+        self._request(
+            "PUT", "/1.0/ca", {"ca_cert": "\n".join(certificates) + "\n", "ca_key": keys[0] + "\n"}
+        )
+
+    def run_command(
+        self, args: Sequence[str], stdin: str | None = None
+    ) -> subprocess.CompletedProcess[str] | None:
+        """Run a microovn CLI command through the REST API.
+
+        Returns:
+            The result the CLI would have given, or None when the command is
+            not covered by the client.
+
+        Raises:
+            MicroovnAPIError: when the daemon fails the request.
+        """
+        stdout = ""
+        match list(args):
+            case ["waitready"]:
+                if not self.wait_ready():
+                    return subprocess.CompletedProcess(
+                        list(args), 1, "", "Error: timed out waiting for MicroOVN\n"
+                    )
+            case ["enable", service]:
+                self.enable_service(service)
+            case ["disable", service]:
+                self.disable_service(service)
+            case ["config", "set", key, value]:
+                self.set_config(key, value)
+            case ["config", "delete", key]:
+                self.delete_config(key)
+            case ["certificates", "set-ca", "--combined"] if stdin is not None:
+                self.set_ca(stdin)
+                stdout = "New CA certificate: Issued\n"
+            case _:
+                return None
+        return subprocess.CompletedProcess(list(args), 0, stdout, "")
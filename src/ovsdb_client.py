@@ -0,0 +1,196 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""A minimal OVSDB JSON-RPC client for the local Open vSwitch database."""
+
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import os
+import socket
+from typing import Any, Callable, Dict, List
+
+from constants import MICROOVN_OVS_DB_SOCKET
+
+logger = logging.getLogger(__name__)
+
+DATABASE = "Open_vSwitch"
+# How many times a read-modify-write is tried again when the column changed
+# between the read and the write.
+UPDATE_ATTEMPTS = 3
+READ_SIZE = 65536
+
+
+class OVSDBError(Exception):
+    """Raised when the database cannot be reached or fails a transaction."""
+
+
+class OVSDBClient:
+    """Talk to ovsdb-server over its unix socket, rather than forking ovs-vsctl.
+
+    Only the root table of the database is edited, which has a single row.
+    """
+
+    def __init__(self, socket_path: str = MICROOVN_OVS_DB_SOCKET, timeout: float = 5.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._socket: socket.socket | None = None
+        self._buffer = ""
+        self._ids = itertools.count()
+
+    def __enter__(self) -> OVSDBClient:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    @property
+    def available(self) -> bool:
+        """Return whether the database socket exists."""
+        return os.path.exists(self.socket_path)
+
+    def close(self) -> None:
+        """Close the connection to the database, if it is open."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            self._buffer = ""
+
+    def _connect(self) -> socket.socket:
+        if self._socket is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as err:
+                sock.close()
+                raise OVSDBError(f"cannot connect to {self.socket_path}: {err}") from err
+            self._socket = sock
+        return self._socket
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        try:
+            self._connect().sendall(json.dumps(message).encode())
+        except OSError as err:
+            self.close()
+            raise OVSDBError(f"cannot send to {self.socket_path}: {err}") from err
+
+    def _receive(self) -> Dict[str, Any]:
+        """Return the next message, messages are sent back to back without framing."""
+        decoder = json.JSONDecoder()
+        while True:
+            buffer = self._buffer.lstrip()
+            if buffer:
+                try:
+                    message, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    pass
+                else:
+                    self._buffer = buffer[end:]
+                    return message
+            try:
+                data = self._connect().recv(READ_SIZE)
+            except OSError as err:
+                self.close()
+                raise OVSDBError(f"cannot read from {self.socket_path}: {err}") from err
+            if not data:
+                self.close()
+                raise OVSDBError(f"{self.socket_path} closed the connection")
+            self._buffer = buffer + data.decode()
+
+    def call(self, method: str, params: List[Any]) -> Any:
+        """Make a JSON-RPC request and return its result."""
+        request_id = next(self._ids)
+        self._send({"method": method, "params": params, "id": request_id})
+        while True:
+            message = self._receive()
+            if message.get("method") == "echo":
+                # The server's inactivity probe.
+                self._send(
+                    {"result": message.get("params", []), "error": None, "id": message["id"]}
+                )
+                continue
+            if message.get("id") != request_id:
+                continue
+            if message.get("error") is not None:
+                raise OVSDBError(f"{method} failed: {message['error']}")
+            return message.get("result")
+
+    def transact(self, *operations: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Run operations as one atomic transaction, returning their results.
+
+        Raises:
+            OVSDBError: when any of the operations fails, in which case none
+                of them is applied.
+        """
+        results = self.call("transact", [DATABASE, *operations])
+        errors = [result for result in results if result and "error" in result]
+        if errors or len(results) < len(operations):
+            raise OVSDBError(f"transaction failed: {errors or results}")
+        return results
+
+    def get_map(self, table: str, column: str) -> Dict[str, str]:
+        """Return a map column, such as external_ids, of the table's row."""
+        select = {"op": "select", "table": table, "where": [], "columns": [column]}
+        rows = self.transact(select)[0]["rows"]
+        if not rows:
+            raise OVSDBError(f"{table} has no row")
+        return dict(rows[0][column][1])
+
+    def update_map_value(
+        self,
+        table: str,
+        column: str,
+        key: str,
+        update: Callable[[str | None], str | None],
+    ) -> bool:
+        """Set a key of a map column to what update makes of its current value.
+
+        The write only applies if the column did not change since it was read,
+        otherwise it is read and tried again. A None value removes the key.
+
+        Returns:
+            Whether the value changed.
+        """
+        for _ in range(UPDATE_ATTEMPTS):
+            current = self.get_map(table, column)
+            value = update(current.get(key))
+            if value == current.get(key):
+                return False
+            operations: List[Dict[str, Any]] = [
+                {
+                    "op": "wait",
+                    "table": table,
+                    "where": [],
+                    "columns": [column],
+                    "until": "==",
+                    "rows": [{column: ["map", sorted(current.items())]}],
+                    "timeout": 0,
+                },
+                {
+                    "op": "mutate",
+                    "table": table,
+                    "where": [],
+                    "mutations": [[column, "delete", ["set", [key]]]],
+                },
+            ]
+            if value is not None:
+                operations.append(
+                    {
+                        "op": "mutate",
+                        "table": table,
+                        "where": [],
+                        "mutations": [[column, "insert", ["map", [[key, value]]]]],
+                    }
+                )
+            try:
+                self.transact(*operations)
+            except OVSDBError as err:
+                if "timed out" not in str(err):
+                    raise
+                logger.info("%s:%s changed while updating %s, trying again", table, column, key)
+                continue
+            return True
+        raise OVSDBError(f"{table}:{column} kept changing while updating {key}")
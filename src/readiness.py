@@ -0,0 +1,143 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Wait for the workload to become ready, waking up as soon as its files change."""
+
+from __future__ import annotations
+
+import ctypes
+import functools
+import logging
+import os
+import random
+import select
+import time
+from typing import Callable, Iterator, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_ATTRIB | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+BACKOFF_INITIAL = 0.1
+BACKOFF_MAX = 2.0
+# A burst of changes does not get the readiness checked more often than this.
+MIN_CHECK_INTERVAL = 0.05
+
+
+def backoff_delays(
+    initial: float = BACKOFF_INITIAL, maximum: float = BACKOFF_MAX
+) -> Iterator[float]:
+    """Yield exponentially growing delays, each jittered down by up to a half."""
+    delay = initial
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(delay * 2, maximum)
+
+
+class Watcher:
+    """Wake up when files are created, changed or removed in watched directories.
+
+    Falls back to sleeping for the whole timeout where inotify is not
+    available.
+    """
+
+    def __init__(self, paths: Sequence[str]):
+        self._paths = paths
+        self._fd = -1
+        self._libc = _inotify_libc()
+        if self._libc is not None and paths:
+            self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if self._fd < 0:
+                logger.debug("inotify_init1 failed, errno %d", ctypes.get_errno())
+
+    def __enter__(self) -> Watcher:
+        self.arm()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop watching."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def arm(self) -> None:
+        """Watch the directory of every path, or its closest ancestor that exists yet."""
+        if self._fd < 0 or self._libc is None:
+            return
+        for directory in self._directories():
+            if self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK) < 0:
+                logger.debug("Cannot watch %s, errno %d", directory, ctypes.get_errno())
+
+    def _directories(self) -> List[str]:
+        directories = []
+        for path in self._paths:
+            directory = path if os.path.isdir(path) else os.path.dirname(path)
+            while directory and not os.path.isdir(directory):
+                directory = os.path.dirname(directory)
+            directories.append(directory or "/")
+        return directories
+
+    def wait(self, timeout: float) -> bool:
+        """Wait for a change for up to the timeout, returning whether one happened."""
+        if self._fd < 0:
+            time.sleep(timeout)
+            return False
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self._fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        # Directories on the way to the paths may just have been created.
+        self.arm()
+        return True
+
+
+def wait_until(
+    ready: Callable[[], bool], timeout: float, watch: Sequence[str] = ()
+) -> float | None:
+    """Wait until a readiness check passes, under a single overall deadline.
+
+    The check runs again as soon as something changes next to the watched
+    paths, and otherwise on a jittered exponential backoff.
+
+    Returns:
+        How many seconds it took to become ready, None if it did not before
+        the deadline.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    with Watcher(watch) as watcher:
+        for delay in backoff_delays():
+            checked = time.monotonic()
+            if ready():
+                return time.monotonic() - start
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if watcher.wait(min(delay, remaining)):
+                time.sleep(max(0.0, checked + MIN_CHECK_INTERVAL - time.monotonic()))
+    return None  # pragma: nocover
+
+
+@functools.cache
+def _inotify_libc() -> ctypes.CDLL | None:
+    try:
+        # The symbols the interpreter is linked against, libc among them.
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
@@ -8,8 +8,8 @@ from __future__ import annotations
 import enum
 import json
 import logging
-import subprocess
-from typing import TYPE_CHECKING
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AbstractSet
 
 import ops
 from charms.role_distributor.v0.role_assignment import (
@@ -20,13 +20,17 @@ from charms.role_distributor.v0.role_assignment import (
     UnitRoleAssignment,
 )
 
-from utils import call_microovn_command
+from ovsdb_client import OVSDBClient, OVSDBError
+from utils import CommandCache, call_microovn_command, call_ovs_vsctl, cluster_status
 
 if TYPE_CHECKING:
     from charm import MicroovnCharm
 
 logger = logging.getLogger(__name__)
 
+CMS_OPTIONS_KEY = "ovn-cms-options"
+GATEWAY_OPTION = "enable-chassis-as-gw"
+
 
 class Role(enum.StrEnum):
     """Supported MicroOVN roles."""
@@ -36,6 +40,38 @@ class Role(enum.StrEnum):
     GATEWAY = "gateway"
 
 
+class Transition(enum.StrEnum):
+    """What reconciling a role does to the workload."""
+
+    ENABLE = "enable"
+    DISABLE = "disable"
+    NOOP = "no-op"
+
+
+@dataclass(frozen=True)
+class WorkloadState:
+    """The role services enabled on this unit and its ovn-cms-options."""
+
+    # None when the cluster status could not be queried.
+    services: frozenset[Role] | None
+    gateway_options: frozenset[str]
+
+    def applied(self, roles: set[str]) -> WorkloadState:
+        """Return the state this one is left in once the roles are applied."""
+        options = set(self.gateway_options)
+        if Role.GATEWAY in roles:
+            options.add(GATEWAY_OPTION)
+        else:
+            options.discard(GATEWAY_OPTION)
+        services = frozenset(role for role in (Role.CENTRAL, Role.CHASSIS) if role in roles)
+        return WorkloadState(services, frozenset(options))
+
+
+def _roles_fingerprint(roles: set[str], *, dataplane_only: bool) -> str:
+    """Return what is stored once the roles are applied, to tell they need not be again."""
+    return json.dumps([sorted(roles), dataplane_only])
+
+
 class RoleHandler(ops.Object):
     """Handles role-assignment relation logic for MicroOVN."""
 
@@ -46,8 +82,9 @@ class RoleHandler(ops.Object):
         self._charm = charm
         self._relation_name = relation_name
         self.requirer = RoleAssignmentRequirer(charm, relation_name)
-        self._stored.set_default(applied_roles="")
-        self._stored.set_default(applied_dataplane_only=False)
+        self._stored.set_default(applied_fingerprint="")
+        # The workload as observed, or left by applying roles, during this dispatch.
+        self._workload: WorkloadState | None = None
 
     def get_assignment(self) -> UnitRoleAssignment | None:
         """Return the current role assignment for this unit, or None if unassigned."""
@@ -58,35 +95,23 @@ class RoleHandler(ops.Object):
         """Return whether the role-assignment relation exists."""
         return self._charm.model.get_relation(self._relation_name) is not None
 
-    def _get_applied_roles(self) -> set[str] | None:
-        """Return previously applied roles, or None if never applied."""
-        raw: str = str(self._stored.applied_roles)
-        if not raw:
-            return None
-        return set(json.loads(raw))
-
-    def _save_applied_roles(self, roles: set[str]) -> None:
-        """Persist the set of roles that were successfully applied."""
-        self._stored.applied_roles = json.dumps(sorted(roles))
-        self._stored.applied_dataplane_only = bool(self._charm.is_dataplane_only)
-
-    def _clear_applied_roles(self) -> None:
-        """Clear the stored applied roles."""
-        self._stored.applied_roles = ""
-        self._stored.applied_dataplane_only = False
+    def _save_applied_fingerprint(self, fingerprint: str) -> None:
+        """Persist the fingerprint of the roles applied to the workload."""
+        self._stored.applied_fingerprint = fingerprint
 
-    def _applied_dataplane_only(self) -> bool:
-        """Return whether the cached roles were applied in dataplane-only mode."""
-        return bool(self._stored.applied_dataplane_only)
+    def _clear_applied_fingerprint(self) -> None:
+        """Clear the stored fingerprint, so the next roles are applied."""
+        self._stored.applied_fingerprint = ""
 
     def invalidate_applied_roles(self) -> None:
-        """Invalidate the applied-roles cache.
+        """Drop the applied roles and the workload observed during this dispatch.
 
-        Must be called whenever workload state is mutated outside of
-        RoleHandler (e.g. by _dataplane_mode()), so that the next
-        enforce_roles() re-applies instead of short-circuiting.
+        Called whenever workload state is mutated outside of RoleHandler
+        (e.g. by _dataplane_mode()), so enforce_roles() observes it again.
+        It still makes no change when the workload already matches the roles.
         """
-        self._clear_applied_roles()
+        self._clear_applied_fingerprint()
+        self._workload = None
 
     def _resolve_assignment_roles(
         self, status: AssignmentStatus | str, roles: tuple[str, ...], message: str | None
@@ -121,7 +146,7 @@ class RoleHandler(ops.Object):
         enforce_roles is no longer called on subsequent lifecycle events.
         """
         logger.info("Role assignment relation broken, keeping current workload state")
-        self._clear_applied_roles()
+        self._clear_applied_fingerprint()
 
     def enforce_roles(self, roles: set[str] | None = None) -> None:
         """Enforce role assignment constraints and apply roles if needed.
@@ -157,8 +182,10 @@ class RoleHandler(ops.Object):
             )
             return
 
-        previously_applied = self._get_applied_roles()
-        if previously_applied == roles and self._applied_dataplane_only() == dataplane_only:
+        # The workload is only read when the roles changed since they were applied.
+        if _roles_fingerprint(roles, dataplane_only=dataplane_only) == (
+            self._stored.applied_fingerprint
+        ):
             logger.info(
                 "Roles already applied: %s (dataplane_only=%s), skipping mutation",
                 roles,
@@ -166,7 +193,10 @@ class RoleHandler(ops.Object):
             )
             return
 
-        self._apply_roles(roles, dataplane_only=dataplane_only)
+        workload = self._observe_workload()
+        if workload is None:
+            return
+        self._apply_roles(roles, workload, dataplane_only=dataplane_only)
 
     @staticmethod
     def _normalize_roles(roles: set[str]) -> set[str]:
@@ -177,30 +207,76 @@ class RoleHandler(ops.Object):
             logger.warning("Ignoring unrecognized roles: %s", unknown_roles)
         return roles & known_values
 
-    def _apply_roles(self, roles: set[str], *, dataplane_only: bool) -> None:
-        desired_central = Role.CENTRAL in roles
-        desired_chassis = Role.CHASSIS in roles
-        desired_gateway = Role.GATEWAY in roles
-
-        if not desired_gateway and not self._disable_gateway():
-            return
-
-        if desired_chassis:
-            if not self._enable_chassis():
-                return
-        elif not self._disable_chassis():
-            return
-
-        if desired_central:
-            if not self._enable_central():
+    def _observe_workload(self) -> WorkloadState | None:
+        """Return the services and gateway options of this unit, None if they cannot be read."""
+        if self._workload is not None:
+            return self._workload
+        gateway_options = self._read_gateway_options()
+        if gateway_options is None:
+            return None
+        status = cluster_status()
+        local = status.local if status is not None else None
+        services = None
+        if local is not None:
+            services = frozenset(role for role in Role if role.value in local.services)
+        self._workload = WorkloadState(services, frozenset(gateway_options))
+        return self._workload
+
+    def _apply_roles(
+        self, roles: set[str], workload: WorkloadState, *, dataplane_only: bool
+    ) -> None:
+        plan = self._plan_transitions(
+            roles, workload.services, GATEWAY_OPTION in workload.gateway_options
+        )
+        logger.info("Role plan: %s", "; ".join(f"{action} {role}" for role, action in plan))
+        if all(action is Transition.NOOP for _, action in plan):
+            logger.info("Workload already matches roles %s, skipping mutation", roles)
+
+        self._workload = None
+        for role, action in plan:
+            if action is Transition.NOOP:
+                continue
+            enable = action is Transition.ENABLE
+            if role is Role.GATEWAY:
+                done = self._set_gateway_option(set(workload.gateway_options), enable=enable)
+            elif role is Role.CENTRAL and not enable and not dataplane_only:
+                done = not self._refuse_last_central() and self._set_service_enabled(
+                    role, enabled=False
+                )
+            else:
+                done = self._set_service_enabled(
+                    role, enabled=enable, allow_disable_last=dataplane_only
+                )
+            if not done:
                 return
-        elif not self._disable_central(allow_disable_last=dataplane_only):
-            return
 
-        if desired_gateway and not self._enable_gateway():
-            return
+        self._workload = workload.applied(roles)
+        self._save_applied_fingerprint(_roles_fingerprint(roles, dataplane_only=dataplane_only))
 
-        self._save_applied_roles(roles)
+    @staticmethod
+    def _plan_transitions(
+        roles: set[str], enabled: AbstractSet[Role] | None, gateway_enabled: bool
+    ) -> list[tuple[Role, Transition]]:
+        """Return the transitions from the services enabled to the desired roles.
+
+        The gateway option is removed before chassis and central change and
+        added after them. A service whose state is unknown is always changed,
+        microovn reports whether it already was.
+        """
+        plan = []
+        for role in (Role.CHASSIS, Role.CENTRAL):
+            desired = role in roles
+            if enabled is not None and (role in enabled) == desired:
+                plan.append((role, Transition.NOOP))
+            else:
+                plan.append((role, Transition.ENABLE if desired else Transition.DISABLE))
+        if (Role.GATEWAY in roles) == gateway_enabled:
+            plan.append((Role.GATEWAY, Transition.NOOP))
+        elif gateway_enabled:
+            plan.insert(0, (Role.GATEWAY, Transition.DISABLE))
+        else:
+            plan.append((Role.GATEWAY, Transition.ENABLE))
+        return plan
 
     def _set_service_enabled(
         self, service: Role, enabled: bool, *, allow_disable_last: bool = False
@@ -239,82 +315,64 @@ class RoleHandler(ops.Object):
         self._charm.unit.status = ops.BlockedStatus(f"Failed to {action} {service.value} service")
         return False
 
-    def _enable_central(self) -> bool:
-        return self._set_service_enabled(Role.CENTRAL, enabled=True)
-
-    def _enable_chassis(self) -> bool:
-        return self._set_service_enabled(Role.CHASSIS, enabled=True)
-
-    def _disable_chassis(self) -> bool:
-        return self._set_service_enabled(Role.CHASSIS, enabled=False)
-
-    def _disable_central(self, *, allow_disable_last: bool = False) -> bool:
-        return self._set_service_enabled(
-            Role.CENTRAL, enabled=False, allow_disable_last=allow_disable_last
+    def _refuse_last_central(self) -> bool:
+        """Block, without calling microovn, when the status shows this is the only central."""
+        status = cluster_status()
+        local = status.local if status is not None else None
+        if status is None or local is None:
+            return False
+        if status.members_with(Role.CENTRAL.value) != [local.name]:
+            return False
+        logger.error("Refusing to disable last central outside dataplane-only mode")
+        self._charm.unit.status = ops.BlockedStatus(
+            "Cannot disable the last central node outside dataplane-only mode"
         )
+        return True
 
-    def _enable_gateway(self) -> bool:
-        return self._set_gateway_option(enable=True)
-
-    def _disable_gateway(self) -> bool:
-        return self._set_gateway_option(enable=False)
-
-    def _set_gateway_option(self, *, enable: bool) -> bool:
-        res = subprocess.run(
-            ["microovn.ovs-vsctl", "get", "open_vswitch", ".", "external-ids:ovn-cms-options"],
-            capture_output=True,
-            text=True,
-        )
+    def _read_gateway_options(self) -> set[str] | None:
+        """Return the ovn-cms-options of this chassis, None when they cannot be read."""
+        with OVSDBClient() as client:
+            if client.available:
+                try:
+                    raw = client.get_map("Open_vSwitch", "external_ids").get(CMS_OPTIONS_KEY)
+                except OVSDBError as err:
+                    logger.warning("Failed to read ovn-cms-options, retrying later: %s", err)
+                    return None
+                return _split_options(raw)
+
+        res = call_ovs_vsctl("get", "open_vswitch", ".", "external-ids:ovn-cms-options")
         if res.returncode != 0:
             if "no key" not in res.stderr:
-                # Transient / unexpected failure, fail closed.
-                logger.error(
-                    "Failed to read ovn-cms-options, code %s, stderr: %s",
+                # Transient / unexpected failure, nothing is written and the
+                # roles are applied again on a later hook.
+                logger.warning(
+                    "Failed to read ovn-cms-options, retrying later, code %s, stderr: %s",
                     res.returncode,
                     res.stderr,
                 )
-                self._charm.unit.status = ops.BlockedStatus("Failed to read gateway configuration")
-                return False
-            # Key absent, safe to treat as empty on enable,
-            # nothing to remove on disable.
-            if enable:
-                current_options: set[str] = set()
-            else:
-                logger.info("ovn-cms-options key absent, nothing to disable for gateway")
-                return True
-        else:
-            raw = res.stdout.strip().strip('"')
-            current_options = {o.strip() for o in raw.split(",") if o.strip()}
+                return None
+            # Key absent, nothing is set yet.
+            return set()
+        return _split_options(res.stdout.strip().strip('"'))
+
+    def _set_gateway_option(self, current_options: set[str], *, enable: bool) -> bool:
+        with OVSDBClient() as client:
+            if client.available:
+                return self._set_gateway_option_ovsdb(client, enable=enable)
 
         desired = current_options.copy()
         if enable:
-            desired.add("enable-chassis-as-gw")
+            desired.add(GATEWAY_OPTION)
         else:
-            desired.discard("enable-chassis-as-gw")
-
-        if desired == current_options:
-            logger.info("Gateway option already in desired state")
-            return True
+            desired.discard(GATEWAY_OPTION)
 
         new_value = ",".join(sorted(desired))
         if new_value:
-            cmd = [
-                "microovn.ovs-vsctl",
-                "set",
-                "open_vswitch",
-                ".",
-                f"external-ids:ovn-cms-options={new_value}",
-            ]
+            res = call_ovs_vsctl(
+                "set", "open_vswitch", ".", f"external-ids:ovn-cms-options={new_value}"
+            )
         else:
-            cmd = [
-                "microovn.ovs-vsctl",
-                "remove",
-                "open_vswitch",
-                ".",
-                "external-ids",
-                "ovn-cms-options",
-            ]
-        res = subprocess.run(cmd, capture_output=True, text=True)
+            res = call_ovs_vsctl("remove", "open_vswitch", ".", "external-ids", "ovn-cms-options")
         if res.returncode != 0:
             logger.error(
                 "Failed to set ovn-cms-options, code %s, stderr: %s",
@@ -324,3 +382,40 @@ class RoleHandler(ops.Object):
             self._charm.unit.status = ops.BlockedStatus("Failed to update gateway configuration")
             return False
         return True
+
+    def _set_gateway_option_ovsdb(self, client: OVSDBClient, *, enable: bool) -> bool:
+        """Toggle the gateway option in one transaction, which fails if the options changed."""
+        try:
+            changed = client.update_map_value(
+                "Open_vSwitch",
+                "external_ids",
+                CMS_OPTIONS_KEY,
+                lambda current: _with_gateway_option(current, enable=enable),
+            )
+        except OVSDBError as err:
+            logger.error("Failed to update ovn-cms-options: %s", err)
+            self._charm.unit.status = ops.BlockedStatus("Failed to update gateway configuration")
+            return False
+        if not changed:
+            logger.info("Gateway option already in desired state")
+            return True
+        # What ovs-vsctl read before is stale now.
+        CommandCache.invalidate()
+        return True
+
+
+def _split_options(raw: str | None) -> set[str]:
+    """Return the options of a comma separated ovn-cms-options value."""
+    return {option.strip() for option in (raw or "").split(",") if option.strip()}
+
+
+def _with_gateway_option(current: str | None, *, enable: bool) -> str | None:
+    """Return the ovn-cms-options with the gateway option added or removed, None once empty."""
+    options = _split_options(current)
+    if (GATEWAY_OPTION in options) == enable:
+        return current
+    if enable:
+        options.add(GATEWAY_OPTION)
+    else:
+        options.discard(GATEWAY_OPTION)
+    return ",".join(sorted(options)) or None
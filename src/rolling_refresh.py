@@ -0,0 +1,249 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Leader coordinated rolling refresh of the microovn snap."""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List
+
+import ops
+
+if TYPE_CHECKING:
+    from charm import MicroovnCharm
+
+logger = logging.getLogger(__name__)
+
+# Unit databag keys, written by every unit about its own refresh.
+REQUEST_KEY = "refresh-request"
+DONE_KEY = "refresh-done"
+HEALTHY_KEY = "refresh-healthy"
+SECONDS_KEY = "refresh-seconds"
+
+# Application databag keys, written by the leader.
+LOCK_KEY = "refresh-lock"
+HISTORY_KEY = "refresh-history"
+HISTORY_SIZE = 20
+
+
+def batch_size(setting: str, units: int) -> int:
+    """Return how many units are refreshed at once.
+
+    Args:
+        setting: a number of units, or a percentage of the units such as "25%".
+        units: the number of units in the application.
+    """
+    if setting.endswith("%"):
+        return max(1, units * int(setting[:-1]) // 100)
+    return max(1, int(setting))
+
+
+class RefreshedEvent(ops.EventBase):
+    """Emitted once this unit refreshed its snap and went through the health gate."""
+
+
+class RollingRefreshEvents(ops.ObjectEvents):
+    """Events emitted by the rolling refresh."""
+
+    refreshed = ops.EventSource(RefreshedEvent)
+
+
+class RollingRefresh(ops.Object):
+    """Refresh the microovn snap a batch of units at a time.
+
+    Units ask for a refresh through their peer databag and wait for the leader
+    to grant them the refresh lock. The leader grants it to a batch of units
+    and only moves on to the next batch once every unit of the current one
+    reported it refreshed and passed its health gate, recording how long each
+    batch took.
+    """
+
+    on = RollingRefreshEvents()  # pyright: ignore[reportAssignmentType]
+
+    def __init__(
+        self,
+        charm: MicroovnCharm,
+        relation_name: str,
+        refresh: Callable[[str], bool],
+        healthy: Callable[[], bool],
+    ) -> None:
+        super().__init__(charm, relation_name)
+        self._charm = charm
+        self._relation_name = relation_name
+        self._refresh = refresh
+        self._healthy = healthy
+
+        for event in (
+            charm.on[relation_name].relation_changed,
+            charm.on[relation_name].relation_departed,
+            charm.on.leader_elected,
+            charm.on.update_status,
+        ):
+            self.framework.observe(event, self._on_changed)
+        self.framework.observe(charm.on.refresh_status_action, self._on_refresh_status_action)
+
+    @property
+    def relation(self) -> ops.Relation | None:
+        """Return the peer relation, if it exists yet."""
+        return self._charm.model.get_relation(self._relation_name)
+
+    def request(self, channel: str) -> bool:
+        """Ask for this unit's snap to be refreshed to a channel.
+
+        Returns:
+            False when there is no peer relation to coordinate through, in
+            which case the caller should refresh right away.
+        """
+        relation = self.relation
+        if relation is None:
+            return False
+        data = relation.data[self._charm.unit]
+        if data.get(REQUEST_KEY) != channel:
+            data.update({REQUEST_KEY: channel, HEALTHY_KEY: ""})
+        if data.get(DONE_KEY) != channel:
+            self._charm.unit.status = ops.WaitingStatus(f"Waiting to refresh to {channel}")
+        self._reconcile(relation)
+        return True
+
+    def _on_changed(self, _: ops.EventBase) -> None:
+        """Run a granted refresh and let the leader move the lock on."""
+        if (relation := self.relation) is not None:
+            self._reconcile(relation)
+
+    def _reconcile(self, relation: ops.Relation) -> None:
+        # The leader does not see its own databag changes as relation events,
+        # so it keeps going for as long as it granted the lock to itself.
+        self._refresh_if_granted(relation)
+        while self._charm.unit.is_leader() and self._advance(relation):
+            if not self._refresh_if_granted(relation):
+                break
+
+    def _refresh_if_granted(self, relation: ops.Relation) -> bool:
+        """Refresh this unit if it holds the lock, returning whether it refreshed."""
+        lock = json.loads(relation.data[self._charm.app].get(LOCK_KEY) or "{}")
+        data = relation.data[self._charm.unit]
+        channel = data.get(REQUEST_KEY)
+        if not channel or lock.get("channel") != channel:
+            return False
+        if self._charm.unit.name not in lock.get("units", []):
+            return False
+
+        if data.get(DONE_KEY) == channel:
+            # Already refreshed, only the health gate is tried again until it passes.
+            if data.get(HEALTHY_KEY) == "false" and self._healthy():
+                data[HEALTHY_KEY] = "true"
+            return False
+
+        self._charm.unit.status = ops.MaintenanceStatus(f"Refreshing MicroOVN snap to {channel}")
+        started = time.monotonic()
+        refreshed = self._refresh(channel)
+        healthy = refreshed and self._healthy()
+        update = {
+            HEALTHY_KEY: json.dumps(healthy),
+            SECONDS_KEY: f"{time.monotonic() - started:.1f}",
+        }
+        if refreshed:
+            update[DONE_KEY] = channel
+        data.update(update)
+        logger.info(
+            "Refreshed microovn to %s in %ss, healthy: %s", channel, update[SECONDS_KEY], healthy
+        )
+        self.on.refreshed.emit()
+        return refreshed
+
+    def _advance(self, relation: ops.Relation) -> bool:
+        """Grant the lock to the next batch once the current one is healthy.
+
+        Returns:
+            Whether the lock was granted to a new batch.
+        """
+        app_data = relation.data[self._charm.app]
+        units = sorted([self._charm.unit, *relation.units], key=lambda unit: unit.name)
+        data = {unit.name: relation.data[unit] for unit in units}
+        lock = json.loads(app_data.get(LOCK_KEY) or "{}")
+
+        if lock and not self._batch_finished(lock, data, app_data):
+            return False
+
+        pending = [
+            name
+            for name, unit_data in data.items()
+            if unit_data.get(REQUEST_KEY) and unit_data.get(DONE_KEY) != unit_data[REQUEST_KEY]
+        ]
+        if not pending:
+            if lock:
+                app_data[LOCK_KEY] = ""
+            return False
+
+        channel = data[pending[0]][REQUEST_KEY]
+        size = batch_size(self._charm.typed_config.refresh_batch, len(units))
+        batch = [name for name in pending if data[name][REQUEST_KEY] == channel][:size]
+        app_data[LOCK_KEY] = json.dumps(
+            {"channel": channel, "units": batch, "started": time.time()}
+        )
+        logger.info("Granted the refresh lock for %s to %s", channel, ", ".join(batch))
+        return True
+
+    def _batch_finished(
+        self,
+        lock: dict,
+        data: Dict[str, ops.RelationDataContent],
+        app_data: ops.RelationDataContent,
+    ) -> bool:
+        """Check whether every unit of the batch refreshed and is healthy, recording it if so.
+
+        Units that left the application or asked for another channel since
+        they were granted the lock are no longer waited for.
+        """
+        channel = lock["channel"]
+        batch = [
+            name
+            for name in lock["units"]
+            if name in data and data[name].get(REQUEST_KEY) == channel
+        ]
+        unhealthy: List[str] = []
+        for name in batch:
+            healthy = data[name].get(HEALTHY_KEY)
+            if data[name].get(DONE_KEY) == channel and healthy == "true":
+                continue
+            if healthy != "false":
+                # Still refreshing.
+                return False
+            unhealthy.append(name)
+        if unhealthy:
+            logger.warning(
+                "Rolling refresh to %s halted, unhealthy units: %s", channel, ", ".join(unhealthy)
+            )
+            return False
+
+        if not batch:
+            return True
+        seconds = time.time() - lock["started"]
+        logger.info("Refreshed %s to %s in %.1fs", ", ".join(batch), channel, seconds)
+        history = json.loads(app_data.get(HISTORY_KEY) or "[]")
+        history.append(
+            {
+                "channel": channel,
+                "units": {name: float(data[name].get(SECONDS_KEY) or 0) for name in batch},
+                "seconds": round(seconds, 1),
+            }
+        )
+        app_data[HISTORY_KEY] = json.dumps(history[-HISTORY_SIZE:])
+        return True
+
+    def _on_refresh_status_action(self, event: ops.ActionEvent) -> None:
+        """Report the refresh lock and the timing of the last refreshed batches."""
+        relation = self.relation
+        if relation is None:
+            event.fail("The peer relation is not established yet")
+            return
+        app_data = relation.data[self._charm.app]
+        event.set_results(
+            {
+                "lock": app_data.get(LOCK_KEY) or "{}",
+                "history": app_data.get(HISTORY_KEY) or "[]",
+            }
+        )
@@ -3,41 +3,287 @@
 
 """The snap management class."""
 
+import json
 import logging
+import os
 import re
-from typing import List, Tuple
+from collections import Counter
+from typing import Callable, Dict, List
 
 from charms.operator_libs_linux.v2 import snap
-from tenacity import retry, retry_if_result, stop_after_attempt, wait_fixed
+from tenacity import retry, retry_if_result, stop_after_attempt, wait_random_exponential
+
+from constants import SNAP_BASE_CACHE_FILE, SNAP_BASE_CHANNEL
+from snapd_client import ChangeProgress, LazySnapCache, PlugConnection, SnapdClient
 
 logger = logging.getLogger(__name__)
 
 
+def _load_snap_bases() -> dict[str, str]:
+    """Return the snap bases resolved by previous hooks, keyed by snap and channel."""
+    try:
+        with open(SNAP_BASE_CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_snap_base(key: str, base: str) -> None:
+    """Remember the base a snap channel needs for later hooks."""
+    bases = _load_snap_bases()
+    bases[key] = base
+    try:
+        os.makedirs(os.path.dirname(SNAP_BASE_CACHE_FILE), exist_ok=True)
+        with open(SNAP_BASE_CACHE_FILE, "w") as f:
+            json.dump(bases, f)
+    except OSError as err:
+        logger.warning("Failed to save snap base cache: %s", err)
+
+
 class SnapManager:
     """A manager class for a snap."""
 
     name: str
     channel: str
 
+    # Building a SnapCache lists every installed snap through snapd, so a
+    # single cache is shared by all managers for the lifetime of a dispatch
+    # and only dropped once a snap has actually been mutated.
+    _cache: LazySnapCache | None = None
+    cache_stats: Counter = Counter()
+    _snapd: SnapdClient | None = None
+
     def __init__(self, name: str, channel: str):
         self.name = name
         self.channel = channel
+        self.local_path: str | None = None
+        self.dangerous = False
+
+    def use_local_snap(self, path: str, dangerous: bool = False) -> None:
+        """Install the snap from a local file instead of the store.
+
+        Args:
+            path: the snap file, ie an attached charm resource.
+            dangerous: whether the snap's assertions were not acknowledged.
+        """
+        self.local_path = path
+        self.dangerous = dangerous
+
+    @classmethod
+    def ack_assertions(cls, path: str) -> bool:
+        """Acknowledge the assertions of local snap files."""
+        try:
+            with open(path, "rb") as f:
+                cls.snapd_client().ack(f.read())
+        except (OSError, snap.Error) as err:
+            logger.error("Failed to acknowledge snap assertions from %s: %s", path, err)
+            return False
+        return True
+
+    @classmethod
+    def install_local(cls, path: str, dangerous: bool = False) -> bool:
+        """Install a snap that needs no management from a local file, ie a base."""
+        try:
+            cls.snapd_client().sideload(path, dangerous)
+            logger.info("Installed snap from %s", path)
+        except (snap.Error, TimeoutError) as err:
+            logger.error("Failed to install snap from %s: %s", path, err)
+            return False
+        finally:
+            cls.invalidate_cache()
+        return True
+
+    @classmethod
+    def reset_cache(cls) -> None:
+        """Drop the shared snap cache and its counters."""
+        cls._cache = None
+        cls.cache_stats = Counter()
+        SnapdClient.reset_stats()
+
+    @classmethod
+    def log_stats(cls) -> None:
+        """Log the snap cache usage and snapd request latencies since the last reset."""
+        if cls.cache_stats:
+            logger.info(
+                "Snap cache: %d hits, %d misses, %d invalidations",
+                cls.cache_stats["hits"],
+                cls.cache_stats["misses"],
+                cls.cache_stats["invalidations"],
+            )
+        for kind, stats in sorted(SnapdClient.stats.items()):
+            logger.info(
+                "snapd %s: %d requests, %.3fs total, %.3fs max",
+                kind,
+                stats.count,
+                stats.total,
+                stats.max,
+            )
+        for kind, stats in sorted(SnapdClient.change_stats.items()):
+            logger.info(
+                "snapd %s changes: %d waited on, %.3fs total, %.3fs max",
+                kind,
+                stats.count,
+                stats.total,
+                stats.max,
+            )
+
+    @classmethod
+    def invalidate_cache(cls) -> None:
+        """Drop the shared snap cache after a snap was mutated."""
+        cls._cache = None
+        cls.cache_stats["invalidations"] += 1
+
+    @classmethod
+    def _get_cache(cls) -> LazySnapCache:
+        """Return the shared snap cache, building it if needed."""
+        if cls._cache is None:
+            cls.cache_stats["misses"] += 1
+            cls._cache = LazySnapCache()
+        else:
+            cls.cache_stats["hits"] += 1
+        return cls._cache
 
     @property
     def snap_client(self) -> snap.Snap:
         """Return the snap client."""
-        return snap.SnapCache()[self.name]
+        return self._get_cache()[self.name]
+
+    @classmethod
+    def snapd_client(cls) -> SnapdClient:
+        """Return the shared snapd REST client."""
+        if cls._snapd is None:
+            cls._snapd = SnapdClient()
+        return cls._snapd
+
+    def required_base(self) -> str | None:
+        """Return the base snap this snap's channel needs, if an install learnt it.
+
+        snapd's find API only reports the base of the revision the store serves
+        by default, not that of the requested channel. The base is instead
+        learnt from the error of an install that missed it, and kept for the
+        later installs of the channel.
+        """
+        return _load_snap_bases().get(f"{self.name}@{self.channel}")
+
+    def _ensure_base(self) -> None:
+        """Install the base snap ahead of this snap when snapd cannot pull it in itself.
+
+        snapd installs missing bases from their stable channel, bases that have
+        not been released there yet (ie core26) have to be installed by hand.
+        """
+        base = self.required_base()
+        if base is None:
+            return
+        cache = self._get_cache()
+        if base in cache and cache[base].present:
+            return
+
+        try:
+            channels = self.snapd_client().find(base).get("channels")
+        except snap.Error as err:
+            logger.debug("Cannot look up base %s: %s", base, err)
+            return
+        if isinstance(channels, dict) and "latest/stable" in channels:
+            return
+
+        logger.info("Installing base '%s' required by %s", base, self.name)
+        self.snapd_client().install(base, SNAP_BASE_CHANNEL)
+        self.invalidate_cache()
+
+    def _start_install(self) -> str | None:
+        """Submit the install or refresh of this snap to snapd without waiting."""
+        if self.local_path is not None:
+            return self.snapd_client().sideload_async(self.local_path, self.dangerous)
+        self._ensure_base()
+        if self.snap_client.present:
+            return self.snapd_client().refresh_async(self.name, self.channel)
+        return self.snapd_client().install_async(self.name, self.channel)
+
+    @classmethod
+    def install_many(
+        cls,
+        managers: List["SnapManager"],
+        progress: Callable[[ChangeProgress], None] | None = None,
+    ) -> List["SnapManager"]:
+        """Install several snaps as concurrent snapd changes and hold them together.
+
+        snapd rejects channels on multi-snap installs, so every snap gets its own
+        change but they are all submitted up front and waited on together, then
+        held in a single multi-snap change. A snap whose change fails falls back
+        to the one-by-one install path.
+
+        Args:
+            managers: the snaps to install.
+            progress: called with the progress of the slowest running change.
+
+        Returns:
+            The managers whose snap could not be installed.
+        """
+        changes = {}
+        fallback = []
+        for manager in managers:
+            try:
+                change_id = manager._start_install()
+            # OSError covers the TimeoutError of a base install outlasting its
+            # wait, as well as a local snap that cannot be read.
+            except (snap.Error, OSError, ValueError) as err:
+                logger.warning("Failed to submit install of %s: %s", manager.name, err)
+                fallback.append(manager)
+                continue
+            if change_id is not None:
+                changes[manager.name] = change_id
+
+        client = cls.snapd_client()
+        client.progress_callback = progress
+        try:
+            errors = client.wait_changes(changes)
+        finally:
+            client.progress_callback = None
+        cls.invalidate_cache()
+
+        installed = []
+        for manager in managers:
+            if manager in fallback:
+                continue
+            if errors.get(manager.name):
+                logger.warning(
+                    "Batched install of %s failed, retrying alone: %s",
+                    manager.name,
+                    errors[manager.name],
+                )
+                fallback.append(manager)
+                continue
+            logger.info("Installed snap %s from channel: %s", manager.name, manager.channel)
+            installed.append(manager)
+
+        if installed:
+            try:
+                cls.snapd_client().hold([manager.name for manager in installed])
+            except snap.Error as err:
+                logger.warning("Failed to hold snaps together, retrying alone: %s", err)
+                fallback.extend(installed)
+            cls.invalidate_cache()
+
+        return [manager for manager in fallback if not manager.install()]
 
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_fixed(1),
+        wait=wait_random_exponential(multiplier=0.25, max=2),
         retry=retry_if_result(lambda x: x is False),
         retry_error_callback=(lambda state: state.outcome.result()),  # type: ignore
     )
     def install(self) -> bool:
         """Install the snap exporter and required base if needed."""
+        if self.local_path is not None:
+            return self.install_local(self.local_path, self.dangerous) and self._hold()
+
+        client = self.snapd_client()
         try:
-            snap.add(self.name, channel=self.channel)
+            self._ensure_base()
+            if self.snap_client.present:
+                client.refresh(self.name, self.channel)
+            else:
+                client.install(self.name, self.channel)
             logger.info(
                 "Installed snap %s from channel: %s",
                 self.name,
@@ -49,26 +295,19 @@ class SnapManager:
                 "Failed to install %s from channel: %s '%s'", self.name, self.channel, err_msg
             )
 
-            # Snaps sometimes are built on an edge base, ie microovn with core26,
-            # this cannot be automatically installed as a dependacy due to its
-            # non stable status so we must detect and manually install it in
-            # these cases. We do this by checking for expected bases in the
-            # error message and then retrying installation with the new base.
-            #
-            # This is a non optimal solution, however the snap API doesn't allow
-            # us to check the expected base for anything other than the stable
-            # snap, which will by definition always have a stable base. This
-            # means we have to do the albeit clunky method of erroring and then
-            # fixing this.
+            # The base could not be resolved ahead of time, snapd names it in
+            # the error instead. Remember it so later installs of this channel
+            # get it up front, then retry the installation with it.
             regmatch = re.search(r'cannot install snap base "(core\d\d)"', err_msg)
             if regmatch:
                 snap_base = regmatch.group(1)
                 logger.info(
                     "Detected required base '%s', retrying installation with it", snap_base
                 )
+                _save_snap_base(f"{self.name}@{self.channel}", snap_base)
                 try:
-                    snap.add(snap_base, channel="latest/edge")
-                    snap.add(self.name, channel=self.channel)
+                    client.install(snap_base, SNAP_BASE_CHANNEL)
+                    client.install(self.name, self.channel)
                 except snap.SnapError as err:
                     logger.error("Retry with base %s failed: %s", snap_base, err)
                     return False
@@ -76,67 +315,101 @@ class SnapManager:
                     return False
         except Exception as _:
             return False
+        finally:
+            self.invalidate_cache()
+
+        return self._hold()
 
-        # Hold the snap after successful install
-        self.snap_client.hold()
+    def _hold(self) -> bool:
+        """Hold the snap after a successful install and check it is present."""
+        try:
+            self.snapd_client().hold([self.name])
+        except snap.Error as err:
+            logger.error("Failed to hold %s: %s", self.name, err)
+            return False
+        finally:
+            self.invalidate_cache()
         return self.snap_client.present is True
 
     def enable_and_start(self) -> bool:
         """Enable and start the snap services."""
         try:
-            self.snap_client.start(enable=True)
+            self.snapd_client().start([self.name], enable=True)
             logger.info("Enabled and started services for %s", self.name)
             return True
-        except snap.SnapError as err:
+        except (snap.Error, TimeoutError) as err:
             logger.error("Failed to enable and start services for %s: %s", self.name, err)
         return False
 
     def disable_and_stop(self) -> bool:
         """Disable and stop the snap services."""
         try:
-            self.snap_client.stop(disable=True)
+            self.snapd_client().stop([self.name], disable=True)
             logger.info("Disabled and stopped services for %s", self.name)
             return True
-        except snap.SnapError as err:
+        except (snap.Error, TimeoutError) as err:
             logger.error("Failed to disable and stop services for %s: %s", self.name, err)
         return False
 
     def remove(self) -> bool:
         """Remove the snap exporter."""
         try:
-            snap.remove(self.name)
+            self.snapd_client().remove(self.name)
             logger.info("Removed %s", self.name)
+            self.invalidate_cache()
             return self.snap_client.present is False
-        except snap.SnapError as err:
+        except (snap.Error, TimeoutError) as err:
             logger.error("Failed to remove %s: %s", self.name, err)
         return False
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_fixed(1),
-        retry=retry_if_result(lambda x: x is False),
-        retry_error_callback=(lambda state: state.outcome.result()),  # type: ignore
-    )
-    def connect(self, connections: List[Tuple[str, str | None]]) -> bool:
+    def connect(self, connections: List[PlugConnection]) -> bool:
         """Connect the specified interfaces for the snap exporter.
 
         Args:
             connections: A list of tuples where each tuple contains
                          (plug, slot) to connect.
+
+        Returns:
+            Whether every connection is established.
         """
-        for connection in connections:
-            plug, slot = connection
-            full_plug = f"{self.name}:{plug}"
+        results = self.connect_all(connections)
+        return all(error is None for error in results.values())
 
-            try:
-                self.snap_client.connect(plug, slot=slot)
-                logger.info("Connected plug %s for %s", full_plug, self.name)
-            except snap.SnapError as err:
-                logger.error(
-                    "Failed to connect plug %s for %s snap: %s",
-                    full_plug,
-                    self.name,
-                    err,
-                )
-                return False
-        return True
+    def connect_all(self, connections: List[PlugConnection]) -> Dict[PlugConnection, str | None]:
+        """Connect the specified interfaces in bulk, retrying only the failed ones.
+
+        Args:
+            connections: A list of tuples where each tuple contains
+                         (plug, slot) to connect.
+
+        Returns:
+            A mapping of every connection to None once it is established, or
+            to the last error that prevented it.
+        """
+        results: Dict[PlugConnection, str | None] = dict.fromkeys(connections, "not connected")
+        self._connect_pending(results)
+        return results
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_random_exponential(multiplier=0.25, max=2),
+        retry=retry_if_result(lambda x: x is False),
+        retry_error_callback=(lambda state: state.outcome.result()),  # type: ignore
+    )
+    def _connect_pending(self, results: Dict[PlugConnection, str | None]) -> bool:
+        """Connect the connections not established yet and record their results."""
+        pending = [connection for connection, error in results.items() if error is not None]
+        try:
+            results.update(self.snapd_client().connect_many(self.name, pending))
+        except snap.Error as err:
+            results.update(dict.fromkeys(pending, str(err)))
+        finally:
+            self.invalidate_cache()
+
+        for connection in pending:
+            plug, error = connection[0], results[connection]
+            if error is None:
+                logger.info("Connected plug %s:%s", self.name, plug)
+            else:
+                logger.error("Failed to connect plug %s for %s snap: %s", plug, self.name, error)
+        return all(error is None for error in results.values())
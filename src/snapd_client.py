@@ -0,0 +1,589 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""A snapd REST client able to drive several snap changes at once."""
+
+from __future__ import annotations
+
+import http.client
+import io
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+import typing
+import urllib.parse
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Mapping, Sequence, Tuple, TypeVar
+
+from charms.operator_libs_linux.v2 import snap
+
+logger = logging.getLogger(__name__)
+
+# snapd answers a refresh of an up to date snap, or the removal of a snap
+# that is not installed, with these error kinds.
+SNAP_NO_UPDATE_KIND = "snap-no-update-available"
+SNAP_NOT_INSTALLED_KIND = "snap-not-installed"
+
+# Change polling starts at the snap client's own 100 ms, backs off while a
+# change runs and tightens again once its running task is nearly done.
+POLL_MIN_INTERVAL = 0.1
+POLL_MAX_INTERVAL = 2.0
+POLL_BACKOFF = 1.5
+POLL_NEAR_DONE = 0.9
+
+# A plug of a snap and the slot it connects to, as "snap:slot" or "snap", or
+# None to let snapd pick the slot.
+PlugConnection = Tuple[str, "str | None"]
+
+K = TypeVar("K", bound=Hashable)
+
+# How sending over a pooled connection the server closed while it was idle
+# fails. Only these are retried, any other failure, such as a timeout while
+# reading the response, may come after the request was acted upon.
+RECONNECT_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+# The catalog of every snap name in the store, one per line.
+SNAP_NAMES_FILE = "/var/cache/snapd/names"
+
+
+@dataclass
+class RequestStats:
+    """Latency counters for one kind of snapd request."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def record(self, elapsed: float) -> None:
+        """Account for one request that took elapsed seconds."""
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+
+@dataclass(frozen=True)
+class ChangeProgress:
+    """Progress of the running task of a snapd change, ie bytes of a download."""
+
+    kind: str
+    summary: str
+    done: int
+    total: int
+
+    @property
+    def fraction(self) -> float:
+        """Return how much of the task is done, between 0 and 1."""
+        return self.done / self.total if self.total > 0 else 0.0
+
+
+def _change_progress(change: dict) -> ChangeProgress | None:
+    """Return the progress of the first running task of a change."""
+    for task in change.get("tasks") or []:
+        if task.get("status") != "Doing":
+            continue
+        progress = task.get("progress") or {}
+        return ChangeProgress(
+            kind=change.get("kind", ""),
+            summary=task.get("summary", ""),
+            done=int(progress.get("done", 0)),
+            total=int(progress.get("total", 0)),
+        )
+    return None
+
+
+class ConnectionPool:
+    """Keep-alive HTTP connections to a unix socket, ie snapd's."""
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> tuple[http.client.HTTPConnection, bool]:
+        """Return a connection and whether it was reused from an earlier request."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        connection = snap._UnixSocketConnection(
+            "localhost", timeout=self.timeout, socket_path=self.socket_path
+        )
+        return connection, False
+
+    def release(self, connection: http.client.HTTPConnection) -> None:
+        """Hand a connection back for the next request."""
+        with self._lock:
+            self._idle.append(connection)
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._idle.clear()
+
+
+class SnapdClient(snap.SnapClient):
+    """Extend the snap library client with asynchronous snap changes.
+
+    The library client waits on every change it starts, this one can submit
+    several changes to snapd and then wait for all of them together. Requests
+    also go over keep-alive connections shared by every client of the same
+    socket, instead of a new connection per request.
+    """
+
+    _pools: Dict[str, ConnectionPool] = {}
+    stats: Dict[str, RequestStats] = {}
+    change_stats: Dict[str, RequestStats] = {}
+
+    def __init__(
+        self,
+        socket_path: str = "/run/snapd.socket",
+        base_url: str = "http://localhost/v2/",
+        timeout: float = 60.0,
+        **kwargs,
+    ):
+        super().__init__(socket_path=socket_path, base_url=base_url, timeout=timeout, **kwargs)
+        self._path_prefix = urllib.parse.urlsplit(base_url).path
+        if socket_path not in self._pools:
+            self._pools[socket_path] = ConnectionPool(socket_path, timeout)
+        self._pool = self._pools[socket_path]
+        self._change_data: Dict[str, snap.JSONType | None] = {}
+        # When each change was submitted, so its duration covers it whole.
+        self._change_started: Dict[str, float] = {}
+        self.progress_callback: Callable[[ChangeProgress], None] | None = None
+
+    @classmethod
+    def reset_stats(cls) -> None:
+        """Clear the request latency and change duration counters."""
+        cls.stats = {}
+        cls.change_stats = {}
+
+    def _request_raw(  # pyright: ignore[reportIncompatibleMethodOverride]
+        self,
+        method: str,
+        path: str,
+        query: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        data: bytes | Sequence[bytes | memoryview] | None = None,
+    ) -> io.BytesIO:
+        """Make a request to snapd over a pooled connection and return its body.
+
+        A reused connection may have been closed by snapd while idle, in which
+        case the request is sent again over a fresh connection. Large
+        bodies can be given as a sequence of buffers, sent one after the other.
+        """
+        target = self._path_prefix + path
+        if query:
+            target = target + "?" + urllib.parse.urlencode(query)
+
+        start = time.monotonic()
+        while True:
+            connection, reused = self._pool.acquire()
+            try:
+                connection.request(method, target, body=data, headers=headers or {})
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError) as err:
+                connection.close()
+                if reused and isinstance(err, RECONNECT_ERRORS):
+                    logger.debug("Reconnecting to snapd after: %s", err)
+                    continue
+                raise snap.SnapAPIError({}, 500, "Not found", str(err)) from err
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._pool.release(connection)
+
+        kind = f"{method} {path.split('/')[0]}"
+        self.stats.setdefault(kind, RequestStats()).record(time.monotonic() - start)
+
+        if response.status >= 400:
+            message = ""
+            try:
+                result = json.loads(body.decode())["result"]
+            except (ValueError, KeyError) as err:
+                result = {}
+                message = f"{type(err).__name__} - {err}"
+            raise snap.SnapAPIError(result, response.status, response.reason, message)
+        return io.BytesIO(body)
+
+    def _submit(self, method: str, path: str, body: Dict[str, snap.JSONAble]) -> str | None:
+        """Start a snapd change and return its id without waiting for it.
+
+        Returns None when snapd had nothing to do.
+        """
+        headers = {"Accept": "application/json", "Content-Type": "application/json"}
+        data = json.dumps(body).encode("utf-8")
+        started = time.monotonic()
+        try:
+            response = self._request_raw(method, path, None, headers, data)
+        except snap.SnapAPIError as err:
+            if err.body.get("kind") in (SNAP_NO_UPDATE_KIND, SNAP_NOT_INSTALLED_KIND):
+                return None
+            raise
+        return self._track_change(_change_id(response), started)
+
+    def _track_change(self, change_id: str | None, started: float) -> str | None:
+        """Remember when a change was submitted, returning its id."""
+        if change_id is not None:
+            self._change_started[change_id] = started
+        return change_id
+
+    def install_async(self, name: str, channel: str) -> str | None:
+        """Start installing a snap from the given channel."""
+        return self._submit("POST", f"snaps/{name}", {"action": "install", "channel": channel})
+
+    def refresh_async(self, name: str, channel: str) -> str | None:
+        """Start refreshing a snap to the given channel."""
+        return self._submit("POST", f"snaps/{name}", {"action": "refresh", "channel": channel})
+
+    def sideload_async(self, path: str, dangerous: bool = False) -> str | None:
+        """Start installing a snap from a local file.
+
+        The file is mapped into memory and streamed to snapd as the file part
+        of a multipart form rather than read whole.
+
+        Args:
+            path: the snap file to install.
+            dangerous: install it without its assertions having been acknowledged.
+        """
+        boundary = uuid.uuid4().hex
+        fields = {"action": "install"}
+        if dangerous:
+            fields["dangerous"] = "true"
+        head = "".join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        )
+        head += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="snap"; filename="{os.path.basename(path)}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        )
+        tail = f"\r\n--{boundary}--\r\n".encode()
+
+        started = time.monotonic()
+        with (
+            open(path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+            memoryview(mapped) as content,
+        ):
+            parts = [head.encode(), content, tail]
+            headers = {
+                "Accept": "application/json",
+                "Content-Type": f"multipart/form-data; boundary={boundary}",
+                "Content-Length": str(sum(len(part) for part in parts)),
+            }
+            response = self._request_raw("POST", "snaps", None, headers, parts)
+        return self._track_change(_change_id(response), started)
+
+    def sideload(self, path: str, dangerous: bool = False) -> None:
+        """Install a snap from a local file, see sideload_async."""
+        if (change_id := self.sideload_async(path, dangerous)) is not None:
+            self._wait(change_id)
+
+    def ack(self, assertions: bytes) -> None:
+        """Add assertions, such as those of a local snap file, to the system database."""
+        headers = {"Accept": "application/json", "Content-Type": "application/x.ubuntu.assertion"}
+        self._request_raw("POST", "assertions", None, headers, assertions)
+
+    def _run(self, method: str, path: str, body: Dict[str, snap.JSONAble]) -> None:
+        """Run a snapd change to completion."""
+        if (change_id := self._submit(method, path, body)) is not None:
+            self._wait(change_id)
+
+    def install(self, name: str, channel: str) -> None:
+        """Install a snap from the given channel."""
+        self._run("POST", f"snaps/{name}", {"action": "install", "channel": channel})
+
+    def refresh(self, name: str, channel: str) -> None:
+        """Refresh a snap to the given channel, doing nothing if it is up to date."""
+        self._run("POST", f"snaps/{name}", {"action": "refresh", "channel": channel})
+
+    def remove(self, name: str) -> None:
+        """Remove a snap, doing nothing if it is not installed."""
+        self._run("POST", f"snaps/{name}", {"action": "remove"})
+
+    def start(self, names: List[str], enable: bool = False) -> None:
+        """Start the given snaps or snap services, optionally enabling them."""
+        self._run("POST", "apps", {"action": "start", "names": names, "enable": enable})
+
+    def stop(self, names: List[str], disable: bool = False) -> None:
+        """Stop the given snaps or snap services, optionally disabling them."""
+        self._run("POST", "apps", {"action": "stop", "names": names, "disable": disable})
+
+    def connect_async(self, snap_name: str, plug: str, slot: str | None = None) -> str | None:
+        """Start connecting a plug of a snap to a slot.
+
+        Args:
+            snap_name: the snap owning the plug.
+            plug: the name of the plug.
+            slot: the slot as "snap:slot" or "snap", None to let snapd pick it.
+        """
+        slot_snap, _, slot_name = (slot or "").partition(":")
+        return self._submit(
+            "POST",
+            "interfaces",
+            {
+                "action": "connect",
+                "plugs": [{"snap": snap_name, "plug": plug}],
+                "slots": [{"snap": slot_snap, "slot": slot_name}],
+            },
+        )
+
+    def connect(self, snap_name: str, plug: str, slot: str | None = None) -> None:
+        """Connect a plug of a snap to a slot, see connect_async."""
+        if (change_id := self.connect_async(snap_name, plug, slot)) is not None:
+            self._wait(change_id)
+
+    def connections(self, snap_name: str) -> Dict[str, List[str]]:
+        """Return the established connections of a snap's plugs.
+
+        Returns:
+            A mapping of plug name to the "snap:slot" slots it is connected to.
+        """
+        result = typing.cast(dict, self._request("GET", "connections", {"snap": snap_name}))
+        established: Dict[str, List[str]] = {}
+        for connection in result.get("established") or []:
+            plug, slot = connection["plug"], connection["slot"]
+            if plug["snap"] == snap_name:
+                established.setdefault(plug["plug"], []).append(f"{slot['snap']}:{slot['slot']}")
+        return established
+
+    def connect_many(
+        self, snap_name: str, connections: List[PlugConnection]
+    ) -> Dict[PlugConnection, str | None]:
+        """Connect several plugs of a snap, one snapd change after another.
+
+        snapd takes a single plug and slot per interfaces request and refuses a
+        change on a snap while another one on it is still running, so every
+        missing connection is submitted once the previous change is done.
+        Connections already established are skipped.
+
+        Returns:
+            A mapping of every connection to None once it is established, or to
+            the error that prevented it.
+        """
+        try:
+            established = self.connections(snap_name)
+        except snap.Error as err:
+            logger.debug("Cannot list the connections of %s: %s", snap_name, err)
+            established = {}
+
+        results: Dict[PlugConnection, str | None] = {}
+        for connection in connections:
+            plug, slot = connection
+            if _is_connected(established.get(plug, []), slot):
+                logger.debug("Plug %s:%s is already connected", snap_name, plug)
+                results[connection] = None
+                continue
+            try:
+                change_id = self.connect_async(snap_name, plug, slot)
+            except snap.Error as err:
+                results[connection] = str(err)
+                continue
+            if change_id is None:
+                results[connection] = None
+            else:
+                results.update(self.wait_changes({connection: change_id}))
+        return results
+
+    def find(self, name: str) -> Dict[str, snap.JSONType]:
+        """Return the store information of a snap, including its channel map."""
+        return typing.cast(list, self._request("GET", "find", {"name": name}))[0]
+
+    def hold(self, names: List[str]) -> None:
+        """Hold refreshes of all the given snaps forever in a single change."""
+        self._request(
+            "POST",
+            "snaps",
+            body={"action": "hold", "snaps": names, "time": "forever", "hold-level": "general"},
+        )
+
+    def _report_progress(self, running: List[ChangeProgress]) -> None:
+        """Report the progress of the slowest of the running changes.
+
+        It is reported once per poll, as reporting every change would make the
+        progress shown alternate between them.
+        """
+        measured = [progress for progress in running if progress.total > 0]
+        if measured and self.progress_callback is not None:
+            self.progress_callback(min(measured, key=lambda progress: progress.fraction))
+
+    def _finish_change(self, change_id: str, change: dict, waited_since: float) -> str | None:
+        """Record a finished change and return its error, or None if it succeeded.
+
+        Its duration runs from when it was submitted, or from when the wait
+        began for a change this client did not submit.
+        """
+        kind = change.get("kind") or "unknown"
+        started = self._change_started.pop(change_id, waited_since)
+        self.change_stats.setdefault(kind, RequestStats()).record(time.monotonic() - started)
+
+        status = change["status"]
+        if status not in ("Done", "Wait"):
+            return change.get("err") or (
+                f"snap change {change.get('kind')!r} id {change_id} failed with status {status}"
+            )
+        if status == "Wait":
+            logger.warning("snap change %s succeeded with status 'Wait'", change_id)
+        self._change_data[change_id] = change.get("data")
+        return None
+
+    def _wait(self, change_id: str, timeout: float = 300) -> snap.JSONType | None:
+        """Wait for an async change to complete, polling less often while it runs.
+
+        Raises:
+            TimeoutError: the change is still running after the timeout.
+            SnapError: the change failed.
+        """
+        results = self._poll_changes({change_id: change_id}, timeout)
+        if (error := results[change_id]) is not None:
+            raise snap.SnapError(error)
+        return self._change_data.pop(change_id, None)
+
+    def wait_changes(self, changes: Mapping[K, str], timeout: float = 300) -> Dict[K, str | None]:
+        """Wait for several snapd changes to complete.
+
+        Args:
+            changes: a mapping of a caller chosen key to a snapd change id.
+            timeout: the overall time to wait for all the changes.
+
+        Returns:
+            A mapping of every key to None if its change succeeded, or to the
+            error reported by snapd otherwise, a timeout for those still running.
+        """
+        results: Dict[K, str | None] = {}
+        try:
+            self._poll_changes(changes, timeout, results)
+        except TimeoutError:
+            for key, change_id in changes.items():
+                results.setdefault(key, f"timeout waiting for snap change {change_id}")
+        return results
+
+    def _poll_changes(
+        self,
+        changes: Mapping[K, str],
+        timeout: float,
+        results: Dict[K, str | None] | None = None,
+    ) -> Dict[K, str | None]:
+        """Poll snapd changes until they are all done, filling in their results.
+
+        Polling starts every POLL_MIN_INTERVAL seconds and backs off up to
+        POLL_MAX_INTERVAL while changes run, tightening again once a running
+        task is close to done.
+
+        Raises:
+            TimeoutError: changes are still running after the timeout, the
+                results of those that finished are filled in already.
+        """
+        if results is None:
+            results = {}
+        pending = dict(changes)
+        waited_since = time.monotonic()
+        deadline = waited_since + timeout
+        interval = POLL_MIN_INTERVAL
+        while pending:
+            running: List[ChangeProgress] = []
+            for key, change_id in list(pending.items()):
+                change = typing.cast(dict, self._request("GET", f"changes/{change_id}"))
+                if change["status"] in ("Do", "Doing"):
+                    if (progress := _change_progress(change)) is not None:
+                        running.append(progress)
+                    continue
+                del pending[key]
+                results[key] = self._finish_change(change_id, change, waited_since)
+            if not pending:
+                break
+            if time.monotonic() > deadline:
+                ids = ", ".join(pending.values())
+                raise TimeoutError(f"snap changes {ids} not done after {timeout:.0f}s")
+            self._report_progress(running)
+            if any(progress.fraction >= POLL_NEAR_DONE for progress in running):
+                interval = POLL_MIN_INTERVAL
+            else:
+                interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+            time.sleep(interval)
+        return results
+
+
+def _change_id(response: io.BytesIO) -> str | None:
+    """Return the id of the change started by a request, None if it ran synchronously."""
+    result = json.loads(response.read().decode())
+    if result["type"] != "async":
+        return None
+    return result["change"]
+
+
+def _is_connected(slots: List[str], slot: str | None) -> bool:
+    """Check whether a plug connected to the given "snap:slot" slots reaches a slot."""
+    if slot is None:
+        return bool(slots)
+    if ":" in slot:
+        return slot in slots
+    return any(connected.partition(":")[0] == slot for connected in slots)
+
+
+class SnapCatalog:
+    """Look up snap names in the snapd catalog file without loading it.
+
+    The file is mapped into memory the first time a name is looked up and
+    searched in place, rather than copying tens of thousands of names into
+    a dict on every hook.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or SNAP_NAMES_FILE
+        self._index: mmap.mmap | None = None
+        self._loaded = False
+
+    def _load(self) -> mmap.mmap | None:
+        if not self._loaded:
+            self._loaded = True
+            try:
+                with open(self.path, "rb") as f:
+                    if os.fstat(f.fileno()).st_size > 0:
+                        self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except OSError:
+                # snapd refreshes the catalog infrequently, it may not exist yet.
+                self._index = None
+        return self._index
+
+    def __contains__(self, name: object) -> bool:
+        """Check whether the catalog lists a snap name."""
+        if not isinstance(name, str) or not name:
+            return False
+        index = self._load()
+        if index is None:
+            return False
+        line = name.encode() + b"\n"
+        return index[: len(line)] == line or index.find(b"\n" + line) != -1
+
+
+class LazySnapCache(snap.SnapCache):
+    """A SnapCache that does not load the snap catalog up front.
+
+    Only installed snaps are listed when the cache is built, other snaps are
+    looked up through snapd when asked for and catalog membership is checked
+    on demand against a SnapCatalog. Iterating the cache therefore only
+    yields the installed snaps and those already looked up.
+    """
+
+    def __init__(self):
+        if not self.snapd_installed:
+            raise snap.SnapError("snapd is not installed or not in /usr/bin") from None
+        self._snap_client = SnapdClient()
+        self._snap_map: Dict[str, snap.Snap | None] = {}
+        self._catalog = SnapCatalog()
+        self._load_installed_snaps()
+
+    def __contains__(self, key: object) -> bool:
+        """Check if a snap is installed, already looked up or in the catalog."""
+        return key in self._snap_map or key in self._catalog
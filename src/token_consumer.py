@@ -0,0 +1,380 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""The charm's consumer of the microcluster token distributor library."""
+
+from __future__ import annotations
+
+import json
+import logging
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+import ops
+from charms.microcluster_token_distributor.v0.token_distributor import (
+    EMPTY_STRING,
+    MIRROR_PREFIX,
+    TokenConsumer,
+    corroborate,
+    get_hostname,
+)
+
+from command_runner import CommandRunner
+from constants import (
+    PENDING_BACKOFF_INITIAL,
+    PENDING_BACKOFF_MAX,
+    PENDING_WAIT_TIMEOUT,
+    TOKEN_WORKERS,
+)
+from utils import MICROOVN_READ_ONLY_COMMANDS, CommandCache
+
+logger = logging.getLogger(__name__)
+
+
+class ClusterMembership:
+    """A snapshot of the cluster members, as listed by `cluster list -f json`.
+
+    The members are indexed by name, role and status.
+    """
+
+    def __init__(self, members: List[dict]):
+        self.members = members
+        self.by_name = {member["name"]: member for member in members}
+        self.by_role: Dict[str, List[str]] = {}
+        self.by_status: Dict[str, List[str]] = {}
+        for member in members:
+            self.by_role.setdefault(member["role"], []).append(member["name"])
+            self.by_status.setdefault(member["status"], []).append(member["name"])
+
+    @classmethod
+    def from_json(cls, output: str) -> ClusterMembership:
+        """Parse the output of `cluster list -f json`."""
+        return cls(json.loads(output))
+
+    def names(self, role: Optional[str] = None, status: Optional[str] = None) -> List[str]:
+        """Return the names of the members with the given role and status."""
+        names = self.by_role.get(role, []) if role is not None else list(self.by_name)
+        if status is not None:
+            names = [name for name in names if name in self.by_status.get(status, [])]
+        return names
+
+    @property
+    def pending(self) -> bool:
+        """Return whether any member is still pending."""
+        return bool(self.by_role.get("PENDING"))
+
+    @property
+    def communicator(self) -> Optional[str]:
+        """Return the member that generates tokens, the lowest named online voter."""
+        voters = self.names(role="voter", status="ONLINE")
+        return min(voters) if voters else None
+
+
+@dataclass(frozen=True)
+class MirrorIndex:
+    """An immutable view of the data in the up mirrors of a relation.
+
+    mirrors: the remote units whose mirror is up
+    values: the corroborated value of every key in those mirrors
+    empty: the keys whose corroborated value is empty, ie awaiting a token
+    local_keys: the keys in this unit's side of the mirror
+    local_only: the empty keys that only this unit holds a value for
+    any_data: whether any remote unit has a non empty value
+    """
+
+    mirrors: Tuple[ops.Unit, ...]
+    values: Mapping[str, str]
+    empty: FrozenSet[str]
+    local_keys: FrozenSet[str]
+    local_only: FrozenSet[str]
+    any_data: bool
+
+    @classmethod
+    def build(cls, relation: ops.Relation, unit: ops.Unit) -> MirrorIndex:
+        """Index the mirror data of a relation, as seen by the given unit."""
+        mirrors = []
+        candidates: Dict[str, List[str]] = {}
+        any_data = False
+        for remote in relation.units:
+            data = relation.data[remote]
+            up = data.get("mirror") == "up"
+            if up:
+                mirrors.append(remote)
+            for mirror_key, value in data.items():
+                if not mirror_key.startswith(MIRROR_PREFIX) or not value:
+                    continue
+                any_data = any_data or value != EMPTY_STRING
+                if up:
+                    # A list, in case the key is in several mirrors.
+                    candidates.setdefault(mirror_key[len(MIRROR_PREFIX) :], []).append(value)
+
+        values = {
+            key: corroborate(items, default=EMPTY_STRING) for key, items in candidates.items()
+        }
+        empty = frozenset(key for key, value in values.items() if value == EMPTY_STRING)
+        local = {
+            mirror_key[len(MIRROR_PREFIX) :]: value
+            for mirror_key, value in relation.data[unit].items()
+            if mirror_key.startswith(MIRROR_PREFIX)
+        }
+        return cls(
+            mirrors=tuple(mirrors),
+            values=MappingProxyType(values),
+            empty=empty,
+            local_keys=frozenset(local),
+            local_only=frozenset(
+                key for key in empty if local.get(key) not in (None, EMPTY_STRING)
+            ),
+            any_data=any_data,
+        )
+
+
+class MicroovnTokenConsumer(TokenConsumer):
+    """The library's TokenConsumer, tuned for the charm.
+
+    The library is fetched from Charmhub, so the charm's changes to how it
+    works are kept here rather than in its copy under lib/:
+
+    - the cluster commands run through the CommandCache, with a timeout.
+    - the mirror lookups are answered from a MirrorIndex built once per hook.
+    - the cluster membership is listed once per hook, and units that are
+      members already get no token.
+    - the tokens of a bulk scale out are generated concurrently, and added
+      to the mirror together.
+    - the wait for pending members is bounded, the token work is left to
+      update-status when they outlast it.
+    """
+
+    def __init__(self, charm: ops.CharmBase, relation_name: str, command_name: List[str]):
+        super().__init__(charm, relation_name, command_name)
+        # The mirror indexes built during this hook by relation id, see mirror_index.
+        self._mirror_indexes: Dict[int, MirrorIndex] = {}
+        # The cluster membership listed during this hook, see _cluster_membership.
+        self._membership: Optional[ClusterMembership] = None
+        # Set when pending members outlasted the wait, see _wait_for_pending.
+        self._stored.set_default(pending_wait=False)
+        self._stored.set_default(pending_since={})
+
+        self.framework.observe(self.charm.on.update_status, self._on_update_status)
+
+    @property
+    def waiting_on_pending(self) -> bool:
+        """Return whether the token work was left to a later hook, waiting on pending nodes."""
+        return self._stored.pending_wait
+
+    def _call_cluster_command(self, *args) -> Tuple[int, str]:
+        """Run a cluster command, returning its return code and output.
+
+        The output is parsed rather than logged, as it holds the join tokens.
+        """
+        command = (*self.command_name, *args)
+        if args[:1] != ("list",):
+            # the command may change the membership
+            self._membership = None
+        result = CommandCache.run(
+            command,
+            MICROOVN_READ_ONLY_COMMANDS,
+            lambda: CommandRunner.run(
+                command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            ),
+        )
+        return result.returncode, result.stdout
+
+    def _cluster_membership(self, refresh: bool = False) -> Optional[ClusterMembership]:
+        """Return the cluster membership, listed once per hook.
+
+        It is listed again when refresh is set or a cluster command may have
+        changed the membership, None if it cannot be listed.
+        """
+        if refresh:
+            # the members may have joined since it was memoized
+            CommandCache.invalidate()
+        if self._membership is None or refresh:
+            self._membership = None
+            error, output = self._call_cluster_command("list", "-f", "json")
+            if error:
+                logger.error("Calling cluster list failed with code %s", error)
+                return None
+            self._membership = ClusterMembership.from_json(output)
+        return self._membership
+
+    def mirror_index(self, relation: ops.Relation) -> MirrorIndex:
+        """Return the index of the mirror, built once per hook.
+
+        Remote data does not change during a hook, the index is only built
+        again after this unit adds data to the mirror.
+        """
+        if relation.id not in self._mirror_indexes:
+            self._mirror_indexes[relation.id] = MirrorIndex.build(relation, self.charm.unit)
+        return self._mirror_indexes[relation.id]
+
+    def add_to_mirror(self, relation: ops.Relation, data: dict[str, str]) -> None:
+        """Add data into the unit's databag in a mirrorable form, in one relation-set."""
+        relation.data[self.charm.unit].update(
+            {self._to_mirror_key(key): value for key, value in data.items()}
+        )
+        self._mirror_indexes.pop(relation.id, None)
+
+    def find_value(self, relation: ops.Relation, key: str, keep_empty=True) -> bool | str:
+        """Find the corroborated value of a key in the mirror.
+
+        Return False if it is not found, or if it is empty unless keep_empty
+        is set.
+        """
+        value = self.mirror_index(relation).values.get(key)
+        if value is None or (not keep_empty and value == EMPTY_STRING):
+            return False
+        return value
+
+    def any_data_exists(self, relation: ops.Relation) -> bool:
+        """Check if there is any non empty value on the remote side of the mirror."""
+        return self.mirror_index(relation).any_data
+
+    def find_mirrors(self, relation: ops.Relation) -> list[ops.Unit]:
+        """Find all remote mirror units."""
+        return list(self.mirror_index(relation).mirrors)
+
+    def get_relevant_mirror_data(self, relation: ops.Relation, keep_empty=True) -> dict[str, str]:
+        """Return the corroborated data in the mirror, by key without the mirror prefix.
+
+        If keep_empty is set, a value of empty is treated as a valid value.
+        """
+        index = self.mirror_index(relation)
+        if keep_empty:
+            return dict(index.values)
+        return {key: value for key, value in index.values.items() if key not in index.empty}
+
+    def _safely_down_mirror(self, relation: ops.Relation) -> None:
+        # keep the mirror up while it holds tokens only this unit has
+        mirror = "up" if self.mirror_index(relation).local_only else "down"
+        relation.data[self.charm.unit]["mirror"] = mirror
+
+    def _update_tokens(self, relation: ops.Relation) -> bool:
+        """Generate tokens for the keys awaiting one, returning whether any was added.
+
+        Keys already in this unit's side of the mirror, or that are cluster
+        members already, are skipped.
+        """
+        index = self.mirror_index(relation)
+        membership = self._cluster_membership()
+        members = membership.by_name if membership is not None else {}
+        hostnames = [
+            key
+            for key in index.values
+            if key in index.empty and key not in index.local_keys and key not in members
+        ]
+        tokens = self._generate_tokens(hostnames)
+        if not tokens:
+            return False
+
+        self.add_to_mirror(relation, tokens)
+        logger.info("Added tokens for %s", ", ".join(tokens))
+        for _ in tokens:
+            self.on.token_generated.emit()
+        return True
+
+    def _generate_tokens(self, hostnames: List[str]) -> Dict[str, str]:
+        """Generate tokens for the hostnames, up to TOKEN_WORKERS at once.
+
+        Returns:
+            The tokens by hostname, leaving out those that failed.
+        """
+        if not hostnames:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(TOKEN_WORKERS, len(hostnames))) as executor:
+            results = list(
+                executor.map(lambda key: self._call_cluster_command("add", key), hostnames)
+            )
+
+        tokens = {}
+        for hostname, (error, token) in zip(hostnames, results):
+            if error:
+                logger.info("Generating a token for %s failed with code %s", hostname, error)
+                continue
+            tokens[hostname] = token.strip()
+        return tokens
+
+    def _wait_for_pending(self) -> bool:
+        """Wait for pending members to join, up to PENDING_WAIT_TIMEOUT.
+
+        Members stuck pending since earlier hooks are left out, so tokens are
+        still generated for the other units.
+
+        Return False when the membership cannot be listed, or when members are
+        still pending at the deadline. The pending flag is then stored and the
+        wait is tried again on a later hook.
+        """
+        previous_status = self.charm.unit.status
+        self.charm.unit.status = ops.WaitingStatus("Waiting on pending nodes")
+        deadline = time.monotonic() + PENDING_WAIT_TIMEOUT
+        delay = PENDING_BACKOFF_INITIAL
+        membership = self._cluster_membership()
+        stuck = None
+        while membership is not None:
+            ages = self._pending_ages(membership.names(role="PENDING"))
+            if stuck is None:
+                stuck = {name for name, age in ages.items() if age >= PENDING_WAIT_TIMEOUT}
+                if stuck:
+                    logger.warning(
+                        "Not waiting on nodes stuck pending: %s", ", ".join(sorted(stuck))
+                    )
+            ages = {name: age for name, age in ages.items() if name not in stuck}
+            if not ages:
+                self._stored.pending_wait = False
+                self.charm.unit.status = previous_status
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                pending = ", ".join(f"{name} ({age:.0f}s)" for name, age in sorted(ages.items()))
+                logger.warning("Still waiting on pending nodes %s, deferring", pending)
+                self._stored.pending_wait = True
+                self.charm.unit.status = ops.WaitingStatus(f"Waiting on pending nodes: {pending}")
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, PENDING_BACKOFF_MAX)
+            membership = self._cluster_membership(refresh=True)
+        return False
+
+    def _pending_ages(self, pending: List[str]) -> Dict[str, float]:
+        """Return how long each pending member has been pending for, across hooks."""
+        now = time.time()
+        since = {name: self._stored.pending_since.get(name, now) for name in pending}
+        self._stored.pending_since = since
+        return {name: now - first_seen for name, first_seen in since.items()}
+
+    def _is_communicator_node(self) -> bool:
+        # the library's check is private to it, so it is redone here
+        if not self._stored.in_cluster or not self._wait_for_pending():
+            return False
+        # the snapshot the pending wait left only has stuck pending members
+        return self._cluster_membership().communicator == get_hostname()
+
+    def _handle_mirror(self, relation: ops.Relation) -> bool:
+        self._update_mirror_state(relation)
+        if self._stored.pending_wait:
+            # left to a later hook
+            return False
+        if self._is_communicator_node():
+            return self._update_tokens(relation)
+        return False
+
+    def _update_mirror_state(self, relation: ops.Relation) -> None:
+        logger.info("Updating mirror status")
+        if self._is_communicator_node():
+            relation.data[self.charm.unit]["mirror"] = "up"
+        elif self._stored.pending_wait:
+            logger.info("Pending nodes, leaving the mirror as it is")
+        elif relation.data[self.charm.unit].get("mirror"):
+            self._safely_down_mirror(relation)
+
+    def _on_update_status(self, event: ops.UpdateStatusEvent) -> None:
+        # resume the work a pending wait left
+        if not self._stored.in_cluster or not self._stored.pending_wait:
+            return
+        if relation := self.charm.model.get_relation(self.relation_name):
+            self._stored.pending_wait = False
+            self._handle_mirror(relation)
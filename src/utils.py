@@ -3,18 +3,156 @@
 
 """Utilities for the charm."""
 
+import http.client
 import logging
 import subprocess
+import threading
+import time
+from typing import Callable, Dict, Sequence, Tuple
+from urllib.parse import urlsplit
 
-import requests
-from tenacity import retry, retry_if_result, stop_after_attempt, wait_fixed
+from cluster_status import ClusterStatus
+from command_runner import CommandRunner
+from constants import MICROOVN_CONTROL_SOCKET
+from microovn_client import MicroovnAPIError, MicroovnClient
+from readiness import wait_until
 
 logger = logging.getLogger(__name__)
 
+# Commands whose result only changes when another command is run.
+MICROOVN_READ_ONLY_COMMANDS = (("status",), ("cluster", "list"), ("config", "get"))
+OVS_VSCTL_READ_ONLY_COMMANDS = (("get",), ("list",))
+
+# Commands that neither change anything nor are worth memoizing.
+UNCACHED_COMMANDS = (("waitready",),)
+
+# The metrics probe only reads the exposition up to the first sample of an
+# OVN metric family, and gives up once it read this much without finding one.
+METRICS_FAMILY_PREFIX = b"ovn_"
+METRICS_PROBE_MAX_BYTES = 256 * 1024
+METRICS_PROBE_DEADLINE = 10.0
+METRICS_PROBE_TIMEOUT = 2.0
+METRICS_PROBE_BACKOFF = (0.25, 2.0)
+
+MICROOVN_READY_TIMEOUT = 60.0
+
+_cluster_status: ClusterStatus | None = None
+
+
+class CommandCache:
+    """Memoize the read-only commands run during a hook dispatch.
+
+    Any other command may change what they return, so running one drops
+    every memoized result, as well as the memoized cluster status.
+    """
+
+    _results: Dict[Tuple[str, ...], subprocess.CompletedProcess[str]] = {}
+    hits: Dict[str, int] = {}
+    misses: Dict[str, int] = {}
+
+    @classmethod
+    def reset(cls) -> None:
+        """Drop the memoized results and the hit and miss counts."""
+        cls.invalidate()
+        cls.hits = {}
+        cls.misses = {}
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """Drop the memoized results, as something changed what they return."""
+        cls._results = {}
+        invalidate_cluster_status()
+
+    @classmethod
+    def log_stats(cls) -> None:
+        """Log the hit and miss counts of the commands run since the last reset."""
+        for label in sorted(cls.hits.keys() | cls.misses.keys()):
+            logger.info(
+                "%s: %d cache hits, %d misses",
+                label,
+                cls.hits.get(label, 0),
+                cls.misses.get(label, 0),
+            )
+
+    @classmethod
+    def run(
+        cls,
+        command: Tuple[str, ...],
+        read_only: Sequence[Tuple[str, ...]],
+        run: Callable[[], subprocess.CompletedProcess[str]],
+    ) -> subprocess.CompletedProcess[str]:
+        """Return the memoized result of a read-only command, running it otherwise.
+
+        Args:
+            command: the program and its arguments.
+            read_only: the argument prefixes of the program's read-only commands.
+            run: runs the command.
+        """
+        args = command[1:]
+        prefix = next((p for p in read_only if args[: len(p)] == p), None)
+        if prefix is None:
+            if args not in UNCACHED_COMMANDS:
+                cls.invalidate()
+            return run()
+
+        label = " ".join(command[: len(prefix) + 1])
+        if command in cls._results:
+            cls.hits[label] = cls.hits.get(label, 0) + 1
+            return cls._results[command]
+        cls.misses[label] = cls.misses.get(label, 0) + 1
+        result = run()
+        # Failures are not memoized, they may well be transient.
+        if result.returncode == 0:
+            cls._results[command] = result
+        return result
+
 
 def call_microovn_command(*args, stdin=None) -> subprocess.CompletedProcess[str]:
-    """Call the command microovn with the given arguments."""
-    result = subprocess.run(
+    """Call the command microovn with the given arguments.
+
+    Commands the MicroOVN daemon's REST API covers are sent over its control
+    socket, the CLI is only forked for the others or when the daemon does not
+    implement the request. The results of read-only commands are memoized for
+    the hook dispatch.
+    """
+    return CommandCache.run(
+        ("microovn", *args),
+        MICROOVN_READ_ONLY_COMMANDS,
+        lambda: _run_microovn_command(args, stdin),
+    )
+
+
+def call_ovs_vsctl(*args) -> subprocess.CompletedProcess[str]:
+    """Call MicroOVN's ovs-vsctl with the given arguments.
+
+    The results of read-only commands are memoized for the hook dispatch.
+    """
+    command = ("microovn.ovs-vsctl", *args)
+    return CommandCache.run(
+        command,
+        OVS_VSCTL_READ_ONLY_COMMANDS,
+        lambda: CommandRunner.run(command, capture_output=True, text=True),
+    )
+
+
+def _run_microovn_command(
+    args: Tuple[str, ...], stdin: str | None
+) -> subprocess.CompletedProcess[str]:
+    client = MicroovnClient()
+    if client.available:
+        try:
+            api_result = client.run_command(args, stdin)
+        except MicroovnAPIError as err:
+            if not err.unsupported:
+                logger.info("Called microovn %s over its API, error: %s", args, err.message)
+                return subprocess.CompletedProcess(["microovn", *args], 1, "", f"Error: {err}\n")
+            logger.debug("microovn API does not support %s, using the CLI: %s", args, err)
+            api_result = None
+        if api_result is not None:
+            logger.info("Called microovn %s over its API", args)
+            return api_result
+
+    result = CommandRunner.run(
         ["microovn", *args],
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
@@ -25,45 +163,176 @@ def call_microovn_command(*args, stdin=None) -> subprocess.CompletedProcess[str]
     return result
 
 
-@retry(
-    stop=stop_after_attempt(10),
-    wait=wait_fixed(1),
-    retry=retry_if_result(lambda x: x is False),
-    retry_error_callback=(lambda state: state.outcome.result()),  # type: ignore
-)
-def wait_for_microovn_ready():
-    """Wait for microovn to be ready."""
-    return call_microovn_command("waitready").returncode == 0
+def wait_for_microovn_ready(timeout: float = MICROOVN_READY_TIMEOUT) -> bool:
+    """Wait for microovn to be ready, recording how long it took.
+
+    Readiness is checked again as soon as the daemon's state directory
+    changes, such as when it creates its control socket.
+    """
+    elapsed = wait_until(_microovn_ready, timeout, watch=[MICROOVN_CONTROL_SOCKET])
+    if elapsed is None:
+        logger.error("microovn was not ready after %.0fs", timeout)
+        return False
+    logger.info("microovn ready after %.2fs", elapsed)
+    CommandRunner.record("microovn time-to-ready", elapsed)
+    return True
+
+
+def _microovn_ready() -> bool:
+    client = MicroovnClient()
+    # Nothing answers before the daemon created its control socket.
+    if not client.available:
+        return False
+    try:
+        return client.ready()
+    except MicroovnAPIError:
+        # An older daemon, whose readiness only the CLI knows how to wait for.
+        return call_microovn_command("waitready").returncode == 0
+
+
+def cluster_status() -> ClusterStatus | None:
+    """Return the status of the MicroOVN cluster, or None when it cannot be queried.
+
+    The status is queried once per hook dispatch and shared by every caller,
+    until a command that changes it is run or it is invalidated.
+    """
+    global _cluster_status
+    if _cluster_status is None:
+        _cluster_status = _query_cluster_status()
+    return _cluster_status
+
+
+def invalidate_cluster_status() -> None:
+    """Drop the memoized cluster status so the next caller queries it again."""
+    global _cluster_status
+    _cluster_status = None
+
 
+def _query_cluster_status(timeout: float | None = None) -> ClusterStatus | None:
+    client = MicroovnClient()
+    if client.available:
+        try:
+            return ClusterStatus.from_api(client.cluster_members(), client.services())
+        except MicroovnAPIError as err:
+            if not err.unsupported:
+                logger.error("Querying the microovn cluster status failed: %s", err.message)
+                return None
 
-def microovn_central_exists() -> bool:
-    """Check if there is any microovn central node in the cluster."""
-    result = call_microovn_command("status")
+    if timeout is None:
+        result = call_microovn_command("status")
+    else:
+        # Left out of the CommandCache, the caller may give up on it.
+        result = CommandRunner.run(
+            ["microovn", "status"], capture_output=True, text=True, timeout=timeout
+        )
     if result.returncode != 0:
         logger.error(
             "microovn status failed with error code %s, strerr: %s",
             result.returncode,
             result.stderr,
         )
-        return False
-    return "central" in result.stdout
+        return None
+    return ClusterStatus.from_text(result.stdout)
+
+
+def microovn_central_exists(timeout: float | None = None) -> bool:
+    """Check if there is any microovn central node in the cluster.
+
+    Given a timeout, the status is queried afresh and neither memoized nor
+    kept in the CommandCache, and the CLI is killed at the timeout. A probe
+    that is given up on then changes nothing the rest of the hook reads.
+    """
+    status = cluster_status() if timeout is None else _query_cluster_status(timeout)
+    return status is not None and status.has_service("central")
 
 
-@retry(
-    stop=stop_after_attempt(5),
-    wait=wait_fixed(2),
-    retry=retry_if_result(lambda x: x is False),
-    retry_error_callback=(lambda state: state.outcome.result()),  # type: ignore
-)
-def check_metrics_endpoint(url: str) -> bool:
-    """Check if the metrics endpoint is reachable.
+def check_metrics_endpoint(url: str, deadline: float = METRICS_PROBE_DEADLINE) -> bool:
+    """Check if the metrics endpoint is serving OVN metrics.
+
+    The endpoint is probed again with a growing backoff until the deadline.
 
     Returns:
-        bool: True if the metrics endpoint is reachable, False otherwise.
+        bool: True if the metrics endpoint serves OVN metrics, False otherwise.
     """
+    end = time.monotonic() + deadline
+    delay, max_delay = METRICS_PROBE_BACKOFF
+    while True:
+        if _probe_metrics(url, min(METRICS_PROBE_TIMEOUT, max(end - time.monotonic(), 0.1))):
+            return True
+        if time.monotonic() + delay >= end:
+            logger.warning("Metrics endpoint %s is not serving OVN metrics yet.", url)
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def _probe_metrics(url: str, timeout: float) -> bool:
+    """Read the metrics exposition until an OVN metric family shows up."""
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname or "localhost", parts.port, timeout)
     try:
-        response = requests.get(url, timeout=2)
-        return response.status_code == 200
-    except requests.RequestException:
-        logger.warning("Metrics endpoint %s is not reachable yet.", url)
+        connection.request("GET", parts.path or "/", headers={"Accept": "text/plain"})
+        response = connection.getresponse()
+        if response.status != 200:
+            logger.debug("Metrics endpoint %s answered %d", url, response.status)
+            return False
+        read = 0
+        while read < METRICS_PROBE_MAX_BYTES:
+            line = response.readline(METRICS_PROBE_MAX_BYTES - read)
+            if not line:
+                break
+            read += len(line)
+            if line.startswith(METRICS_FAMILY_PREFIX):
+                return True
+        logger.debug("Metrics endpoint %s serves no OVN metrics in its first %d bytes", url, read)
+        return False
+    except (http.client.HTTPException, OSError) as err:
+        logger.debug("Metrics endpoint %s is not reachable: %s", url, err)
         return False
+    finally:
+        connection.close()
+
+
+class ProbeRunner:
+    """Run independent health probes concurrently, within one overall deadline.
+
+    The deadline runs from when the runner is made, each probe runs on its
+    own daemon thread and one still running past it is given up on without
+    holding the hook up.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self._threads: Dict[str, threading.Thread] = {}
+        self._results: Dict[str, bool] = {}
+
+    def remaining(self) -> float:
+        """Return the seconds left before the deadline."""
+        return max(0.0, self.deadline - time.monotonic())
+
+    def start(self, name: str, probe: Callable[[], bool]) -> None:
+        """Start running a probe in the background."""
+
+        def run() -> None:
+            try:
+                self._results[name] = probe()
+            except Exception:
+                logger.exception("%s probe failed", name)
+                self._results[name] = False
+
+        thread = threading.Thread(target=run, name=f"{name}-probe", daemon=True)
+        self._threads[name] = thread
+        thread.start()
+
+    def result(self, name: str) -> bool | None:
+        """Wait for a probe until the deadline, returning whether it passed.
+
+        Returns:
+            None when the probe did not finish before the deadline.
+        """
+        self._threads[name].join(self.remaining())
+        if name not in self._results:
+            logger.warning("%s probe did not finish within %.0fs", name, self.timeout)
+            return None
+        return self._results[name]
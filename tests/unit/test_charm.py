@@ -4,6 +4,8 @@
 """Unit tests for the MicroOVN charm."""
 
 import json
+import threading
+import time
 from datetime import timedelta
 from subprocess import DEVNULL, CompletedProcess
 from unittest.mock import ANY, MagicMock, patch
@@ -11,6 +13,7 @@ from unittest.mock import ANY, MagicMock, patch
 import ops
 import pytest
 from charms.microcluster_token_distributor.v0.token_distributor import TokenConsumer
+from charms.microovn.v0.ovsdb import OVSDBConnectionString, OVSDBProvides
 from charms.tls_certificates_interface.v4.tls_certificates import (
     LIBID as TLS_CERTS_LIBID,
 )
@@ -24,20 +27,35 @@ from ops import testing
 from scenario.errors import UncaughtCharmError
 
 from charm import MicroovnCharm
+from cluster_status import ClusterStatus, Member
+from command_runner import CommandRunner
 from constants import (
     APT_OVS_CONF_DB,
     APT_OVS_SERVICE,
+    BASE_SNAP_RESOURCE,
     CERTIFICATES_RELATION,
     MICROOVN_OVS_CONF_DB,
     MICROOVN_OVSDB_DIR,
+    MICROOVN_SNAP_RESOURCE,
     MICROOVN_TRACK,
     OVN_EXPORTER_METRICS_ENDPOINT,
+    OVN_EXPORTER_SNAP_RESOURCE,
     OVN_EXPORTER_TRACK,
     OVSDB_RELATION,
     OVSDBCMD_RELATION,
+    SNAP_ASSERTIONS_RESOURCE,
+    SNAPD_SNAP_RESOURCE,
     WORKER_RELATION,
 )
 from snap_manager import SnapManager
+from snapd_client import ChangeProgress
+
+
+@pytest.fixture(autouse=True)
+def mock_cluster_status():
+    """Mock the cluster status query, leaving every service change to microovn."""
+    with patch("utils._query_cluster_status", return_value=None) as mock:
+        yield mock
 
 
 @pytest.fixture()
@@ -74,6 +92,34 @@ def mock_snapd_snap():
         yield mock_snap
 
 
+@pytest.fixture()
+def snap_resources(tmp_path):
+    """Attach an empty file for every snap resource, so the snaps come from the store."""
+    paths = {}
+    for name in (
+        MICROOVN_SNAP_RESOURCE,
+        OVN_EXPORTER_SNAP_RESOURCE,
+        SNAPD_SNAP_RESOURCE,
+        BASE_SNAP_RESOURCE,
+        SNAP_ASSERTIONS_RESOURCE,
+    ):
+        paths[name] = tmp_path / name
+        paths[name].write_bytes(b"")
+    return paths
+
+
+def _resources(paths) -> set:
+    """Return the scenario resources for the given resource files."""
+    return {testing.Resource(name=name, path=path) for name, path in paths.items()}
+
+
+@pytest.fixture()
+def mock_install_many():
+    """Mock the batched snap install."""
+    with patch.object(SnapManager, "install_many", return_value=[]) as mock:
+        yield mock
+
+
 @pytest.fixture()
 def mock_check_metrics_endpoint():
     """Mock check_metrics_endpoint function."""
@@ -144,15 +190,20 @@ def test_on_install_success(
     mock_microovn_snap,
     mock_ovn_exporter_snap,
     mock_snapd_snap,
+    mock_install_many,
     mock_check_metrics_endpoint,
     mock_wait_for_microovn_ready,
+    snap_resources,
 ):
     """Test successful install event handling."""
     ctx = testing.Context(MicroovnCharm)
-    ctx.run(ctx.on.install(), testing.State())
+    ctx.run(ctx.on.install(), testing.State(resources=_resources(snap_resources)))
 
-    mock_ovn_exporter_snap.install.assert_called_once()
-    mock_microovn_snap.install.assert_called_once()
+    mock_install_many.assert_called_once_with(
+        [mock_ovn_exporter_snap, mock_microovn_snap], progress=ANY
+    )
+    mock_ovn_exporter_snap.install.assert_not_called()
+    mock_microovn_snap.install.assert_not_called()
     mock_snapd_snap.install.assert_called_once()
     mock_ovn_exporter_snap.connect.assert_called_once_with(
         [
@@ -163,6 +214,33 @@ def test_on_install_success(
     mock_wait_for_microovn_ready.assert_called_once()
 
 
+@pytest.mark.parametrize(
+    "done, total, expected",
+    [
+        (0, 100, 'Download snap "microovn" (0%)'),
+        (55, 100, 'Download snap "microovn" (50%)'),
+        (100, 100, 'Download snap "microovn" (100%)'),
+    ],
+)
+def test_on_snap_progress_sets_status(done, total, expected):
+    """Test snap change progress is shown in the unit status."""
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(ctx.on.start(), testing.State()) as manager:
+        manager.charm._on_snap_progress(
+            ChangeProgress("install-snap", 'Download snap "microovn"', done, total)
+        )
+        assert manager.charm.unit.status == ops.MaintenanceStatus(expected)
+
+
+def test_on_snap_progress_ignores_unknown_total():
+    """Test progress without a known total leaves the status alone."""
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(ctx.on.start(), testing.State()) as manager:
+        manager.charm.unit.status = ops.MaintenanceStatus("Installing snaps")
+        manager.charm._on_snap_progress(ChangeProgress("install-snap", "Mount snap", 0, 0))
+        assert manager.charm.unit.status == ops.MaintenanceStatus("Installing snaps")
+
+
 @patch("subprocess.run")
 @pytest.mark.parametrize(
     "failing_snap",
@@ -176,19 +254,100 @@ def test_on_install_snap_fails(
     mock_microovn_snap,
     mock_ovn_exporter_snap,
     mock_snapd_snap,
+    mock_install_many,
     mock_check_metrics_endpoint,
     mock_wait_for_microovn_ready,
+    snap_resources,
     failing_snap,
 ):
     """Test install event when snap installation fails."""
     if failing_snap == "ovn-exporter":
-        mock_ovn_exporter_snap.install.return_value = False
+        mock_install_many.return_value = [mock_ovn_exporter_snap]
     else:
-        mock_microovn_snap.install.return_value = False
+        mock_install_many.return_value = [mock_microovn_snap]
 
     ctx = testing.Context(MicroovnCharm)
     with pytest.raises(RuntimeError, match=f"Failed to install {failing_snap} snap"):
-        ctx.run(ctx.on.install(), testing.State())
+        ctx.run(ctx.on.install(), testing.State(resources=_resources(snap_resources)))
+
+
+@pytest.mark.parametrize("assertions", [b"type: snap-declaration", b""])
+@patch("subprocess.run")
+def test_on_install_from_resources(
+    mock_subprocess_run,
+    mock_microovn_snap,
+    mock_ovn_exporter_snap,
+    mock_snapd_snap,
+    mock_install_many,
+    mock_check_metrics_endpoint,
+    mock_wait_for_microovn_ready,
+    snap_resources,
+    assertions,
+):
+    """Test attached snaps are installed locally and the others from the store."""
+    snap_resources[MICROOVN_SNAP_RESOURCE].write_bytes(b"microovn")
+    snap_resources[BASE_SNAP_RESOURCE].write_bytes(b"core24")
+    snap_resources[SNAP_ASSERTIONS_RESOURCE].write_bytes(assertions)
+
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch.object(SnapManager, "ack_assertions", return_value=True) as mock_ack,
+        patch.object(SnapManager, "install_local", return_value=True) as mock_install_local,
+    ):
+        ctx.run(
+            ctx.on.install(),
+            testing.State(
+                config={"allow_dangerous_snaps": not assertions},
+                resources=_resources(snap_resources),
+            ),
+        )
+
+    dangerous = not assertions
+    assert mock_ack.call_count == (0 if dangerous else 1)
+    mock_microovn_snap.use_local_snap.assert_called_once_with(
+        str(snap_resources[MICROOVN_SNAP_RESOURCE]), dangerous
+    )
+    mock_ovn_exporter_snap.use_local_snap.assert_not_called()
+    mock_snapd_snap.use_local_snap.assert_not_called()
+    mock_install_local.assert_called_once_with(str(snap_resources[BASE_SNAP_RESOURCE]), dangerous)
+    mock_install_many.assert_called_once()
+
+
+@patch("subprocess.run")
+def test_on_install_blocks_on_snaps_without_assertions(
+    mock_subprocess_run,
+    mock_microovn_snap,
+    mock_snapd_snap,
+    mock_install_many,
+    snap_resources,
+):
+    """Test attached snaps without their assertions block the unit, unless allowed."""
+    snap_resources[MICROOVN_SNAP_RESOURCE].write_bytes(b"microovn")
+
+    ctx = testing.Context(MicroovnCharm)
+    state = ctx.run(ctx.on.install(), testing.State(resources=_resources(snap_resources)))
+
+    assert state.unit_status == ops.BlockedStatus(
+        "Attach the snap-assertions resource or set allow_dangerous_snaps"
+    )
+    assert [event.name for event in state.deferred] == ["install"]
+    mock_microovn_snap.use_local_snap.assert_not_called()
+    mock_snapd_snap.install.assert_not_called()
+    mock_install_many.assert_not_called()
+
+
+def test_snap_resources_fetched_once_per_hook(
+    mock_microovn_snap, mock_ovn_exporter_snap, snap_resources
+):
+    """Test each snap resource is only fetched once during a hook."""
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(ctx.on.config_changed(), testing.State(resources=_resources(snap_resources))) as m:
+        with patch.object(ops.model.Resources, "fetch", autospec=True) as mock_fetch:
+            mock_fetch.return_value = snap_resources[MICROOVN_SNAP_RESOURCE]
+            assert m.charm._snap_resource(MICROOVN_SNAP_RESOURCE) is None
+            assert m.charm._snap_resource(MICROOVN_SNAP_RESOURCE) is None
+
+    mock_fetch.assert_called_once()
 
 
 @patch("subprocess.run")
@@ -197,8 +356,10 @@ def test_on_install_connect_fails(
     mock_microovn_snap,
     mock_ovn_exporter_snap,
     mock_snapd_snap,
+    mock_install_many,
     mock_check_metrics_endpoint,
     mock_wait_for_microovn_ready,
+    snap_resources,
 ):
     """Test install event when snap interface connection fails."""
     mock_ovn_exporter_snap.connect.return_value = False
@@ -206,7 +367,7 @@ def test_on_install_connect_fails(
     ctx = testing.Context(MicroovnCharm)
 
     with pytest.raises(RuntimeError, match="Failed to connect ovn-exporter snap interfaces"):
-        ctx.run(ctx.on.install(), testing.State())
+        ctx.run(ctx.on.install(), testing.State(resources=_resources(snap_resources)))
 
 
 @patch("subprocess.run")
@@ -215,8 +376,10 @@ def test_on_install_waitready_fails(
     mock_microovn_snap,
     mock_ovn_exporter_snap,
     mock_snapd_snap,
+    mock_install_many,
     mock_check_metrics_endpoint,
     mock_wait_for_microovn_ready,
+    snap_resources,
 ):
     """Test install event when microovn waitready fails."""
     mock_wait_for_microovn_ready.return_value = False
@@ -224,7 +387,7 @@ def test_on_install_waitready_fails(
     ctx = testing.Context(MicroovnCharm)
 
     with pytest.raises(RuntimeError, match="microovn waitready failed after retries"):
-        ctx.run(ctx.on.install(), testing.State())
+        ctx.run(ctx.on.install(), testing.State(resources=_resources(snap_resources)))
 
 
 def test_on_remove_success(
@@ -292,7 +455,7 @@ def test_on_update_status_metrics_unreachable(
     assert manager.charm.unit.status == ops.BlockedStatus(
         "ovn-exporter metrics endpoint is not responding, check snap service status"
     )
-    mock_check_metrics_endpoint.assert_called_with(OVN_EXPORTER_METRICS_ENDPOINT)
+    assert mock_check_metrics_endpoint.call_args.args[0] == OVN_EXPORTER_METRICS_ENDPOINT
 
 
 def test_on_update_status_no_central_nodes(
@@ -312,6 +475,90 @@ def test_on_update_status_no_central_nodes(
     )
 
 
+def test_on_update_status_probes_run_concurrently(
+    mock_check_metrics_endpoint,
+    mock_microovn_central_exists,
+):
+    """Test the central and metrics probes overlap rather than add up."""
+    # Each probe only passes once the other one is running too.
+    both_running = threading.Barrier(2, timeout=5)
+    mock_check_metrics_endpoint.side_effect = lambda *_: both_running.wait() is not None
+    mock_microovn_central_exists.side_effect = lambda *_: both_running.wait() is not None
+
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(ctx.on.update_status(), testing.State()) as manager:
+        manager.charm.token_consumer._stored.in_cluster = True
+
+    assert manager.charm.unit.status == ops.ActiveStatus()
+
+
+@patch("charm.UPDATE_STATUS_DEADLINE", 0.2)
+def test_on_update_status_probe_deadline(
+    mock_check_metrics_endpoint,
+    mock_microovn_central_exists,
+):
+    """Test a probe still running at its deadline is reported as timed out."""
+    release = threading.Event()
+    mock_check_metrics_endpoint.side_effect = lambda *_: release.wait(5)
+
+    ctx = testing.Context(MicroovnCharm)
+    try:
+        with ctx(ctx.on.update_status(), testing.State()) as manager:
+            manager.charm.token_consumer._stored.in_cluster = True
+    finally:
+        release.set()
+
+    assert manager.charm.unit.status == ops.WaitingStatus(
+        "ovn-exporter metrics check timed out, checking again on next update-status"
+    )
+
+
+@patch("charm.UPDATE_STATUS_DEADLINE", 0.2)
+def test_on_update_status_probes_run_while_roles_enforced(
+    mock_check_metrics_endpoint,
+    mock_microovn_central_exists,
+):
+    """Test the probes run while the roles are enforced, within the hook's one deadline."""
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch("role_handler.RoleHandler.has_relation", True),
+        patch("role_handler.RoleHandler.enforce_roles", side_effect=lambda: time.sleep(0.3)),
+        ctx(ctx.on.update_status(), testing.State()) as manager,
+    ):
+        manager.charm.token_consumer._stored.in_cluster = True
+
+    assert manager.charm.unit.status == ops.ActiveStatus()
+    # Started before the roles were enforced, given the time left then.
+    assert 0 < mock_microovn_central_exists.call_args.args[0] <= 0.2
+
+
+@patch("charm.UPDATE_STATUS_DEADLINE", 0.2)
+def test_on_update_status_one_deadline(
+    mock_check_metrics_endpoint,
+    mock_microovn_central_exists,
+):
+    """Test enforcing the roles past the deadline leaves a hung probe no more time."""
+    release = threading.Event()
+    mock_microovn_central_exists.side_effect = lambda *_: release.wait(5)
+
+    ctx = testing.Context(MicroovnCharm)
+    start = time.monotonic()
+    try:
+        with (
+            patch("role_handler.RoleHandler.has_relation", True),
+            patch("role_handler.RoleHandler.enforce_roles", side_effect=lambda: time.sleep(0.3)),
+            ctx(ctx.on.update_status(), testing.State()) as manager,
+        ):
+            manager.charm.token_consumer._stored.in_cluster = True
+    finally:
+        release.set()
+
+    assert time.monotonic() - start < 1
+    assert manager.charm.unit.status == ops.WaitingStatus(
+        "microovn central check timed out, checking again on next update-status"
+    )
+
+
 def test_on_update_status_with_ovsdb_relation(
     mock_check_metrics_endpoint, mock_call_microovn_command, mock_microovn_central_exists
 ):
@@ -616,6 +863,38 @@ def test_dataplane_mode_success(
     )
 
 
+def test_dataplane_mode_central_not_enabled_locally(
+    mock_check_metrics_endpoint,
+    mock_call_microovn_command,
+    mock_cluster_status,
+):
+    """Test dataplane mode does not disable a central the cluster status shows disabled."""
+    mock_cluster_status.return_value = ClusterStatus(
+        (Member("local", "10.0.0.1", frozenset({"chassis"})),)
+    )
+    ctx = testing.Context(MicroovnCharm)
+    ovsdb_relation = testing.Relation(OVSDB_RELATION)
+    ovsdb_cms_relation = testing.Relation(
+        OVSDBCMD_RELATION,
+        remote_app_data={"loadbalancer-address": "192.168.0.16"},
+    )
+
+    with (
+        patch("cluster_status.socket.gethostname", return_value="local"),
+        ctx(
+            ctx.on.start(),
+            testing.State(relations=[ovsdb_relation, ovsdb_cms_relation], leader=True),
+        ) as manager,
+    ):
+        manager.charm.token_consumer._stored.in_cluster = True
+        result = manager.charm._dataplane_mode()
+
+    assert result is True
+    mock_call_microovn_command.assert_called_once_with(
+        "config", "set", "ovn.central-ips", "192.168.0.16"
+    )
+
+
 def test_dataplane_mode_not_in_cluster(
     mock_check_metrics_endpoint,
 ):
@@ -850,11 +1129,13 @@ def test_on_ovsdbcms_ready_dataplane_mode_fails(
     assert manager.charm.unit.status == ops.BlockedStatus("Failed to switch to dataplane mode")
 
 
+@patch.object(CommandRunner, "save")
 @patch("subprocess.run")
 @patch("builtins.open")
 def test_on_cluster_changed_dataplane_mode_fails(
     mock_open,
     mock_subprocess_run,
+    mock_save,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
     mock_logger,
@@ -906,14 +1187,18 @@ def test_on_bootstrapped(
     )
 
 
-@patch("snap_manager.snap.add")
-@patch("snap_manager.snap.SnapCache")
-def test_on_config_changed_success(mock_snap_cache, mock_snap_add):
+@patch.object(SnapManager, "snapd_client")
+@patch("snap_manager.LazySnapCache")
+def test_on_config_changed_success(mock_snap_cache, mock_snapd_client, snap_resources):
     """Test config changed everything as expected."""
     ctx = testing.Context(MicroovnCharm)
-    state_in = testing.State(config={"microovn_risk": "edge/sunbeam"})
+    state_in = testing.State(
+        config={"microovn_risk": "edge/sunbeam"}, resources=_resources(snap_resources)
+    )
     ctx.run(ctx.on.config_changed(), state_in)
-    mock_snap_add.assert_any_call("microovn", channel=MICROOVN_TRACK + "/edge/sunbeam")
+    mock_snapd_client.return_value.refresh.assert_any_call(
+        "microovn", MICROOVN_TRACK + "/edge/sunbeam"
+    )
 
 
 @patch("charm.SnapManager")
@@ -932,6 +1217,23 @@ def test_on_config_changed_no_refresh_if_channel_same(mock_snap_manager):
     microovn_snap.install.assert_not_called()
 
 
+def test_on_config_changed_pinned_by_resource(
+    mock_microovn_snap, mock_ovn_exporter_snap, snap_resources
+):
+    """Test a snap installed from an attached resource is not refreshed from the store."""
+    snap_resources[MICROOVN_SNAP_RESOURCE].write_bytes(b"snap")
+    mock_microovn_snap.snap_client.channel = ""
+    mock_ovn_exporter_snap.snap_client.channel = OVN_EXPORTER_TRACK + "/edge"
+
+    ctx = testing.Context(MicroovnCharm)
+    state_in = testing.State(
+        config={"microovn_risk": "edge"}, resources=_resources(snap_resources)
+    )
+    ctx.run(ctx.on.config_changed(), state_in)
+
+    mock_microovn_snap.install.assert_not_called()
+
+
 def test_on_config_changed_invalid_risk(mock_microovn_snap, mock_logger):
     """Test config changed with an invalid risk."""
     ctx = testing.Context(MicroovnCharm)
@@ -992,6 +1294,7 @@ def test_migrate_ovs_no_service(mock_run, mock_exists):
         ["systemctl", "list-unit-files", APT_OVS_SERVICE],
         stdout=DEVNULL,
         stderr=DEVNULL,
+        timeout=120.0,
     )
 
 
@@ -1005,6 +1308,50 @@ def test_migrate_ovs_success(mock_run, mock_exists):
     with ctx(ctx.on.start(), testing.State()) as manager:
         manager.charm._migrate_ovs()
 
-    mock_run.assert_any_call(["mkdir", "-p", MICROOVN_OVSDB_DIR])
-    mock_run.assert_any_call(["cp", APT_OVS_CONF_DB, MICROOVN_OVSDB_DIR])
-    mock_run.assert_any_call(["systemctl", "disable", "--now", APT_OVS_SERVICE])
+    mock_run.assert_any_call(["mkdir", "-p", MICROOVN_OVSDB_DIR], timeout=120.0)
+    mock_run.assert_any_call(["cp", APT_OVS_CONF_DB, MICROOVN_OVSDB_DIR], timeout=120.0)
+    mock_run.assert_any_call(["systemctl", "disable", "--now", APT_OVS_SERVICE], timeout=120.0)
+
+
+def test_command_latency_action():
+    """Test the action dumps the latency histograms saved by earlier hooks."""
+    ctx = testing.Context(MicroovnCharm)
+    histograms = {"microovn status": {"count": 1, "sum": 0.1, "max": 0.1, "buckets": {"0.1": 1}}}
+    with patch.object(CommandRunner, "load", return_value=histograms):
+        ctx.run(ctx.on.action("command-latency"), testing.State())
+
+    assert json.loads(ctx.action_results["histograms"]) == histograms
+
+
+@pytest.fixture()
+def databag_updates():
+    """Record the keys of every write to a relation databag, one entry per relation-set."""
+    calls = []
+    update = ops.RelationDataContent.update
+
+    def record(self, data=(), /, **kwargs):
+        calls.append(sorted(dict(data, **kwargs)))
+        return update(self, data, **kwargs)
+
+    with patch.object(ops.RelationDataContent, "update", record):
+        yield calls
+
+
+def test_ovsdb_connection_strings_written_once(databag_updates):
+    """Test the connection strings are written together."""
+    relation = testing.Relation(endpoint=OVSDB_RELATION)
+    connect_str = OVSDBConnectionString(nb="ssl:10.0.0.1:6641", sb="ssl:10.0.0.1:6642")
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch.object(OVSDBProvides, "get_connection_strings", return_value=connect_str),
+        ctx(ctx.on.start(), testing.State(leader=True, relations=[relation])) as manager,
+    ):
+        manager.charm.token_consumer._stored.in_cluster = True
+        manager.charm.ovsdb_provides.update_relation_data()
+        state = manager.run()
+
+    assert ["db_nb_connection_str", "db_sb_connection_str"] in databag_updates
+    assert state.get_relation(relation.id).local_app_data == {
+        "db_nb_connection_str": "ssl:10.0.0.1:6641",
+        "db_sb_connection_str": "ssl:10.0.0.1:6642",
+    }
@@ -0,0 +1,58 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for the cluster status model."""
+
+from unittest.mock import patch
+
+from cluster_status import ClusterStatus, Member
+
+STATUS = """MicroOVN deployment summary:
+- node1 (10.0.0.1)
+  Services: central, chassis, switch
+- node2 (10.0.0.2)
+  Services: chassis, switch
+- node3 (10.0.0.3)
+  Services:
+OVN Database summary:
+- OVN Northbound: OVN cluster, 3 members
+"""
+
+
+def test_from_text():
+    """Test the deployment summary is parsed into members and their services."""
+    status = ClusterStatus.from_text(STATUS)
+
+    assert status.members == (
+        Member("node1", "10.0.0.1", frozenset({"central", "chassis", "switch"})),
+        Member("node2", "10.0.0.2", frozenset({"chassis", "switch"})),
+        Member("node3", "10.0.0.3", frozenset()),
+    )
+
+
+def test_from_text_empty():
+    """Test a summary without members gives an empty cluster."""
+    status = ClusterStatus.from_text("MicroOVN deployment summary:\n")
+
+    assert status.members == ()
+    assert not status.has_service("central")
+
+
+def test_members_with():
+    """Test looking up the members a service is enabled on."""
+    status = ClusterStatus.from_text(STATUS)
+
+    assert status.members_with("central") == ["node1"]
+    assert status.members_with("switch") == ["node1", "node2"]
+    assert status.has_service("chassis")
+    assert not status.has_service("gateway")
+
+
+def test_local():
+    """Test the local member is the one named after the hostname."""
+    status = ClusterStatus.from_text(STATUS)
+
+    with patch("cluster_status.socket.gethostname", return_value="node2"):
+        assert status.local == status.member("node2")
+    with patch("cluster_status.socket.gethostname", return_value="other"):
+        assert status.local is None
@@ -0,0 +1,121 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for the workload command runner."""
+
+import json
+import signal
+import time
+from subprocess import CompletedProcess
+from unittest.mock import patch
+
+import pytest
+
+from command_runner import (
+    DEFAULT_TIMEOUT,
+    CommandRunner,
+    command_name,
+    parse_timeouts,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_runner():
+    """Drop the latencies and timeouts set by the previous test."""
+    CommandRunner.reset()
+    yield
+    CommandRunner.reset()
+
+
+@pytest.mark.parametrize(
+    "args,expected",
+    [
+        (["microovn", "cluster", "list", "-f", "json"], "microovn cluster list"),
+        (["microovn", "status"], "microovn status"),
+        (["microovn.ovs-vsctl", "get", "open_vswitch", "."], "microovn.ovs-vsctl get"),
+        (["cp", "/var/lib/openvswitch/conf.db", "/tmp"], "cp"),
+        (["/usr/bin/modprobe", "-r", "openvswitch"], "modprobe"),
+        ([], ""),
+    ],
+)
+def test_command_name(args, expected):
+    """Test commands are named after the program and its subcommands."""
+    assert command_name(args) == expected
+
+
+def test_parse_timeouts():
+    """Test per-command timeouts are parsed by command name."""
+    assert parse_timeouts(" microovn  status=10, apt=900.5,") == {
+        "microovn status": 10.0,
+        "apt": 900.5,
+    }
+    assert parse_timeouts("") == {}
+
+
+@pytest.mark.parametrize("setting", ["status", "=10", "status=0", "status=soon"])
+def test_parse_timeouts_invalid(setting):
+    """Test timeouts that are not positive numbers of seconds are refused."""
+    with pytest.raises(ValueError):
+        parse_timeouts(setting)
+
+
+def test_timeout_longest_prefix():
+    """Test a command gets the timeout of its most specific configured name."""
+    CommandRunner.reset({"microovn": 30.0, "microovn cluster join": 600.0})
+
+    assert CommandRunner.timeout("microovn status") == 30.0
+    assert CommandRunner.timeout("microovn cluster join") == 600.0
+    assert CommandRunner.timeout("microovn cluster list") == 30.0
+    assert CommandRunner.timeout("microovnx") == DEFAULT_TIMEOUT
+    assert CommandRunner.timeout("apt remove") == 600.0
+
+
+def test_run_passes_timeout():
+    """Test commands are run with their timeout and their latency is kept."""
+    with patch("command_runner.subprocess.run") as mock_run:
+        mock_run.return_value = CompletedProcess([], 0, "out", "")
+        res = CommandRunner.run(["microovn", "waitready"], capture_output=True)
+
+    mock_run.assert_called_once_with(["microovn", "waitready"], timeout=60.0, capture_output=True)
+    assert res.stdout == "out"
+    assert len(CommandRunner.latencies["microovn waitready"]) == 1
+
+
+def test_run_kills_on_timeout():
+    """Test a command running for longer than its timeout is killed."""
+    start = time.monotonic()
+    res = CommandRunner.run(["sleep", "10"], timeout=0.2, capture_output=True, text=True)
+
+    assert time.monotonic() - start < 5
+    assert res.returncode == -signal.SIGKILL
+    assert "timed out" in res.stderr
+    assert len(CommandRunner.latencies["sleep"]) == 1
+
+
+def test_save_adds_to_histograms(tmp_path):
+    """Test the latencies of each dispatch are added to the histograms on disk."""
+    path = tmp_path / "latency.json"
+    CommandRunner.latencies = {"microovn status": [0.02, 0.3], "apt remove": [400.0]}
+    CommandRunner.save(path)
+    CommandRunner.latencies = {"microovn status": [0.04]}
+    CommandRunner.save(path)
+
+    histograms = json.loads(path.read_text())
+    assert histograms["microovn status"] == {
+        "count": 3,
+        "sum": 0.36,
+        "max": 0.3,
+        "buckets": {"0.05": 2, "0.5": 1},
+    }
+    assert histograms["apt remove"]["buckets"] == {"+Inf": 1}
+    assert CommandRunner.latencies == {}
+    assert CommandRunner.load(path) == histograms
+
+
+def test_save_nothing_ran(tmp_path):
+    """Test no file is written when no command ran."""
+    path = tmp_path / "latency.json"
+    CommandRunner.save(path)
+
+    assert not path.exists()
+    assert CommandRunner.load(path) == {}
@@ -0,0 +1,208 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for the OVSDBClient class."""
+
+import json
+import socketserver
+import threading
+
+import pytest
+
+from ovsdb_client import OVSDBClient, OVSDBError
+
+
+class _OVSDBHandler(socketserver.BaseRequestHandler):
+    """Answer JSON-RPC requests like ovsdb-server, from the server's single row."""
+
+    def handle(self):
+        decoder = json.JSONDecoder()
+        buffer = ""
+        if self.server.echo:
+            self._send({"method": "echo", "params": [], "id": "echo"})
+        while data := self.request.recv(65536):
+            buffer += data.decode()
+            while buffer.strip():
+                try:
+                    message, end = decoder.raw_decode(buffer.lstrip())
+                except ValueError:
+                    break
+                buffer = buffer.lstrip()[end:]
+                if message.get("id") == "echo":
+                    self.server.echoed.set()
+                    continue
+                self._send(self._answer(message))
+
+    def _send(self, message):
+        self.request.sendall(json.dumps(message).encode())
+
+    def _answer(self, message):
+        self.server.requests.append(message)
+        if message["method"] != "transact":
+            return {"result": None, "error": "unknown method", "id": message["id"]}
+        if self.server.before_transact is not None:
+            self.server.before_transact(message["params"][1:])
+        row = self.server.row
+        staged = {column: dict(value) for column, value in row.items()}
+        results = []
+        for operation in message["params"][1:]:
+            result = self._operate(staged, operation)
+            results.append(result)
+            if "error" in result:
+                return {"result": results, "error": None, "id": message["id"]}
+        if any(operation["op"] != "select" for operation in message["params"][1:]):
+            self.server.row = staged
+        return {"result": results, "error": None, "id": message["id"]}
+
+    @staticmethod
+    def _operate(row, operation):
+        match operation["op"]:
+            case "select":
+                return {
+                    "rows": [{c: ["map", sorted(row[c].items())] for c in operation["columns"]}]
+                }
+            case "wait":
+                expected = {c: dict(v[1]) for c, v in operation["rows"][0].items()}
+                if any(row[column] != value for column, value in expected.items()):
+                    return {"error": "timed out"}
+                return {}
+            case "mutate":
+                for column, mutator, (_, value) in operation["mutations"]:
+                    if mutator == "delete":
+                        for key in value:
+                            row[column].pop(key, None)
+                    else:
+                        row[column].update(dict(value))
+                return {"count": 1}
+        return {"error": "unknown op"}
+
+
+class _OVSDBServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A fake ovsdb-server listening on a unix socket."""
+
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.row = {"external_ids": {"system-id": "node-1"}}
+        self.requests = []
+        self.before_transact = None
+        self.echo = False
+        self.echoed = threading.Event()
+
+
+@pytest.fixture
+def ovsdb_server(tmp_path):
+    """Run a fake ovsdb-server on a temporary unix socket."""
+    socket_path = str(tmp_path / "db.sock")
+    server = _OVSDBServer(socket_path, _OVSDBHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    with OVSDBClient(socket_path=socket_path, timeout=2) as client:
+        yield server, client
+    server.shutdown()
+    server.server_close()
+
+
+def test_available(tmp_path, ovsdb_server):
+    """Test the client is only available once the database socket exists."""
+    _, client = ovsdb_server
+
+    assert client.available
+    assert not OVSDBClient(socket_path=str(tmp_path / "missing.sock")).available
+
+
+def test_get_map(ovsdb_server):
+    """Test reading a map column of the root row."""
+    _, client = ovsdb_server
+
+    assert client.get_map("Open_vSwitch", "external_ids") == {"system-id": "node-1"}
+
+
+def test_update_map_value_one_transaction(ovsdb_server):
+    """Test the value is written by a single transaction guarded by a wait."""
+    server, client = ovsdb_server
+
+    changed = client.update_map_value(
+        "Open_vSwitch", "external_ids", "ovn-cms-options", lambda _: "enable-chassis-as-gw"
+    )
+
+    assert changed
+    assert server.row["external_ids"] == {
+        "system-id": "node-1",
+        "ovn-cms-options": "enable-chassis-as-gw",
+    }
+    select, write = server.requests
+    assert [op["op"] for op in write["params"][1:]] == ["wait", "mutate", "mutate"]
+
+
+def test_update_map_value_remove(ovsdb_server):
+    """Test a None value removes the key."""
+    server, client = ovsdb_server
+    server.row["external_ids"]["ovn-cms-options"] = "enable-chassis-as-gw"
+
+    assert client.update_map_value(
+        "Open_vSwitch", "external_ids", "ovn-cms-options", lambda _: None
+    )
+    assert server.row["external_ids"] == {"system-id": "node-1"}
+
+
+def test_update_map_value_unchanged(ovsdb_server):
+    """Test nothing is written when the value is already the desired one."""
+    server, client = ovsdb_server
+
+    assert not client.update_map_value(
+        "Open_vSwitch", "external_ids", "system-id", lambda current: current
+    )
+    assert len(server.requests) == 1
+
+
+def test_update_map_value_concurrent_change(ovsdb_server):
+    """Test a change made between the read and the write is not clobbered."""
+    server, client = ovsdb_server
+    writes = []
+
+    def concurrent_edit(operations):
+        if operations[0]["op"] == "wait" and not writes:
+            writes.append(operations)
+            server.row["external_ids"]["ovn-cms-options"] = "other-option"
+
+    server.before_transact = concurrent_edit
+
+    def add_gateway(current):
+        options = set(filter(None, (current or "").split(",")))
+        return ",".join(sorted(options | {"enable-chassis-as-gw"}))
+
+    assert client.update_map_value("Open_vSwitch", "external_ids", "ovn-cms-options", add_gateway)
+    assert server.row["external_ids"]["ovn-cms-options"] == "enable-chassis-as-gw,other-option"
+
+
+def test_update_map_value_keeps_changing(ovsdb_server):
+    """Test giving up when the column changes on every attempt."""
+    server, client = ovsdb_server
+
+    def concurrent_edit(operations):
+        if operations[0]["op"] == "wait":
+            server.row["external_ids"]["counter"] = str(len(server.requests))
+
+    server.before_transact = concurrent_edit
+
+    with pytest.raises(OVSDBError, match="kept changing"):
+        client.update_map_value("Open_vSwitch", "external_ids", "key", lambda _: "value")
+
+
+def test_echo_answered(ovsdb_server):
+    """Test the server's inactivity probe is answered."""
+    server, client = ovsdb_server
+    server.echo = True
+
+    assert client.get_map("Open_vSwitch", "external_ids") == {"system-id": "node-1"}
+    assert server.echoed.wait(timeout=2)
+
+
+def test_unreachable(tmp_path):
+    """Test a missing database fails with an OVSDBError."""
+    client = OVSDBClient(socket_path=str(tmp_path / "missing.sock"))
+
+    with pytest.raises(OVSDBError, match="cannot connect"):
+        client.get_map("Open_vSwitch", "external_ids")
@@ -0,0 +1,83 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for the readiness waits."""
+
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from readiness import Watcher, backoff_delays, wait_until
+
+
+def _later(seconds: float, action) -> threading.Timer:
+    timer = threading.Timer(seconds, action)
+    timer.start()
+    return timer
+
+
+def test_backoff_delays():
+    """Test the delays double up to the maximum, jittered down by up to a half."""
+    delays = backoff_delays(initial=1, maximum=4)
+    for bound in (1, 2, 4, 4):
+        delay = next(delays)
+        assert bound / 2 <= delay <= bound
+
+
+def test_wait_until_ready():
+    """Test the time to become ready is returned."""
+    elapsed = wait_until(lambda: True, timeout=5)
+
+    assert elapsed is not None
+    assert elapsed < 0.1
+
+
+def test_wait_until_deadline():
+    """Test waiting stops at the deadline."""
+    start = time.monotonic()
+
+    assert wait_until(lambda: False, timeout=0.3) is None
+    assert 0.3 <= time.monotonic() - start < 0.8
+
+
+@pytest.mark.parametrize("nested", [False, True])
+def test_wait_until_wakes_on_change(tmp_path, nested):
+    """Test a watched path appearing is noticed before the next backoff delay."""
+    path = tmp_path / "state" / "control.socket" if nested else tmp_path / "control.socket"
+
+    def create():
+        path.parent.mkdir(exist_ok=True)
+        # Give the watch on the new directory a moment to be armed.
+        time.sleep(0.1 if nested else 0)
+        path.touch()
+
+    timer = _later(0.2, create)
+    with patch("readiness.backoff_delays", return_value=iter([10.0] * 10)):
+        elapsed = wait_until(path.exists, timeout=5, watch=[str(path)])
+    timer.join()
+
+    assert elapsed is not None
+    assert elapsed < 2
+
+
+def test_wait_until_without_inotify(tmp_path):
+    """Test the backoff alone finds readiness where inotify is not available."""
+    path = tmp_path / "control.socket"
+    timer = _later(0.2, path.touch)
+    with patch("readiness._inotify_libc", return_value=None):
+        elapsed = wait_until(path.exists, timeout=5, watch=[str(path)])
+    timer.join()
+
+    assert elapsed is not None
+
+
+def test_watcher_closes(tmp_path):
+    """Test the inotify descriptor is released."""
+    with Watcher([str(tmp_path / "file")]) as watcher:
+        fd = watcher._fd
+        assert fd >= 0
+    with pytest.raises(OSError):
+        os.fstat(fd)
@@ -14,11 +14,37 @@ from charms.role_distributor.v0.role_assignment import AssignmentStatus
 from ops import testing
 
 from charm import MicroovnCharm
+from cluster_status import ClusterStatus, Member
 from constants import (
     OVSDBCMD_RELATION,
     ROLE_ASSIGNMENT_RELATION,
 )
+from ovsdb_client import OVSDBError
+from role_handler import (
+    Role,
+    RoleHandler,
+    Transition,
+    _roles_fingerprint,
+    _with_gateway_option,
+)
 from snap_manager import SnapManager
+from utils import invalidate_cluster_status
+
+
+@pytest.fixture(autouse=True)
+def mock_cluster_status():
+    """Mock the cluster status query, leaving every service change to microovn."""
+    with patch("utils._query_cluster_status", return_value=None) as mock:
+        yield mock
+
+
+@pytest.fixture(autouse=True)
+def mock_ovsdb_client():
+    """Mock the OVSDB client as unavailable, leaving gateway changes to ovs-vsctl."""
+    with patch("role_handler.OVSDBClient") as mock:
+        client = mock.return_value.__enter__.return_value
+        client.available = False
+        yield client
 
 
 @pytest.fixture()
@@ -56,9 +82,9 @@ def mock_call_microovn_command():
 
 
 @pytest.fixture()
-def mock_subprocess_run():
-    """Mock subprocess.run in role_handler module (used for ovs-vsctl gateway commands)."""
-    with patch("role_handler.subprocess.run") as mock:
+def mock_call_ovs_vsctl():
+    """Mock call_ovs_vsctl function in role_handler module (used for gateway commands)."""
+    with patch("role_handler.call_ovs_vsctl") as mock:
         mock.return_value = CompletedProcess(args="", returncode=0, stderr="", stdout="")
         yield mock
 
@@ -114,7 +140,7 @@ def _assert_role_matrix_case(
     manager,
     case: RoleMatrixCase,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
 ) -> None:
     """Assert status and workload mutations for a role matrix case."""
     if case.blocked_message_substring is None:
@@ -131,7 +157,7 @@ def _assert_role_matrix_case(
 
     gateway_write_calls = [
         call
-        for call in mock_subprocess_run.call_args_list
+        for call in mock_call_ovs_vsctl.call_args_list
         if "set" in str(call) or "remove" in str(call)
     ]
     if case.expect_gateway_write:
@@ -226,7 +252,7 @@ def test_role_matrix_local(
     mock_check_metrics_endpoint,
     case,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Role combinations in local mode should enforce the expected invariants."""
@@ -242,7 +268,7 @@ def test_role_matrix_local(
     ) as manager:
         manager.charm.token_consumer._stored.in_cluster = True
 
-    _assert_role_matrix_case(manager, case, mock_call_microovn_command, mock_subprocess_run)
+    _assert_role_matrix_case(manager, case, mock_call_microovn_command, mock_call_ovs_vsctl)
 
 
 @pytest.mark.parametrize("case", DATAPLANE_ROLE_CASES)
@@ -252,7 +278,7 @@ def test_role_matrix_dataplane_only(
     mock_check_metrics_endpoint,
     case,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Role combinations in dataplane-only mode should enforce the expected invariants."""
@@ -266,7 +292,7 @@ def test_role_matrix_dataplane_only(
     ) as manager:
         manager.charm.token_consumer._stored.in_cluster = True
 
-    _assert_role_matrix_case(manager, case, mock_call_microovn_command, mock_subprocess_run)
+    _assert_role_matrix_case(manager, case, mock_call_microovn_command, mock_call_ovs_vsctl)
 
 
 def test_not_in_cluster_defers(
@@ -370,7 +396,7 @@ def test_assignment_with_workload_params_still_applies_roles(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Assigned workload_params should not change role enforcement semantics."""
@@ -392,7 +418,7 @@ def test_assignment_with_workload_params_still_applies_roles(
     mock_call_microovn_command.assert_any_call("enable", "central")
     gateway_write_calls = [
         call
-        for call in mock_subprocess_run.call_args_list
+        for call in mock_call_ovs_vsctl.call_args_list
         if "set" in str(call) or "remove" in str(call)
     ]
     assert not gateway_write_calls
@@ -418,11 +444,11 @@ def test_missing_assignment_entry_does_not_clear_cached_roles(
         testing.State(relations=[role_rel]),
     ) as manager:
         manager.charm.token_consumer._stored.in_cluster = True
-        manager.charm.role_handler._save_applied_roles({"central", "chassis"})
+        manager.charm.role_handler._save_applied_fingerprint("fingerprint")
 
         manager.charm.role_handler.enforce_roles()
 
-        assert manager.charm.role_handler._get_applied_roles() == {"central", "chassis"}
+        assert manager.charm.role_handler._stored.applied_fingerprint == "fingerprint"
 
     mock_call_microovn_command.assert_not_called()
 
@@ -456,7 +482,7 @@ def test_disabling_last_central_outside_dataplane_only_blocks(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Local central removal must not use the destructive disable flag."""
@@ -486,19 +512,162 @@ def test_disabling_last_central_outside_dataplane_only_blocks(
     assert ("disable", "central", "--allow-disable-last-central") not in calls
 
 
+def _cluster_status(**members: list[str]) -> ClusterStatus:
+    """Return a cluster status with the given services enabled on each member."""
+    return ClusterStatus(
+        tuple(
+            Member(name, f"10.0.0.{i}", frozenset(services))
+            for i, (name, services) in enumerate(members.items())
+        )
+    )
+
+
+def test_services_in_desired_state_skip_microovn(
+    mock_microovn_snap,
+    mock_ovn_exporter_snap,
+    mock_check_metrics_endpoint,
+    mock_call_microovn_command,
+    mock_call_ovs_vsctl,
+    mock_microovn_central_exists,
+    mock_cluster_status,
+):
+    """Services the cluster status shows in their desired state are left alone."""
+    role_rel = _make_role_assignment_relation(status="assigned", roles=["chassis"])
+    mock_cluster_status.return_value = _cluster_status(
+        local=["chassis", "switch"], other=["central"]
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch("cluster_status.socket.gethostname", return_value="local"),
+        ctx(
+            ctx.on.relation_changed(role_rel),
+            testing.State(relations=[role_rel]),
+        ) as manager,
+    ):
+        manager.charm.token_consumer._stored.in_cluster = True
+
+    assert not isinstance(manager.charm.unit.status, ops.BlockedStatus)
+    mock_call_microovn_command.assert_not_called()
+    mock_cluster_status.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    "roles,enabled,gateway_enabled,expected",
+    [
+        (
+            {"chassis"},
+            set(),
+            False,
+            "enable chassis; no-op central; no-op gateway",
+        ),
+        (
+            {"central"},
+            {Role.CHASSIS},
+            True,
+            "disable gateway; disable chassis; enable central",
+        ),
+        (
+            {"central", "chassis", "gateway"},
+            {Role.CENTRAL, Role.CHASSIS},
+            False,
+            "no-op chassis; no-op central; enable gateway",
+        ),
+        (
+            {"chassis"},
+            None,
+            False,
+            "enable chassis; disable central; no-op gateway",
+        ),
+    ],
+)
+def test_plan_transitions(roles, enabled, gateway_enabled, expected):
+    """Only the roles whose service is not in its desired state transition."""
+    plan = RoleHandler._plan_transitions(roles, enabled, gateway_enabled)
+
+    assert "; ".join(f"{action} {role}" for role, action in plan) == expected
+    assert all(isinstance(action, Transition) for _, action in plan)
+
+
+def test_roles_in_desired_state_make_no_workload_calls(
+    mock_microovn_snap,
+    mock_ovn_exporter_snap,
+    mock_check_metrics_endpoint,
+    mock_call_microovn_command,
+    mock_call_ovs_vsctl,
+    mock_microovn_central_exists,
+    mock_cluster_status,
+    caplog,
+):
+    """Reconciling roles the unit already has only reads its state."""
+    role_rel = _make_role_assignment_relation(
+        status="assigned", roles=["central", "chassis", "gateway"]
+    )
+    mock_cluster_status.return_value = _cluster_status(local=["central", "chassis", "switch"])
+    mock_call_ovs_vsctl.return_value = CompletedProcess(
+        args="", returncode=0, stderr="", stdout='"enable-chassis-as-gw"'
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        caplog.at_level("INFO", logger="role_handler"),
+        patch("cluster_status.socket.gethostname", return_value="local"),
+        ctx(
+            ctx.on.relation_changed(role_rel),
+            testing.State(relations=[role_rel]),
+        ) as manager,
+    ):
+        manager.charm.token_consumer._stored.in_cluster = True
+
+    assert not isinstance(manager.charm.unit.status, ops.BlockedStatus)
+    mock_call_microovn_command.assert_not_called()
+    assert [call.args[0] for call in mock_call_ovs_vsctl.call_args_list] == ["get"]
+    assert "Role plan: no-op chassis; no-op central; no-op gateway" in caplog.text
+
+
+def test_last_central_from_cluster_status_blocks(
+    mock_microovn_snap,
+    mock_ovn_exporter_snap,
+    mock_check_metrics_endpoint,
+    mock_call_microovn_command,
+    mock_call_ovs_vsctl,
+    mock_microovn_central_exists,
+    mock_cluster_status,
+):
+    """Disabling the only central of the cluster is refused without calling microovn."""
+    role_rel = _make_role_assignment_relation(status="assigned", roles=["chassis"])
+    mock_cluster_status.return_value = _cluster_status(
+        local=["central", "chassis"], other=["chassis"]
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch("cluster_status.socket.gethostname", return_value="local"),
+        ctx(
+            ctx.on.relation_changed(role_rel),
+            testing.State(relations=[role_rel]),
+        ) as manager,
+    ):
+        manager.charm.token_consumer._stored.in_cluster = True
+
+    assert isinstance(manager.charm.unit.status, ops.BlockedStatus)
+    assert "last central" in manager.charm.unit.status.message.lower()
+    mock_call_microovn_command.assert_not_called()
+
+
 def test_gateway_removed_clears_option(
     mock_microovn_snap,
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """[central, chassis] without gateway should clear enable-chassis-as-gw."""
     role_rel = _make_role_assignment_relation(status="assigned", roles=["central", "chassis"])
 
     # ovs-vsctl get returns existing gateway option
-    mock_subprocess_run.side_effect = [
+    mock_call_ovs_vsctl.side_effect = [
         CompletedProcess(args="", returncode=0, stderr="", stdout='"enable-chassis-as-gw"'),  # get
         CompletedProcess(args="", returncode=0, stderr="", stdout=""),  # set (clear)
     ]
@@ -512,7 +681,7 @@ def test_gateway_removed_clears_option(
 
     assert not isinstance(manager.charm.unit.status, ops.BlockedStatus)
     # Verify ovs-vsctl remove was called to clear the option
-    remove_calls = [c for c in mock_subprocess_run.call_args_list if "remove" in str(c)]
+    remove_calls = [c for c in mock_call_ovs_vsctl.call_args_list if "remove" in str(c)]
     assert remove_calls
 
 
@@ -524,7 +693,7 @@ def test_revoke_keeps_workload_state(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Relation broken keeps current workload state, no commands executed."""
@@ -538,7 +707,7 @@ def test_revoke_keeps_workload_state(
         manager.charm.token_consumer._stored.in_cluster = True
 
     mock_call_microovn_command.assert_not_called()
-    mock_subprocess_run.assert_not_called()
+    mock_call_ovs_vsctl.assert_not_called()
 
 
 def test_revoke_clears_stored_roles(
@@ -546,10 +715,10 @@ def test_revoke_clears_stored_roles(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
-    """Relation broken clears stored applied roles, so future events don't enforce."""
+    """Relation broken clears the stored fingerprint, so future roles are applied."""
     role_rel = _make_role_assignment_relation(status="assigned", roles=["central", "chassis"])
 
     ctx = testing.Context(MicroovnCharm)
@@ -558,12 +727,11 @@ def test_revoke_clears_stored_roles(
         testing.State(relations=[role_rel]),
     ) as manager:
         manager.charm.token_consumer._stored.in_cluster = True
-        # Pre-populate stored roles to simulate a prior apply
-        manager.charm.role_handler._save_applied_roles({"central", "chassis"})
-        assert manager.charm.role_handler._get_applied_roles() == {"central", "chassis"}
+        # Pre-populate the fingerprint to simulate a prior apply
+        manager.charm.role_handler._save_applied_fingerprint("fingerprint")
 
-    # After the relation_broken event, stored roles should be cleared
-    assert manager.charm.role_handler._get_applied_roles() is None
+    # After the relation_broken event, the fingerprint should be cleared
+    assert manager.charm.role_handler._stored.applied_fingerprint == ""
 
 
 def test_revoke_recomputes_status_via_relation_broken(
@@ -571,7 +739,7 @@ def test_revoke_recomputes_status_via_relation_broken(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Relation broken triggers status recomputation and reaches ActiveStatus."""
@@ -588,7 +756,7 @@ def test_revoke_recomputes_status_via_relation_broken(
     # which should reach ActiveStatus since the relation is gone.
     assert manager.charm.unit.status == ops.ActiveStatus()
     mock_call_microovn_command.assert_not_called()
-    mock_subprocess_run.assert_not_called()
+    mock_call_ovs_vsctl.assert_not_called()
 
 
 # --- Idempotency tests ---
@@ -599,7 +767,7 @@ def test_same_roles_twice_no_extra_commands(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Re-applying the same roles should not block even if enable-central reports already enabled.
@@ -638,42 +806,138 @@ def test_same_roles_twice_no_extra_commands(
     assert not isinstance(manager2.charm.unit.status, ops.BlockedStatus)
 
 
-def test_stored_roles_skip_mutation(
+def test_stored_fingerprint_skips_mutation(
     mock_microovn_snap,
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
+    mock_cluster_status,
 ):
-    """When stored roles match desired roles, no microovn commands should run."""
+    """When the stored fingerprint matches the assigned roles, the workload is not even read."""
     role_rel = _make_role_assignment_relation(status="assigned", roles=["central", "chassis"])
+    fingerprint = _roles_fingerprint({"central", "chassis"}, dataplane_only=False)
 
-    # First application
     ctx = testing.Context(MicroovnCharm)
     with ctx(
-        ctx.on.relation_changed(role_rel),
+        ctx.on.update_status(),
         testing.State(relations=[role_rel]),
     ) as manager:
         manager.charm.token_consumer._stored.in_cluster = True
+        # Pre-populate stored state to simulate prior apply
+        manager.charm.role_handler._save_applied_fingerprint(fingerprint)
+        manager.run()
 
-    mock_call_microovn_command.assert_called()
-    mock_call_microovn_command.reset_mock()
-    mock_subprocess_run.reset_mock()
+        assert manager.charm.role_handler._stored.applied_fingerprint == fingerprint
 
-    # Second application via enforce_roles (simulating update-status path)
-    ctx2 = testing.Context(MicroovnCharm)
-    with ctx2(
-        ctx2.on.update_status(),
-        testing.State(relations=[role_rel]),
-    ) as manager2:
-        manager2.charm.token_consumer._stored.in_cluster = True
-        # Pre-populate stored state to simulate prior apply
-        manager2.charm.role_handler._save_applied_roles({"central", "chassis"})
+    mock_call_microovn_command.assert_not_called()
+    mock_call_ovs_vsctl.assert_not_called()
+    mock_cluster_status.assert_not_called()
+
+
+def test_workload_matching_roles_skips_mutation(
+    mock_microovn_snap,
+    mock_ovn_exporter_snap,
+    mock_check_metrics_endpoint,
+    mock_call_microovn_command,
+    mock_call_ovs_vsctl,
+    mock_microovn_central_exists,
+    mock_cluster_status,
+):
+    """Without a stored fingerprint, a workload already matching the roles is only read."""
+    role_rel = _make_role_assignment_relation(status="assigned", roles=["central", "chassis"])
+    mock_cluster_status.return_value = _cluster_status(local=["central", "chassis", "switch"])
+
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch("cluster_status.socket.gethostname", return_value="local"),
+        ctx(ctx.on.update_status(), testing.State(relations=[role_rel])) as manager,
+    ):
+        manager.charm.token_consumer._stored.in_cluster = True
+        manager.run()
+
+        assert manager.charm.role_handler._stored.applied_fingerprint == _roles_fingerprint(
+            {"central", "chassis"}, dataplane_only=False
+        )
 
-    # No microovn commands should have been called for role application
     mock_call_microovn_command.assert_not_called()
-    mock_subprocess_run.assert_not_called()
+    assert [call.args[0] for call in mock_call_ovs_vsctl.call_args_list] == ["get"]
+
+
+@pytest.mark.parametrize(
+    "services,expected_calls",
+    [
+        (["central", "chassis"], []),
+        (["chassis"], [("enable", "central")]),
+    ],
+)
+def test_invalidated_cache_checks_workload(
+    mock_microovn_snap,
+    mock_ovn_exporter_snap,
+    mock_check_metrics_endpoint,
+    mock_call_microovn_command,
+    mock_call_ovs_vsctl,
+    mock_microovn_central_exists,
+    mock_cluster_status,
+    services,
+    expected_calls,
+):
+    """After an invalidation, only a workload that drifted from the roles is changed."""
+    role_rel = _make_role_assignment_relation(status="assigned", roles=["central", "chassis"])
+    mock_cluster_status.return_value = _cluster_status(local=services)
+
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(
+        ctx.on.relation_changed(role_rel),
+        testing.State(relations=[role_rel]),
+    ) as manager:
+        manager.charm.token_consumer._stored.in_cluster = True
+        state = manager.run()
+    mock_call_microovn_command.reset_mock()
+
+    with (
+        patch("cluster_status.socket.gethostname", return_value="local"),
+        ctx(ctx.on.update_status(), state) as manager,
+    ):
+        manager.charm.role_handler.invalidate_applied_roles()
+        manager.run()
+
+    assert [call.args for call in mock_call_microovn_command.call_args_list] == expected_calls
+
+
+def test_invalidation_drops_observed_workload(
+    mock_microovn_snap,
+    mock_ovn_exporter_snap,
+    mock_check_metrics_endpoint,
+    mock_call_microovn_command,
+    mock_call_ovs_vsctl,
+    mock_microovn_central_exists,
+    mock_cluster_status,
+):
+    """Central disabled outside RoleHandler in the same dispatch is enabled again."""
+    role_rel = _make_role_assignment_relation(status="assigned", roles=["central", "chassis"])
+    mock_cluster_status.return_value = _cluster_status(local=["central", "chassis"])
+
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch("cluster_status.socket.gethostname", return_value="local"),
+        ctx(ctx.on.start(), testing.State(relations=[role_rel])) as manager,
+    ):
+        handler = manager.charm.role_handler
+        handler.enforce_roles()
+        mock_call_microovn_command.assert_not_called()
+
+        # Simulates _dataplane_mode() disabling central.
+        mock_cluster_status.return_value = _cluster_status(local=["chassis"])
+        invalidate_cluster_status()
+        handler.enforce_roles()
+        mock_call_microovn_command.assert_not_called()
+
+        handler.invalidate_applied_roles()
+        handler.enforce_roles()
+
+    mock_call_microovn_command.assert_called_once_with("enable", "central")
 
 
 # --- Concurrent relation lifecycle tests ---
@@ -684,7 +948,7 @@ def test_ovsdb_external_ready_with_control_role_blocks(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Ready ovsdb-external with central role assigned should block with dataplane-only message.
@@ -713,7 +977,7 @@ def test_local_chassis_only_after_ovsdb_external_removed_succeeds(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Chassis-only without ready ovsdb-external should stay valid in local mode."""
@@ -739,7 +1003,7 @@ def test_update_status_enforces_role_constraints(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """update-status with role relation should re-evaluate and enforce constraints."""
@@ -828,7 +1092,7 @@ def test_gateway_config_get_failure_does_not_clobber_on_enable(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """When ovs-vsctl get fails and we enable gateway, set only the gateway flag."""
@@ -836,7 +1100,7 @@ def test_gateway_config_get_failure_does_not_clobber_on_enable(
         status="assigned", roles=["central", "chassis", "gateway"]
     )
 
-    mock_subprocess_run.side_effect = [
+    mock_call_ovs_vsctl.side_effect = [
         # get fails, no existing key
         CompletedProcess(args="", returncode=1, stderr="no key", stdout=""),
         # set succeeds
@@ -852,7 +1116,7 @@ def test_gateway_config_get_failure_does_not_clobber_on_enable(
 
     assert not isinstance(manager.charm.unit.status, ops.BlockedStatus)
     # Verify the set call only contains the gateway flag
-    set_call = mock_subprocess_run.call_args_list[1]
+    set_call = mock_call_ovs_vsctl.call_args_list[1]
     assert "enable-chassis-as-gw" in str(set_call)
 
 
@@ -861,13 +1125,13 @@ def test_gateway_config_get_failure_preserves_state_on_disable(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """When ovs-vsctl get fails and we disable gateway, don't write anything."""
     role_rel = _make_role_assignment_relation(status="assigned", roles=["central", "chassis"])
 
-    mock_subprocess_run.return_value = CompletedProcess(
+    mock_call_ovs_vsctl.return_value = CompletedProcess(
         args="", returncode=1, stderr="no key", stdout=""
     )
 
@@ -880,7 +1144,7 @@ def test_gateway_config_get_failure_preserves_state_on_disable(
 
     assert not isinstance(manager.charm.unit.status, ops.BlockedStatus)
     # Only the get call, no set/remove call
-    assert mock_subprocess_run.call_count == 1
+    assert mock_call_ovs_vsctl.call_count == 1
 
 
 def test_gateway_config_preserves_other_options(
@@ -888,7 +1152,7 @@ def test_gateway_config_preserves_other_options(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """When adding gateway, existing ovn-cms-options should be preserved."""
@@ -896,7 +1160,7 @@ def test_gateway_config_preserves_other_options(
         status="assigned", roles=["central", "chassis", "gateway"]
     )
 
-    mock_subprocess_run.side_effect = [
+    mock_call_ovs_vsctl.side_effect = [
         # get returns existing options
         CompletedProcess(args="", returncode=0, stderr="", stdout='"other-option"'),
         # set succeeds
@@ -911,7 +1175,7 @@ def test_gateway_config_preserves_other_options(
         manager.charm.token_consumer._stored.in_cluster = True
 
     assert not isinstance(manager.charm.unit.status, ops.BlockedStatus)
-    set_call = mock_subprocess_run.call_args_list[1]
+    set_call = mock_call_ovs_vsctl.call_args_list[1]
     set_args = str(set_call)
     assert "other-option" in set_args
     assert "enable-chassis-as-gw" in set_args
@@ -920,20 +1184,20 @@ def test_gateway_config_preserves_other_options(
 # --- Gateway transient failure tests ---
 
 
-def test_gateway_transient_get_failure_blocks_on_enable(
+def test_gateway_transient_get_failure_warns_on_enable(
     mock_microovn_snap,
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
-    """Transient ovs-vsctl get failure should block, not write from empty."""
+    """Transient ovs-vsctl get failure should not block nor write from empty."""
     role_rel = _make_role_assignment_relation(
         status="assigned", roles=["central", "chassis", "gateway"]
     )
 
-    mock_subprocess_run.return_value = CompletedProcess(
+    mock_call_ovs_vsctl.return_value = CompletedProcess(
         args="", returncode=1, stderr="database connection failed", stdout=""
     )
 
@@ -944,27 +1208,28 @@ def test_gateway_transient_get_failure_blocks_on_enable(
     ) as manager:
         manager.charm.token_consumer._stored.in_cluster = True
 
-    assert isinstance(manager.charm.unit.status, ops.BlockedStatus)
-    assert "gateway" in manager.charm.unit.status.message.lower()
+    assert not isinstance(manager.charm.unit.status, ops.BlockedStatus)
+    # Not applied, so the roles are tried again on the next hook.
+    assert manager.charm.role_handler._stored.applied_fingerprint == ""
     # No write (set/remove) calls, only get calls
     write_calls = [
-        c for c in mock_subprocess_run.call_args_list if "set" in str(c) or "remove" in str(c)
+        c for c in mock_call_ovs_vsctl.call_args_list if "set" in str(c) or "remove" in str(c)
     ]
     assert not write_calls
 
 
-def test_gateway_transient_get_failure_blocks_on_disable(
+def test_gateway_transient_get_failure_warns_on_disable(
     mock_microovn_snap,
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
-    """Transient ovs-vsctl get failure on disable should block, not skip."""
+    """Transient ovs-vsctl get failure on disable leaves the roles for a later hook."""
     role_rel = _make_role_assignment_relation(status="assigned", roles=["central", "chassis"])
 
-    mock_subprocess_run.return_value = CompletedProcess(
+    mock_call_ovs_vsctl.return_value = CompletedProcess(
         args="", returncode=1, stderr="database connection failed", stdout=""
     )
 
@@ -975,11 +1240,12 @@ def test_gateway_transient_get_failure_blocks_on_disable(
     ) as manager:
         manager.charm.token_consumer._stored.in_cluster = True
 
-    assert isinstance(manager.charm.unit.status, ops.BlockedStatus)
-    assert "gateway" in manager.charm.unit.status.message.lower()
+    assert not isinstance(manager.charm.unit.status, ops.BlockedStatus)
+    # Not applied, so the roles are tried again on the next hook.
+    assert manager.charm.role_handler._stored.applied_fingerprint == ""
     # No write (set/remove) calls, only get calls
     write_calls = [
-        c for c in mock_subprocess_run.call_args_list if "set" in str(c) or "remove" in str(c)
+        c for c in mock_call_ovs_vsctl.call_args_list if "set" in str(c) or "remove" in str(c)
     ]
     assert not write_calls
 
@@ -992,7 +1258,7 @@ def test_revoke_clears_stale_error_status(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Relation broken after error assignment clears BlockedStatus."""
@@ -1017,14 +1283,14 @@ def test_cache_invalidated_re_applies_roles(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """After cache invalidation, enforce_roles re-applies even if roles match.
 
     Reproduces the high-priority bug: _dataplane_mode() disables central
-    outside RoleHandler, cache still says {central, chassis} is applied,
-    so enforce_roles short-circuits. After invalidation, it should
+    outside RoleHandler, while the workload RoleHandler observed still has
+    it, so enforce_roles short-circuits. After invalidation, it should
     re-enable central.
     """
     role_rel = _make_role_assignment_relation(status="assigned", roles=["central", "chassis"])
@@ -1035,8 +1301,8 @@ def test_cache_invalidated_re_applies_roles(
         testing.State(relations=[role_rel]),
     ) as manager:
         manager.charm.token_consumer._stored.in_cluster = True
-        # Pre-populate cache (simulates prior successful apply)
-        manager.charm.role_handler._save_applied_roles({"central", "chassis"})
+        # Pre-populate the fingerprint (simulates prior successful apply)
+        manager.charm.role_handler._save_applied_fingerprint("fingerprint")
         # Invalidate (simulates what _on_ovsdbcms_broken does)
         manager.charm.role_handler.invalidate_applied_roles()
 
@@ -1053,7 +1319,7 @@ def test_apply_assigned_reaches_active_status(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Successful role application should end at ActiveStatus, not stale.
@@ -1082,7 +1348,7 @@ def test_control_role_then_ready_ovsdb_external_added_blocks_on_update_status(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """After central+chassis applied, ready ovsdb-external should block on update-status."""
@@ -1110,7 +1376,7 @@ def test_chassis_only_ovsdb_external_removed_stays_active_on_update_status(
     mock_ovn_exporter_snap,
     mock_check_metrics_endpoint,
     mock_call_microovn_command,
-    mock_subprocess_run,
+    mock_call_ovs_vsctl,
     mock_microovn_central_exists,
 ):
     """Chassis-only role without ready ovsdb-external should remain valid on update-status."""
@@ -1126,3 +1392,82 @@ def test_chassis_only_ovsdb_external_removed_stays_active_on_update_status(
     assert manager.charm.unit.status == ops.ActiveStatus()
     mock_call_microovn_command.assert_any_call("enable", "chassis")
     mock_call_microovn_command.assert_any_call("disable", "central")
+
+
+# --- Gateway updates over OVSDB ---
+
+
+@pytest.mark.parametrize(
+    "current,enable,expected",
+    [
+        (None, True, "enable-chassis-as-gw"),
+        ("other-option", True, "enable-chassis-as-gw,other-option"),
+        ("enable-chassis-as-gw", True, "enable-chassis-as-gw"),
+        ("enable-chassis-as-gw,other-option", False, "other-option"),
+        ("enable-chassis-as-gw", False, None),
+        (None, False, None),
+    ],
+)
+def test_with_gateway_option(current, enable, expected):
+    """The gateway option is added or removed, keeping the other options."""
+    assert _with_gateway_option(current, enable=enable) == expected
+
+
+def test_gateway_set_over_ovsdb(
+    mock_microovn_snap,
+    mock_ovn_exporter_snap,
+    mock_check_metrics_endpoint,
+    mock_call_microovn_command,
+    mock_call_ovs_vsctl,
+    mock_microovn_central_exists,
+    mock_ovsdb_client,
+):
+    """With the database socket present, the option is updated without ovs-vsctl."""
+    role_rel = _make_role_assignment_relation(
+        status="assigned", roles=["central", "chassis", "gateway"]
+    )
+    mock_ovsdb_client.available = True
+    mock_ovsdb_client.get_map.return_value = {"ovn-cms-options": "other-option"}
+    mock_ovsdb_client.update_map_value.return_value = True
+
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(
+        ctx.on.relation_changed(role_rel),
+        testing.State(relations=[role_rel]),
+    ) as manager:
+        manager.charm.token_consumer._stored.in_cluster = True
+
+    assert not isinstance(manager.charm.unit.status, ops.BlockedStatus)
+    mock_call_ovs_vsctl.assert_not_called()
+    table, column, key, update = mock_ovsdb_client.update_map_value.call_args.args
+    assert (table, column, key) == ("Open_vSwitch", "external_ids", "ovn-cms-options")
+    assert update("other-option") == "enable-chassis-as-gw,other-option"
+
+
+def test_gateway_ovsdb_failure_blocks(
+    mock_microovn_snap,
+    mock_ovn_exporter_snap,
+    mock_check_metrics_endpoint,
+    mock_call_microovn_command,
+    mock_call_ovs_vsctl,
+    mock_microovn_central_exists,
+    mock_ovsdb_client,
+):
+    """A failed OVSDB transaction blocks rather than falling back to ovs-vsctl."""
+    role_rel = _make_role_assignment_relation(
+        status="assigned", roles=["central", "chassis", "gateway"]
+    )
+    mock_ovsdb_client.available = True
+    mock_ovsdb_client.get_map.return_value = {}
+    mock_ovsdb_client.update_map_value.side_effect = OVSDBError("transaction failed")
+
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(
+        ctx.on.relation_changed(role_rel),
+        testing.State(relations=[role_rel]),
+    ) as manager:
+        manager.charm.token_consumer._stored.in_cluster = True
+
+    assert isinstance(manager.charm.unit.status, ops.BlockedStatus)
+    assert "gateway configuration" in manager.charm.unit.status.message
+    mock_call_ovs_vsctl.assert_not_called()
@@ -0,0 +1,274 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for the RollingRefresh."""
+
+import json
+from unittest.mock import MagicMock, patch
+
+import ops
+import pydantic
+import pytest
+from ops import testing
+
+from charm import MicroovnCharm
+from config import CharmConfig
+from constants import (
+    BASE_SNAP_RESOURCE,
+    MICROOVN_SNAP_RESOURCE,
+    MICROOVN_TRACK,
+    OVN_EXPORTER_SNAP_RESOURCE,
+    OVN_EXPORTER_TRACK,
+    PEER_RELATION,
+    SNAP_ASSERTIONS_RESOURCE,
+    SNAPD_SNAP_RESOURCE,
+)
+from rolling_refresh import batch_size
+from snap_manager import SnapManager
+
+CHANNEL = MICROOVN_TRACK + "/beta"
+
+
+@pytest.fixture()
+def mock_refresh():
+    """Mock refreshing the microovn snap."""
+    with patch.object(MicroovnCharm, "_refresh_microovn", return_value=True) as mock_refresh:
+        yield mock_refresh
+
+
+@pytest.fixture()
+def mock_healthy():
+    """Mock the health gate run after a refresh."""
+    with patch.object(MicroovnCharm, "_is_healthy", return_value=True) as mock_healthy:
+        yield mock_healthy
+
+
+def _lock(*units: str, channel: str = CHANNEL) -> dict:
+    """Return the application databag holding a refresh lock."""
+    return {"refresh-lock": json.dumps({"channel": channel, "units": list(units), "started": 0})}
+
+
+def _done(healthy: str = "true", channel: str = CHANNEL) -> dict:
+    """Return the databag of a unit that refreshed to the channel."""
+    return {
+        "refresh-request": channel,
+        "refresh-done": channel,
+        "refresh-healthy": healthy,
+        "refresh-seconds": "4.2",
+    }
+
+
+@pytest.mark.parametrize(
+    "setting,units,expected",
+    [("1", 5, 1), ("3", 5, 3), ("25%", 8, 2), ("10%", 3, 1), ("100%", 4, 4)],
+)
+def test_batch_size(setting, units, expected):
+    """Test batch sizes given as a number of units or a percentage."""
+    assert batch_size(setting, units) == expected
+
+
+@pytest.mark.parametrize("setting", ["0", "0%", "101%", "two", "-1", ""])
+def test_invalid_refresh_batch(setting):
+    """Test refresh batch settings that are not a positive count or percentage."""
+    with pytest.raises(pydantic.ValidationError):
+        CharmConfig(refresh_batch=setting)
+
+
+def test_config_changed_requests_refresh(tmp_path, mock_refresh):
+    """Test a unit with peers waits for the lock instead of refreshing at once."""
+    microovn = MagicMock(spec=SnapManager)
+    microovn.snap_client.channel = MICROOVN_TRACK + "/edge"
+    exporter = MagicMock(spec=SnapManager)
+    exporter.snap_client.channel = OVN_EXPORTER_TRACK + "/edge"
+    resources = set()
+    for name in (
+        MICROOVN_SNAP_RESOURCE,
+        OVN_EXPORTER_SNAP_RESOURCE,
+        SNAPD_SNAP_RESOURCE,
+        BASE_SNAP_RESOURCE,
+        SNAP_ASSERTIONS_RESOURCE,
+    ):
+        (tmp_path / name).write_bytes(b"")
+        resources.add(testing.Resource(name=name, path=tmp_path / name))
+    peers = testing.PeerRelation(PEER_RELATION, peers_data={1: {}})
+
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch.object(MicroovnCharm, "microovn_snap_client", microovn),
+        patch.object(MicroovnCharm, "ovn_exporter_snap_client", exporter),
+    ):
+        state = ctx.run(
+            ctx.on.config_changed(),
+            testing.State(
+                config={"microovn_risk": "beta"}, relations=[peers], resources=resources
+            ),
+        )
+
+    microovn.install.assert_not_called()
+    mock_refresh.assert_not_called()
+    assert state.get_relation(peers.id).local_unit_data["refresh-request"] == CHANNEL
+    assert state.unit_status == ops.WaitingStatus(f"Waiting to refresh to {CHANNEL}")
+
+
+def test_leader_grants_first_batch(mock_refresh, mock_healthy):
+    """Test the leader grants the lock to as many requesting units as the batch size."""
+    peers = testing.PeerRelation(
+        PEER_RELATION,
+        peers_data={
+            1: {"refresh-request": CHANNEL},
+            2: {"refresh-request": CHANNEL},
+            3: {"refresh-request": CHANNEL},
+        },
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    state = ctx.run(
+        ctx.on.relation_changed(peers, remote_unit=1),
+        testing.State(leader=True, relations=[peers], config={"refresh_batch": "50%"}),
+    )
+
+    lock = json.loads(state.get_relation(peers.id).local_app_data["refresh-lock"])
+    assert lock["channel"] == CHANNEL
+    assert lock["units"] == ["microovn/1", "microovn/2"]
+    mock_refresh.assert_not_called()
+
+
+def test_unit_refreshes_when_granted(mock_refresh, mock_healthy):
+    """Test a unit holding the lock refreshes and reports its health."""
+    peers = testing.PeerRelation(
+        PEER_RELATION,
+        local_unit_data={"refresh-request": CHANNEL},
+        local_app_data=_lock("microovn/0"),
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    state = ctx.run(
+        ctx.on.relation_changed(peers, remote_unit=1), testing.State(relations=[peers])
+    )
+
+    mock_refresh.assert_called_once_with(CHANNEL)
+    data = state.get_relation(peers.id).local_unit_data
+    assert data["refresh-done"] == CHANNEL
+    assert data["refresh-healthy"] == "true"
+    assert "refresh-seconds" in data
+
+
+def test_unit_not_granted_waits(mock_refresh, mock_healthy):
+    """Test a unit without the lock does not refresh."""
+    peers = testing.PeerRelation(
+        PEER_RELATION,
+        local_unit_data={"refresh-request": CHANNEL},
+        local_app_data=_lock("microovn/1"),
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    ctx.run(ctx.on.relation_changed(peers, remote_unit=1), testing.State(relations=[peers]))
+
+    mock_refresh.assert_not_called()
+
+
+def test_unit_failed_refresh_is_unhealthy(mock_refresh, mock_healthy):
+    """Test a failed refresh is reported without marking the unit refreshed."""
+    mock_refresh.return_value = False
+    peers = testing.PeerRelation(
+        PEER_RELATION,
+        local_unit_data={"refresh-request": CHANNEL},
+        local_app_data=_lock("microovn/0"),
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    state = ctx.run(
+        ctx.on.relation_changed(peers, remote_unit=1), testing.State(relations=[peers])
+    )
+
+    data = state.get_relation(peers.id).local_unit_data
+    assert data["refresh-healthy"] == "false"
+    assert "refresh-done" not in data
+    mock_healthy.assert_not_called()
+
+
+def test_unit_health_gate_retried(mock_refresh, mock_healthy):
+    """Test an unhealthy refreshed unit reports when it becomes healthy."""
+    peers = testing.PeerRelation(
+        PEER_RELATION, local_unit_data=_done("false"), local_app_data=_lock("microovn/0")
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    state = ctx.run(ctx.on.update_status(), testing.State(relations=[peers]))
+
+    mock_refresh.assert_not_called()
+    assert state.get_relation(peers.id).local_unit_data["refresh-healthy"] == "true"
+
+
+def test_leader_advances_after_healthy_batch(mock_refresh, mock_healthy):
+    """Test the leader records the finished batch and grants the next one."""
+    peers = testing.PeerRelation(
+        PEER_RELATION,
+        local_app_data=_lock("microovn/1"),
+        peers_data={1: _done(), 2: {"refresh-request": CHANNEL}},
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    state = ctx.run(
+        ctx.on.relation_changed(peers, remote_unit=1),
+        testing.State(leader=True, relations=[peers]),
+    )
+
+    app_data = state.get_relation(peers.id).local_app_data
+    assert json.loads(app_data["refresh-lock"])["units"] == ["microovn/2"]
+    history = json.loads(app_data["refresh-history"])
+    assert len(history) == 1
+    assert history[0]["channel"] == CHANNEL
+    assert history[0]["units"] == {"microovn/1": 4.2}
+    assert history[0]["seconds"] > 0
+
+
+def test_leader_halts_on_unhealthy_batch(mock_refresh, mock_healthy):
+    """Test the next batch waits while a refreshed unit is unhealthy."""
+    lock = _lock("microovn/1")
+    peers = testing.PeerRelation(
+        PEER_RELATION,
+        local_app_data=lock,
+        peers_data={1: _done("false"), 2: {"refresh-request": CHANNEL}},
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    state = ctx.run(
+        ctx.on.relation_changed(peers, remote_unit=1),
+        testing.State(leader=True, relations=[peers]),
+    )
+
+    app_data = state.get_relation(peers.id).local_app_data
+    assert app_data["refresh-lock"] == lock["refresh-lock"]
+    assert "refresh-history" not in app_data
+
+
+def test_leader_refreshes_itself(mock_refresh, mock_healthy):
+    """Test the leader runs its own batch and releases the lock when all are done."""
+    peers = testing.PeerRelation(
+        PEER_RELATION, local_unit_data={"refresh-request": CHANNEL}, peers_data={1: _done()}
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    state = ctx.run(ctx.on.update_status(), testing.State(leader=True, relations=[peers]))
+
+    mock_refresh.assert_called_once_with(CHANNEL)
+    app_data = state.get_relation(peers.id).local_app_data
+    assert "refresh-lock" not in app_data
+    assert list(json.loads(app_data["refresh-history"])[0]["units"]) == ["microovn/0"]
+
+
+def test_refresh_status_action():
+    """Test the action reports the lock and the batch history."""
+    peers = testing.PeerRelation(
+        PEER_RELATION,
+        local_app_data={**_lock("microovn/1"), "refresh-history": "[]"},
+    )
+
+    ctx = testing.Context(MicroovnCharm)
+    ctx.run(ctx.on.action("refresh-status"), testing.State(relations=[peers]))
+
+    assert ctx.action_results == {
+        "lock": _lock("microovn/1")["refresh-lock"],
+        "history": "[]",
+    }
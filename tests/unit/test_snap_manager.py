@@ -3,7 +3,8 @@
 
 """Unit tests for the SnapManager class."""
 
-from unittest.mock import MagicMock, patch
+import json
+from unittest.mock import MagicMock, call, patch
 
 import pytest
 from charms.operator_libs_linux.v2 import snap
@@ -11,29 +12,53 @@ from charms.operator_libs_linux.v2 import snap
 from snap_manager import SnapManager
 
 
+@pytest.fixture(autouse=True)
+def reset_snap_cache():
+    """Start every test without a shared snap cache."""
+    SnapManager.reset_cache()
+    yield
+    SnapManager.reset_cache()
+
+
+@pytest.fixture(autouse=True)
+def snap_base_cache(tmp_path):
+    """Keep the resolved snap bases in a temporary file."""
+    cache_file = tmp_path / "snap-bases.json"
+    with patch("snap_manager.SNAP_BASE_CACHE_FILE", str(cache_file)):
+        yield cache_file
+
+
+@pytest.fixture(autouse=True)
+def mock_snapd_client():
+    """Mock the shared snapd REST client."""
+    with patch.object(SnapManager, "snapd_client") as mock_client:
+        mock_client.return_value.find.side_effect = snap.SnapAPIError({}, 404, "Not Found", "")
+        yield mock_client.return_value
+
+
 @pytest.fixture
 def mock_snap_cache():
-    """Mock the snap.SnapCache."""
-    with patch("snap_manager.snap.SnapCache") as mock_cache:
+    """Mock the LazySnapCache."""
+    with patch("snap_manager.LazySnapCache") as mock_cache:
         yield mock_cache
 
 
-@pytest.fixture
-def mock_snap_add():
-    """Mock the snap.add function."""
-    with patch("snap_manager.snap.add") as mock_add:
-        yield mock_add
+def test_install_success(mock_snap_cache, mock_snapd_client):
+    """Test successful snap installation."""
+    mock_snap = MagicMock()
+    mock_snap.present = False
+    mock_snap_cache.return_value.__getitem__.side_effect = [mock_snap, MagicMock(present=True)]
 
+    client = SnapManager("test-snap", "stable")
+    result = client.install()
 
-@pytest.fixture
-def mock_snap_remove():
-    """Mock the snap.remove function."""
-    with patch("snap_manager.snap.remove") as mock_remove:
-        yield mock_remove
+    mock_snapd_client.install.assert_called_once_with("test-snap", "stable")
+    mock_snapd_client.hold.assert_called_once_with(["test-snap"])
+    assert result is True
 
 
-def test_install_success(mock_snap_cache, mock_snap_add):
-    """Test successful snap installation."""
+def test_install_refreshes_present_snap(mock_snap_cache, mock_snapd_client):
+    """Test an installed snap is refreshed to the channel instead of installed."""
     mock_snap = MagicMock()
     mock_snap.present = True
     mock_snap_cache.return_value.__getitem__.return_value = mock_snap
@@ -41,11 +66,12 @@ def test_install_success(mock_snap_cache, mock_snap_add):
     client = SnapManager("test-snap", "stable")
     result = client.install()
 
-    mock_snap_add.assert_called_once_with("test-snap", channel="stable")
+    mock_snapd_client.refresh.assert_called_once_with("test-snap", "stable")
+    mock_snapd_client.install.assert_not_called()
     assert result is True
 
 
-def test_install_failure_snap_not_present(mock_snap_cache, mock_snap_add):
+def test_install_failure_snap_not_present(mock_snap_cache, mock_snapd_client):
     """Test snap installation failure when snap is not present after installation."""
     mock_snap = MagicMock()
     mock_snap.present = False
@@ -57,9 +83,9 @@ def test_install_failure_snap_not_present(mock_snap_cache, mock_snap_add):
     assert result is False
 
 
-def test_install_failure_snap_error(mock_snap_cache, mock_snap_add):
+def test_install_failure_snap_error(mock_snap_cache, mock_snapd_client):
     """Test snap installation failure with SnapError exception."""
-    mock_snap_add.side_effect = snap.SnapError("Installation failed")
+    mock_snapd_client.refresh.side_effect = snap.SnapError("Installation failed")
     mock_snap_cache.return_value.__getitem__.return_value = MagicMock()
 
     client = SnapManager("test-snap", "stable")
@@ -68,7 +94,7 @@ def test_install_failure_snap_error(mock_snap_cache, mock_snap_add):
     assert result is False
 
 
-def test_remove_success(mock_snap_cache, mock_snap_remove):
+def test_remove_success(mock_snap_cache, mock_snapd_client):
     """Test successful snap removal."""
     mock_snap = MagicMock()
     mock_snap.present = False
@@ -77,11 +103,11 @@ def test_remove_success(mock_snap_cache, mock_snap_remove):
     client = SnapManager("test-snap", "stable")
     result = client.remove()
 
-    mock_snap_remove.assert_called_once()
+    mock_snapd_client.remove.assert_called_once_with("test-snap")
     assert result is True
 
 
-def test_remove_failure_snap_still_present(mock_snap_cache, mock_snap_remove):
+def test_remove_failure_snap_still_present(mock_snap_cache, mock_snapd_client):
     """Test snap removal failure when snap is still present after removal."""
     mock_snap = MagicMock()
     mock_snap.present = True
@@ -93,9 +119,9 @@ def test_remove_failure_snap_still_present(mock_snap_cache, mock_snap_remove):
     assert result is False
 
 
-def test_remove_failure_snap_error(mock_snap_cache, mock_snap_remove):
+def test_remove_failure_snap_error(mock_snap_cache, mock_snapd_client):
     """Test snap removal failure with SnapError exception."""
-    mock_snap_remove.side_effect = snap.SnapError("Removal failed")
+    mock_snapd_client.remove.side_effect = snap.SnapError("Removal failed")
     mock_snap_cache.return_value.__getitem__.return_value = MagicMock()
 
     client = SnapManager("test-snap", "stable")
@@ -104,109 +130,392 @@ def test_remove_failure_snap_error(mock_snap_cache, mock_snap_remove):
     assert result is False
 
 
-def test_connect_success_single_plug(mock_snap_cache):
+def test_connect_success_single_plug(mock_snap_cache, mock_snapd_client):
     """Test successful connection of a single plug."""
-    mock_snap = MagicMock()
-    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+    mock_snapd_client.connect_many.return_value = {("network", None): None}
 
     client = SnapManager("test-snap", "stable")
     result = client.connect([("network", None)])
 
-    mock_snap.connect.assert_called_once_with("network", slot=None)
+    mock_snapd_client.connect_many.assert_called_once_with("test-snap", [("network", None)])
     assert result is True
 
 
-def test_connect_success_multiple_plugs(mock_snap_cache):
-    """Test successful connection of multiple plugs."""
-    mock_snap = MagicMock()
-    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+def test_connect_success_multiple_plugs(mock_snap_cache, mock_snapd_client):
+    """Test multiple plugs are connected in a single bulk request."""
+    connections = [
+        ("network", None),
+        ("home", None),
+        ("removable-media", "test-snap:removable-media"),
+    ]
+    mock_snapd_client.connect_many.return_value = dict.fromkeys(connections)
 
     client = SnapManager("test-snap", "stable")
-    result = client.connect(
-        [("network", None), ("home", None), ("removable-media", "test-snap:removable-media")]
-    )
+    result = client.connect(connections)
 
-    assert mock_snap.connect.call_count == 3
-    mock_snap.connect.assert_any_call("network", slot=None)
-    mock_snap.connect.assert_any_call("home", slot=None)
-    mock_snap.connect.assert_any_call("removable-media", slot="test-snap:removable-media")
+    mock_snapd_client.connect_many.assert_called_once_with("test-snap", connections)
     assert result is True
 
 
-def test_connect_failure_first_plug(mock_snap_cache):
-    """Test plug connection failure on the first plug."""
-    mock_snap = MagicMock()
-    mock_snap.connect.side_effect = snap.SnapError("Connection failed")
-    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+def test_connect_retries_only_failed(mock_snap_cache, mock_snapd_client):
+    """Test only the connections that failed are submitted again."""
+    mock_snapd_client.connect_many.side_effect = [
+        {("network", None): None, ("home", None): "conflict"},
+        {("home", None): None},
+    ]
 
     client = SnapManager("test-snap", "stable")
-    result = client.connect([("network", None), ("home", None)])
+    results = client.connect_all([("network", None), ("home", None)])
 
-    mock_snap.connect.assert_called_with("network", slot=None)
-    assert result is False
+    assert results == {("network", None): None, ("home", None): None}
+    assert mock_snapd_client.connect_many.call_args_list == [
+        call("test-snap", [("network", None), ("home", None)]),
+        call("test-snap", [("home", None)]),
+    ]
 
 
-def test_connect_failure_second_plug(mock_snap_cache):
-    """Test plug connection failure on the second plug."""
-    mock_snap = MagicMock()
+def test_connect_failure_second_plug(mock_snap_cache, mock_snapd_client):
+    """Test a plug that keeps failing is retried alone and reported."""
 
-    def connect_side_effect(plug, slot=None):
-        if plug == "home":
-            raise snap.SnapError("Connection failed")
+    def connect_many(snap_name, connections):
+        return {c: "Connection failed" if c[0] == "home" else None for c in connections}
 
-    mock_snap.connect.side_effect = connect_side_effect
-    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+    mock_snapd_client.connect_many.side_effect = connect_many
 
     client = SnapManager("test-snap", "stable")
-    result = client.connect([("network", None), ("home", None)])
+    results = client.connect_all([("network", None), ("home", None)])
 
-    assert mock_snap.connect.call_count == 6
-    assert result is False
+    assert mock_snapd_client.connect_many.call_count == 3
+    mock_snapd_client.connect_many.assert_called_with("test-snap", [("home", None)])
+    assert results == {("network", None): None, ("home", None): "Connection failed"}
+    assert client.connect([("home", None)]) is False
 
 
-def test_enable_and_start(mock_snap_cache):
-    """Test enabling and starting snap services."""
-    mock_snap = MagicMock()
-    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+def test_connect_failure_snapd_error(mock_snap_cache, mock_snapd_client):
+    """Test a snapd error while polling fails every pending connection."""
+    mock_snapd_client.connect_many.side_effect = snap.SnapAPIError({}, 500, "Error", "boom")
+
+    client = SnapManager("test-snap", "stable")
+
+    assert client.connect([("network", None), ("home", None)]) is False
+    assert mock_snapd_client.connect_many.call_count == 3
 
+
+def test_enable_and_start(mock_snap_cache, mock_snapd_client):
+    """Test enabling and starting snap services."""
     client = SnapManager("test-snap", "stable")
     client.enable_and_start()
 
-    mock_snap.start.assert_called_once_with(enable=True)
+    mock_snapd_client.start.assert_called_once_with(["test-snap"], enable=True)
 
 
-def test_enable_and_start_failure(mock_snap_cache):
+def test_enable_and_start_failure(mock_snap_cache, mock_snapd_client):
     """Test enabling and starting snap services failure."""
-    mock_snap = MagicMock()
-    mock_snap.start.side_effect = snap.SnapError("Start failed")
-    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+    mock_snapd_client.start.side_effect = snap.SnapError("Start failed")
 
     client = SnapManager("test-snap", "stable")
     result = client.enable_and_start()
 
-    mock_snap.start.assert_called_once_with(enable=True)
+    mock_snapd_client.start.assert_called_once_with(["test-snap"], enable=True)
     assert result is False
 
 
-def test_disable_and_stop(mock_snap_cache):
+def test_disable_and_stop(mock_snap_cache, mock_snapd_client):
     """Test disabling and stopping snap services."""
+    client = SnapManager("test-snap", "stable")
+    client.disable_and_stop()
+
+    mock_snapd_client.stop.assert_called_once_with(["test-snap"], disable=True)
+
+
+def test_disable_and_stop_failure(mock_snap_cache, mock_snapd_client):
+    """Test disabling and stopping snap services failure."""
+    mock_snapd_client.stop.side_effect = snap.SnapError("Stop failed")
+
+    client = SnapManager("test-snap", "stable")
+    result = client.disable_and_stop()
+
+    mock_snapd_client.stop.assert_called_once_with(["test-snap"], disable=True)
+    assert result is False
+
+
+def test_snap_client_reuses_cache(mock_snap_cache):
+    """Test the snap cache is shared between accesses and managers."""
+    microovn = SnapManager("microovn", "stable")
+    exporter = SnapManager("ovn-exporter", "stable")
+
+    microovn.snap_client.channel
+    microovn.snap_client.present
+    exporter.snap_client.channel
+
+    mock_snap_cache.assert_called_once()
+    assert SnapManager.cache_stats["misses"] == 1
+    assert SnapManager.cache_stats["hits"] == 2
+
+
+def test_snap_client_cache_not_invalidated_by_services(mock_snap_cache):
+    """Test starting and stopping services keeps the snap cache."""
+    client = SnapManager("test-snap", "stable")
+    client.snap_client.channel
+    client.enable_and_start()
+    client.disable_and_stop()
+    client.snap_client.channel
+
+    mock_snap_cache.assert_called_once()
+    assert SnapManager.cache_stats["invalidations"] == 0
+
+
+def test_install_invalidates_cache(mock_snap_cache, mock_snapd_client):
+    """Test install drops the snap cache after installing and holding."""
     mock_snap = MagicMock()
+    mock_snap.present = True
     mock_snap_cache.return_value.__getitem__.return_value = mock_snap
 
     client = SnapManager("test-snap", "stable")
-    client.disable_and_stop()
+    client.install()
+    client.snap_client.channel
 
-    mock_snap.stop.assert_called_once_with(disable=True)
+    mock_snapd_client.hold.assert_called_once()
+    assert SnapManager.cache_stats["invalidations"] == 2
+    assert mock_snap_cache.call_count == 2
 
 
-def test_disable_and_stop_failure(mock_snap_cache):
-    """Test disabling and stopping snap services failure."""
+def test_remove_invalidates_cache(mock_snap_cache):
+    """Test remove reloads the snap cache before checking presence."""
     mock_snap = MagicMock()
-    mock_snap.stop.side_effect = snap.SnapError("Stop failed")
+    mock_snap.present = False
     mock_snap_cache.return_value.__getitem__.return_value = mock_snap
 
     client = SnapManager("test-snap", "stable")
-    result = client.disable_and_stop()
+    client.snap_client.channel
+    client.remove()
 
-    mock_snap.stop.assert_called_once_with(disable=True)
-    assert result is False
+    assert mock_snap_cache.call_count == 2
+
+
+def test_connect_invalidates_cache_once(mock_snap_cache, mock_snapd_client):
+    """Test connecting several plugs drops the snap cache a single time."""
+    mock_snapd_client.connect_many.return_value = {("network", None): None, ("home", None): None}
+
+    client = SnapManager("test-snap", "stable")
+    client.connect([("network", None), ("home", None)])
+
+    mock_snap_cache.assert_not_called()
+    assert SnapManager.cache_stats["invalidations"] == 1
+
+
+def test_reset_cache_clears_stats(mock_snap_cache):
+    """Test resetting the cache also resets its counters."""
+    SnapManager("test-snap", "stable").snap_client.channel
+    SnapManager.reset_cache()
+
+    assert not SnapManager.cache_stats
+    SnapManager("test-snap", "stable").snap_client.channel
+    assert mock_snap_cache.call_count == 2
+
+
+def test_install_many_success(mock_snap_cache, mock_snapd_client):
+    """Test snaps are submitted together and held in one change."""
+    mock_snap = MagicMock()
+    mock_snap.present = False
+    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+    mock_snapd_client.install_async.side_effect = ["1", "2"]
+    mock_snapd_client.wait_changes.return_value = {"first": None, "second": None}
+
+    managers = [SnapManager("first", "edge"), SnapManager("second", "stable")]
+    failed = SnapManager.install_many(managers)
+
+    assert failed == []
+    mock_snapd_client.install_async.assert_any_call("first", "edge")
+    mock_snapd_client.install_async.assert_any_call("second", "stable")
+    mock_snapd_client.wait_changes.assert_called_once_with({"first": "1", "second": "2"})
+    mock_snapd_client.hold.assert_called_once_with(["first", "second"])
+
+
+def test_install_many_refreshes_present_snaps(mock_snap_cache, mock_snapd_client):
+    """Test installed snaps are refreshed instead of installed."""
+    mock_snap = MagicMock()
+    mock_snap.present = True
+    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+    mock_snapd_client.refresh_async.return_value = None
+    mock_snapd_client.wait_changes.return_value = {}
+
+    assert SnapManager.install_many([SnapManager("first", "edge")]) == []
+    mock_snapd_client.refresh_async.assert_called_once_with("first", "edge")
+    mock_snapd_client.install_async.assert_not_called()
+
+
+def test_install_many_falls_back_per_snap(mock_snap_cache, mock_snapd_client):
+    """Test only the failed snap is installed again on its own."""
+    mock_snap = MagicMock()
+    mock_snap.present = False
+    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+    mock_snapd_client.install_async.side_effect = ["1", "2"]
+    mock_snapd_client.wait_changes.return_value = {"first": None, "second": "boom"}
+
+    first = SnapManager("first", "edge")
+    second = SnapManager("second", "stable")
+    with (
+        patch.object(first, "install") as first_install,
+        patch.object(second, "install", return_value=False) as second_install,
+    ):
+        failed = SnapManager.install_many([first, second])
+
+    first_install.assert_not_called()
+    second_install.assert_called_once()
+    mock_snapd_client.hold.assert_called_once_with(["first"])
+    assert failed == [second]
+
+
+def test_install_many_submit_error_falls_back(mock_snap_cache, mock_snapd_client):
+    """Test a snap snapd refuses to start installing falls back."""
+    mock_snap = MagicMock()
+    mock_snap.present = False
+    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+    mock_snapd_client.install_async.side_effect = snap.SnapAPIError({}, 500, "Error", "")
+    mock_snapd_client.wait_changes.return_value = {}
+
+    manager = SnapManager("first", "edge")
+    with patch.object(manager, "install", return_value=True) as mock_install:
+        assert SnapManager.install_many([manager]) == []
+
+    mock_install.assert_called_once()
+    mock_snapd_client.hold.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "local_path, failing, error",
+    [
+        (None, "install", TimeoutError("change 7 not done after 600s")),
+        ("/tmp/first.snap", "sideload_async", FileNotFoundError("/tmp/first.snap")),
+        ("/tmp/first.snap", "sideload_async", ValueError("bad snapd response")),
+    ],
+)
+def test_install_many_start_error_falls_back(
+    mock_snap_cache, mock_snapd_client, snap_base_cache, local_path, failing, error
+):
+    """Test a snap whose install cannot be started falls back, the others still installing."""
+    # The first snap's base is installed ahead of it, and that is what times out.
+    snap_base_cache.write_text(json.dumps({"first@edge": "core26"}))
+    mock_snapd_client.find.side_effect = None
+    mock_snapd_client.find.return_value = {"channels": {"latest/edge": {}}}
+    mock_snap_cache.return_value.__getitem__.return_value = MagicMock(present=False)
+    mock_snap_cache.return_value.__contains__.return_value = False
+    getattr(mock_snapd_client, failing).side_effect = error
+    mock_snapd_client.install_async.return_value = "2"
+    mock_snapd_client.wait_changes.return_value = {"second": None}
+
+    first = SnapManager("first", "edge")
+    if local_path is not None:
+        first.use_local_snap(local_path)
+    with patch.object(first, "install", return_value=False) as first_install:
+        failed = SnapManager.install_many([first, SnapManager("second", "edge")])
+
+    assert failed == [first]
+    first_install.assert_called_once()
+    mock_snapd_client.wait_changes.assert_called_once_with({"second": "2"})
+    mock_snapd_client.hold.assert_called_once_with(["second"])
+
+
+def test_required_base_unknown_without_cache(mock_snapd_client):
+    """Test the base of a channel no install learnt is unknown, without asking snapd."""
+    assert SnapManager("test-snap", "latest/edge").required_base() is None
+    mock_snapd_client.find.assert_not_called()
+
+
+def test_required_base_from_cache(mock_snapd_client, snap_base_cache):
+    """Test a cached resolution does not query snapd."""
+    snap_base_cache.write_text(json.dumps({"test-snap@latest/edge": "core26"}))
+
+    assert SnapManager("test-snap", "latest/edge").required_base() == "core26"
+    mock_snapd_client.find.assert_not_called()
+
+
+def test_install_preinstalls_unreleased_base(mock_snap_cache, mock_snapd_client, snap_base_cache):
+    """Test a cached base without a stable release is installed before the snap."""
+    snap_base_cache.write_text(json.dumps({"test-snap@latest/edge": "core26"}))
+    mock_snapd_client.find.side_effect = None
+    mock_snapd_client.find.return_value = {"channels": {"latest/edge": {}}}
+    snaps = {"core26": MagicMock(present=False), "test-snap": MagicMock(present=True)}
+    mock_snap_cache.return_value.__getitem__.side_effect = snaps.__getitem__
+    mock_snap_cache.return_value.__contains__.return_value = True
+
+    SnapManager("test-snap", "latest/edge").install()
+
+    mock_snapd_client.install.assert_called_once_with("core26", "latest/edge")
+    mock_snapd_client.refresh.assert_called_once_with("test-snap", "latest/edge")
+
+
+def test_install_leaves_stable_base_to_snapd(mock_snap_cache, mock_snapd_client, snap_base_cache):
+    """Test a base released to stable is left for snapd to install."""
+    snap_base_cache.write_text(json.dumps({"test-snap@latest/edge": "core24"}))
+    mock_snapd_client.find.side_effect = None
+    mock_snapd_client.find.return_value = {"channels": {"latest/stable": {}}}
+    mock_snap_cache.return_value.__getitem__.return_value = MagicMock(present=True)
+    mock_snap_cache.return_value.__contains__.return_value = False
+
+    SnapManager("test-snap", "latest/edge").install()
+
+    mock_snapd_client.install.assert_not_called()
+    mock_snapd_client.refresh.assert_called_once_with("test-snap", "latest/edge")
+
+
+def test_install_base_error_is_remembered(mock_snap_cache, mock_snapd_client, snap_base_cache):
+    """Test a base reported by snapd is installed and cached for the channel."""
+    mock_snapd_client.refresh.side_effect = snap.SnapError('cannot install snap base "core26"')
+    mock_snap = MagicMock()
+    mock_snap.present = True
+    mock_snap_cache.return_value.__getitem__.return_value = mock_snap
+
+    assert SnapManager("test-snap", "latest/edge").install() is True
+    assert mock_snapd_client.install.call_args_list == [
+        call("core26", "latest/edge"),
+        call("test-snap", "latest/edge"),
+    ]
+    assert json.loads(snap_base_cache.read_text()) == {"test-snap@latest/edge": "core26"}
+
+
+def test_install_from_local_snap(mock_snap_cache, mock_snapd_client):
+    """Test a snap with a local file is sideloaded and held instead of installed."""
+    mock_snap_cache.return_value.__getitem__.return_value = MagicMock(present=True)
+
+    client = SnapManager("test-snap", "latest/edge")
+    client.use_local_snap("/tmp/test-snap.snap", dangerous=True)
+
+    assert client.install() is True
+    mock_snapd_client.sideload.assert_called_once_with("/tmp/test-snap.snap", True)
+    mock_snapd_client.install.assert_not_called()
+    mock_snapd_client.refresh.assert_not_called()
+    mock_snapd_client.hold.assert_called_once_with(["test-snap"])
+
+
+def test_install_many_sideloads_local_snap(mock_snap_cache, mock_snapd_client):
+    """Test a snap with a local file is sideloaded alongside the store installs."""
+    mock_snap_cache.return_value.__getitem__.return_value = MagicMock(present=False)
+    mock_snapd_client.sideload_async.return_value = "1"
+    mock_snapd_client.install_async.return_value = "2"
+    mock_snapd_client.wait_changes.return_value = {"first": None, "second": None}
+
+    first = SnapManager("first", "edge")
+    first.use_local_snap("/tmp/first.snap")
+    assert SnapManager.install_many([first, SnapManager("second", "edge")]) == []
+
+    mock_snapd_client.sideload_async.assert_called_once_with("/tmp/first.snap", False)
+    mock_snapd_client.install_async.assert_called_once_with("second", "edge")
+
+
+def test_install_local_failure(mock_snapd_client):
+    """Test a local snap snapd fails to install is reported."""
+    mock_snapd_client.sideload.side_effect = snap.SnapError("bad snap")
+
+    assert SnapManager.install_local("/tmp/core24.snap") is False
+
+
+def test_ack_assertions(mock_snapd_client, tmp_path):
+    """Test the assertions file is acknowledged as a whole."""
+    assertions = tmp_path / "snaps.assert"
+    assertions.write_bytes(b"type: account-key\n\ntype: snap-declaration\n")
+
+    assert SnapManager.ack_assertions(str(assertions)) is True
+    mock_snapd_client.ack.assert_called_once_with(assertions.read_bytes())
+    assert SnapManager.ack_assertions(str(tmp_path / "missing")) is False
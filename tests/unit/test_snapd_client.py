@@ -0,0 +1,632 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for the SnapdClient class."""
+
+import email
+import email.policy
+import http.server
+import io
+import json
+import socket
+import socketserver
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from charms.operator_libs_linux.v2 import snap
+
+from snapd_client import ChangeProgress, LazySnapCache, SnapCatalog, SnapdClient
+
+
+def _response(payload: dict) -> io.BytesIO:
+    """Build a raw snapd response body."""
+    return io.BytesIO(json.dumps(payload).encode())
+
+
+@pytest.fixture
+def client():
+    """Return a SnapdClient that never talks to snapd."""
+    with patch("time.sleep"):
+        yield SnapdClient(opener=MagicMock())
+
+
+def test_install_async_returns_change_id(client):
+    """Test starting an install returns the snapd change id."""
+    with patch.object(client, "_request_raw") as mock_raw:
+        mock_raw.return_value = _response({"type": "async", "change": "42"})
+        change_id = client.install_async("microovn", "latest/edge")
+
+    method, path, _, _, data = mock_raw.call_args[0]
+    assert (method, path) == ("POST", "snaps/microovn")
+    assert json.loads(data) == {"action": "install", "channel": "latest/edge"}
+    assert change_id == "42"
+
+
+def test_refresh_async_no_update(client):
+    """Test refreshing an up to date snap starts no change."""
+    error = snap.SnapAPIError({"kind": "snap-no-update-available"}, 400, "Bad Request", "")
+    with patch.object(client, "_request_raw", side_effect=error):
+        assert client.refresh_async("microovn", "latest/edge") is None
+
+
+def test_refresh_async_error(client):
+    """Test other snapd errors are raised."""
+    error = snap.SnapAPIError({"kind": "snap-not-found"}, 404, "Not Found", "")
+    with patch.object(client, "_request_raw", side_effect=error):
+        with pytest.raises(snap.SnapAPIError):
+            client.refresh_async("microovn", "latest/edge")
+
+
+def test_hold_sends_all_snaps(client):
+    """Test holding several snaps is a single request."""
+    with patch.object(client, "_request") as mock_request:
+        client.hold(["microovn", "ovn-exporter"])
+
+    mock_request.assert_called_once_with(
+        "POST",
+        "snaps",
+        body={
+            "action": "hold",
+            "snaps": ["microovn", "ovn-exporter"],
+            "time": "forever",
+            "hold-level": "general",
+        },
+    )
+
+
+def test_install_waits_for_change(client):
+    """Test a synchronous install waits on the change it started."""
+    with (
+        patch.object(client, "_submit", return_value="7") as mock_submit,
+        patch.object(client, "_wait") as mock_wait,
+    ):
+        client.install("core26", "latest/edge")
+
+    mock_submit.assert_called_once_with(
+        "POST", "snaps/core26", {"action": "install", "channel": "latest/edge"}
+    )
+    mock_wait.assert_called_once_with("7")
+
+
+def test_remove_not_installed(client):
+    """Test removing a snap that is not installed is not an error."""
+    error = snap.SnapAPIError({"kind": "snap-not-installed"}, 400, "Bad Request", "")
+    with (
+        patch.object(client, "_request_raw", side_effect=error),
+        patch.object(client, "_wait") as mock_wait,
+    ):
+        client.remove("microovn")
+
+    mock_wait.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "method,kwargs,body",
+    [
+        ("start", {"enable": True}, {"action": "start", "names": ["microovn"], "enable": True}),
+        ("stop", {"disable": True}, {"action": "stop", "names": ["microovn"], "disable": True}),
+    ],
+)
+def test_services(client, method, kwargs, body):
+    """Test services are started and stopped through the apps endpoint."""
+    with (
+        patch.object(client, "_submit", return_value="3") as mock_submit,
+        patch.object(client, "_wait"),
+    ):
+        getattr(client, method)(["microovn"], **kwargs)
+
+    mock_submit.assert_called_once_with("POST", "apps", body)
+
+
+@pytest.mark.parametrize(
+    "slot,expected",
+    [
+        ("microovn:ovn-chassis", {"snap": "microovn", "slot": "ovn-chassis"}),
+        ("openvswitch", {"snap": "openvswitch", "slot": ""}),
+        (None, {"snap": "", "slot": ""}),
+    ],
+)
+def test_connect(client, slot, expected):
+    """Test connecting a plug names the slot snap and slot separately."""
+    with (
+        patch.object(client, "_submit", return_value="5") as mock_submit,
+        patch.object(client, "_wait"),
+    ):
+        client.connect("ovn-exporter", "ovn-chassis", slot=slot)
+
+    mock_submit.assert_called_once_with(
+        "POST",
+        "interfaces",
+        {
+            "action": "connect",
+            "plugs": [{"snap": "ovn-exporter", "plug": "ovn-chassis"}],
+            "slots": [expected],
+        },
+    )
+
+
+_CONNECTIONS = {
+    "established": [
+        {
+            "plug": {"snap": "ovn-exporter", "plug": "ovn-chassis"},
+            "slot": {"snap": "microovn", "slot": "ovn-chassis"},
+        },
+        {
+            "plug": {"snap": "other", "plug": "ovn-central-data"},
+            "slot": {"snap": "microovn", "slot": "ovn-central-data"},
+        },
+    ]
+}
+
+
+def test_connections(client):
+    """Test the established connections are keyed by the snap's own plugs."""
+    with patch.object(client, "_request", return_value=_CONNECTIONS) as mock_request:
+        established = client.connections("ovn-exporter")
+
+    mock_request.assert_called_once_with("GET", "connections", {"snap": "ovn-exporter"})
+    assert established == {"ovn-chassis": ["microovn:ovn-chassis"]}
+
+
+def test_connect_many_skips_established(client):
+    """Test only missing connections are submitted, each once the previous one is done."""
+    connections = [
+        ("ovn-chassis", "microovn:ovn-chassis"),
+        ("ovn-central-data", "microovn:ovn-central-data"),
+        ("network", None),
+        ("home", None),
+    ]
+    calls = []
+    with (
+        patch.object(client, "_request", return_value=_CONNECTIONS),
+        patch.object(
+            client,
+            "connect_async",
+            side_effect=lambda *args: calls.append(("connect", args[1])) or args[1],
+        ),
+        patch.object(
+            client,
+            "wait_changes",
+            side_effect=lambda changes: (
+                calls.append(("wait", *changes.values())) or dict.fromkeys(changes)
+            ),
+        ),
+    ):
+        results = client.connect_many("ovn-exporter", connections)
+
+    assert calls == [
+        ("connect", "ovn-central-data"),
+        ("wait", "ovn-central-data"),
+        ("connect", "network"),
+        ("wait", "network"),
+        ("connect", "home"),
+        ("wait", "home"),
+    ]
+    assert results == dict.fromkeys(connections)
+
+
+def test_connect_many_reports_each_failure(client):
+    """Test a refused and a failed connection are reported on their own."""
+    connections = [("ovn-chassis", "microovn"), ("ovn-central-data", "microovn")]
+    error = snap.SnapAPIError({}, 409, "Conflict", "conflict")
+    with (
+        patch.object(client, "connections", side_effect=snap.SnapAPIError({}, 500, "", "")),
+        patch.object(client, "connect_async", side_effect=[error, "2"]),
+        patch.object(client, "wait_changes", return_value={connections[1]: "boom"}) as mock_wait,
+    ):
+        results = client.connect_many("ovn-exporter", connections)
+
+    mock_wait.assert_called_once_with({connections[1]: "2"})
+    assert results == {connections[0]: str(error), connections[1]: "boom"}
+
+
+def test_wait_changes_mixed_results(client):
+    """Test waiting on several changes reports each result."""
+    statuses = {
+        "1": iter([{"status": "Doing"}, {"status": "Done"}]),
+        "2": iter([{"status": "Error", "kind": "install-snap", "err": "boom"}]),
+    }
+
+    def request(method, path):
+        return next(statuses[path.split("/")[1]])
+
+    with patch.object(client, "_request", side_effect=request):
+        results = client.wait_changes({"microovn": "1", "ovn-exporter": "2"})
+
+    assert results == {"microovn": None, "ovn-exporter": "boom"}
+
+
+def test_wait_changes_timeout(client):
+    """Test changes still running at the deadline are reported as failed."""
+    with patch.object(client, "_request", return_value={"status": "Doing"}):
+        results = client.wait_changes({"microovn": "1"}, timeout=-1)
+
+    assert results == {"microovn": "timeout waiting for snap change 1"}
+
+
+class _SnapdHandler(http.server.BaseHTTPRequestHandler):
+    """Answer every request like snapd would for a sync request."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # noqa: N802
+        if self.path.startswith("/v2/missing"):
+            code, payload = 404, {"type": "error", "result": {"kind": "snap-not-found"}}
+        else:
+            code, payload = 200, {"type": "sync", "result": {"path": self.path}}
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.server.close_after_response:
+            self.close_connection = True
+
+    def do_POST(self):  # noqa: N802
+        length = int(self.headers["Content-Length"])
+        self.server.posted.append(
+            (self.path, self.headers["Content-Type"], self.rfile.read(length))
+        )
+        body = json.dumps({"type": "async", "change": "9"}).encode()
+        self.send_response(202)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _SnapdServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A fake snapd listening on a unix socket that counts its connections."""
+
+    daemon_threads = True
+    close_after_response = False
+    connections = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.posted = []
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+
+@pytest.fixture
+def snapd_server(tmp_path):
+    """Run a fake snapd on a temporary unix socket."""
+    socket_path = str(tmp_path / "snapd.socket")
+    server = _SnapdServer(socket_path, _SnapdHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    SnapdClient.reset_stats()
+    yield server, socket_path
+    server.shutdown()
+    server.server_close()
+    SnapdClient._pools.pop(socket_path).close()
+
+
+def test_requests_reuse_connection(snapd_server):
+    """Test consecutive requests share one keep-alive connection."""
+    server, socket_path = snapd_server
+    client = SnapdClient(socket_path=socket_path)
+
+    assert client._request("GET", "changes/1") == {"path": "/v2/changes/1"}
+    assert client._request("GET", "changes/1", {"select": "all"}) == {
+        "path": "/v2/changes/1?select=all"
+    }
+    SnapdClient(socket_path=socket_path)._request("GET", "snaps")
+
+    assert server.connections == 1
+    assert SnapdClient.stats["GET changes"].count == 2
+    assert SnapdClient.stats["GET snaps"].count == 1
+
+
+def test_request_reconnects_after_close(snapd_server):
+    """Test a connection closed by snapd is replaced by a new one."""
+    server, socket_path = snapd_server
+    server.close_after_response = True
+    client = SnapdClient(socket_path=socket_path)
+
+    client._request("GET", "snaps")
+    client._request("GET", "snaps")
+
+    assert server.connections == 2
+
+
+def test_request_reconnects_stale_connection(snapd_server):
+    """Test a pooled connection that went stale is retried on a fresh one."""
+    server, socket_path = snapd_server
+    client = SnapdClient(socket_path=socket_path)
+    client._request("GET", "snaps")
+    client._pool._idle[0].sock.shutdown(socket.SHUT_RDWR)
+
+    assert client._request("GET", "snaps") == {"path": "/v2/snaps"}
+    assert server.connections == 2
+
+
+def test_request_timeout_not_sent_again(snapd_server):
+    """Test a request that timed out over a pooled connection is not sent again."""
+    _, socket_path = snapd_server
+    client = SnapdClient(socket_path=socket_path)
+    client._request("GET", "snaps")
+    connection = client._pool._idle[0]
+
+    with (
+        patch.object(connection, "getresponse", side_effect=TimeoutError("timed out")),
+        patch.object(client._pool, "acquire", wraps=client._pool.acquire) as mock_acquire,
+        pytest.raises(snap.SnapAPIError, match="timed out"),
+    ):
+        client._request("POST", "snaps", body={"action": "hold"})
+
+    mock_acquire.assert_called_once()
+
+
+def test_request_error_status(snapd_server):
+    """Test snapd error responses are raised as SnapAPIError."""
+    _, socket_path = snapd_server
+    client = SnapdClient(socket_path=socket_path)
+
+    with pytest.raises(snap.SnapAPIError) as err:
+        client._request("GET", "missing")
+
+    assert err.value.code == 404
+    assert err.value.body == {"kind": "snap-not-found"}
+
+
+@pytest.mark.parametrize("dangerous", [True, False])
+def test_sideload_streams_multipart(snapd_server, tmp_path, dangerous):
+    """Test a local snap file is sent as the file part of a multipart form."""
+    server, socket_path = snapd_server
+    snap_file = tmp_path / "microovn.snap"
+    snap_file.write_bytes(b"\x00snap contents\xff" * 1000)
+    client = SnapdClient(socket_path=socket_path)
+
+    assert client.sideload_async(str(snap_file), dangerous=dangerous) == "9"
+
+    path, content_type, body = server.posted[0]
+    message = email.message_from_bytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body, policy=email.policy.HTTP
+    )
+    parts = {
+        part.get_param("name", header="content-disposition"): part for part in message.iter_parts()
+    }
+    assert path == "/v2/snaps"
+    assert parts["snap"].get_filename() == "microovn.snap"
+    assert parts["snap"].get_payload(decode=True) == snap_file.read_bytes()
+    assert parts["action"].get_payload() == "install"
+    assert ("dangerous" in parts) is dangerous
+
+
+def test_ack_posts_assertions(snapd_server):
+    """Test assertions are posted as is to the assertions endpoint."""
+    server, socket_path = snapd_server
+    SnapdClient(socket_path=socket_path).ack(b"type: snap-declaration\n")
+
+    assert server.posted == [
+        ("/v2/assertions", "application/x.ubuntu.assertion", b"type: snap-declaration\n")
+    ]
+
+
+def test_request_no_socket(tmp_path):
+    """Test an unreachable snapd socket is raised as SnapAPIError."""
+    client = SnapdClient(socket_path=str(tmp_path / "missing.socket"))
+
+    with pytest.raises(snap.SnapAPIError):
+        client._request("GET", "snaps")
+
+
+def _doing(done: int, total: int) -> dict:
+    """Build a running change with a download in progress."""
+    return {
+        "kind": "install-snap",
+        "status": "Doing",
+        "tasks": [
+            {"status": "Done", "summary": "Ensure prerequisites"},
+            {
+                "status": "Doing",
+                "summary": 'Download snap "microovn"',
+                "progress": {"done": done, "total": total},
+            },
+        ],
+    }
+
+
+def test_wait_changes_backs_off_then_tightens():
+    """Test polling slows down while a change runs and speeds up near the end."""
+    client = SnapdClient(opener=MagicMock())
+    changes = iter(
+        [_doing(0, 100)] * 10
+        + [_doing(95, 100), {"kind": "install-snap", "status": "Done", "data": "ok"}]
+    )
+    with (
+        patch.object(client, "_request", side_effect=lambda *_: next(changes)),
+        patch("time.sleep") as mock_sleep,
+    ):
+        results = client.wait_changes({"microovn": "1"})
+
+    intervals = [c.args[0] for c in mock_sleep.call_args_list]
+    assert results == {"microovn": None}
+    assert intervals[0] == pytest.approx(0.15)
+    assert max(intervals) == 2.0
+    assert intervals[-1] == 0.1
+    assert intervals == sorted(intervals[:-1]) + [0.1]
+
+
+def test_wait_changes_reports_progress():
+    """Test the progress of the running task is passed to the callback."""
+    client = SnapdClient(opener=MagicMock())
+    client.progress_callback = MagicMock()
+    changes = iter([_doing(10, 100), {"kind": "install-snap", "status": "Done"}])
+    with (
+        patch.object(client, "_request", side_effect=lambda *_: next(changes)),
+        patch("time.sleep"),
+    ):
+        client.wait_changes({"microovn": "1"})
+
+    client.progress_callback.assert_called_once_with(
+        ChangeProgress("install-snap", 'Download snap "microovn"', 10, 100)
+    )
+
+
+def test_wait_changes_reports_slowest_progress_once_per_poll():
+    """Test concurrent changes report only the slowest of them on every poll."""
+    client = SnapdClient(opener=MagicMock())
+    client.progress_callback = MagicMock()
+    exporter = {**_doing(80, 100), "kind": "refresh-snap"}
+    statuses = {
+        "1": iter([_doing(10, 100), _doing(50, 100), {"status": "Done"}]),
+        "2": iter([exporter, {"status": "Done"}]),
+    }
+    with (
+        patch.object(client, "_request", side_effect=lambda _, path: next(statuses[path[8:]])),
+        patch("time.sleep"),
+    ):
+        client.wait_changes({"microovn": "1", "ovn-exporter": "2"})
+
+    assert [c.args[0].done for c in client.progress_callback.call_args_list] == [10, 50]
+
+
+def test_wait_records_change_kind_duration():
+    """Test the time spent on a change is recorded against its kind."""
+    SnapdClient.reset_stats()
+    client = SnapdClient(opener=MagicMock())
+    with patch.object(client, "_request", return_value={"kind": "refresh-snap", "status": "Done"}):
+        client._wait("1")
+
+    assert SnapdClient.change_stats["refresh-snap"].count == 1
+
+
+def test_wait_returns_data():
+    """Test waiting on a single change returns its data."""
+    client = SnapdClient(opener=MagicMock())
+    with patch.object(client, "_request", return_value={"status": "Done", "data": {"a": 1}}):
+        assert client._wait("1") == {"a": 1}
+
+
+def test_wait_raises_on_error():
+    """Test a failed change raises SnapError."""
+    client = SnapdClient(opener=MagicMock())
+    with patch.object(client, "_request", return_value={"status": "Error", "err": "boom"}):
+        with pytest.raises(snap.SnapError, match="boom"):
+            client._wait("1")
+
+
+def test_wait_raises_on_timeout():
+    """Test a change outliving the timeout raises TimeoutError."""
+    client = SnapdClient(opener=MagicMock())
+    with (
+        patch.object(client, "_request", return_value={"status": "Doing"}),
+        patch("time.sleep"),
+    ):
+        with pytest.raises(TimeoutError):
+            client._wait("1", timeout=-1)
+
+
+def test_wait_raises_snapd_timeout_error_as_snap_error():
+    """Test a change snapd failed on a timeout of its own is a SnapError, not a wait timeout."""
+    client = SnapdClient(opener=MagicMock())
+    failed = {"status": "Error", "err": "timeout waiting for the state lock"}
+    with patch.object(client, "_request", return_value=failed):
+        with pytest.raises(snap.SnapError, match="state lock"):
+            client._wait("1")
+
+
+def test_change_duration_runs_from_submission():
+    """Test each change's duration runs from when it was submitted, not from the wait."""
+    SnapdClient.reset_stats()
+    client = SnapdClient(opener=MagicMock())
+    submitted = [
+        _response({"type": "async", "change": "1"}),
+        _response({"type": "async", "change": "2"}),
+    ]
+    with (
+        patch.object(client, "_request_raw", side_effect=submitted),
+        patch.object(client, "_request", return_value={"kind": "install-snap", "status": "Done"}),
+        # submitted at 0 and 10, both found done on the first poll at 20
+        patch("snapd_client.time.monotonic", side_effect=[0.0, 10.0, 20.0, 20.0, 20.0]),
+    ):
+        changes = {"first": client.install_async("first", "edge")}
+        changes["second"] = client.install_async("second", "edge")
+        assert client.wait_changes(changes) == {"first": None, "second": None}
+
+    stats = SnapdClient.change_stats["install-snap"]
+    assert (stats.count, stats.total, stats.max) == (2, 30.0, 20.0)
+
+
+@pytest.fixture
+def names_file(tmp_path):
+    """Write a small snapd catalog."""
+    path = tmp_path / "names"
+    path.write_text("core24\nmicroovn\novn-exporter\nsnapd\n")
+    return path
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("core24", True),
+        ("microovn", True),
+        ("snapd", True),
+        ("micro", False),
+        ("ovn", False),
+        ("", False),
+        (None, False),
+    ],
+)
+def test_catalog_lookup(names_file, name, expected):
+    """Test names are matched as whole lines of the catalog."""
+    assert (name in SnapCatalog(str(names_file))) is expected
+
+
+def test_catalog_missing_file(tmp_path):
+    """Test a missing catalog contains nothing."""
+    assert "microovn" not in SnapCatalog(str(tmp_path / "names"))
+
+
+def test_catalog_empty_file(tmp_path):
+    """Test an empty catalog contains nothing."""
+    path = tmp_path / "names"
+    path.write_text("")
+    assert "microovn" not in SnapCatalog(str(path))
+
+
+def test_catalog_loaded_on_first_lookup(names_file):
+    """Test the catalog file is only opened when a name is looked up."""
+    with patch("builtins.open", wraps=open) as mock_open:
+        catalog = SnapCatalog(str(names_file))
+        mock_open.assert_not_called()
+        assert "microovn" in catalog
+        assert "snapd" in catalog
+        mock_open.assert_called_once()
+
+
+@patch("os.path.isfile", return_value=True)
+def test_lazy_snap_cache_loads_installed_only(_, names_file):
+    """Test building the cache lists installed snaps without reading the catalog."""
+    installed = [
+        {
+            "name": "snapd",
+            "channel": "latest/edge",
+            "revision": "1",
+            "confinement": "strict",
+        }
+    ]
+    with (
+        patch("snapd_client.SNAP_NAMES_FILE", str(names_file)),
+        patch.object(SnapdClient, "get_installed_snaps", return_value=installed),
+        patch.object(snap.SnapCache, "_load_available_snaps") as mock_available,
+    ):
+        cache = LazySnapCache()
+
+    mock_available.assert_not_called()
+    assert isinstance(cache._snap_client, SnapdClient)
+    assert cache["snapd"].present
+    assert list(cache) == [cache["snapd"]]
+    assert "snapd" in cache
+    assert "microovn" in cache
+    assert "not-a-snap" not in cache
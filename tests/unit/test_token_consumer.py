@@ -0,0 +1,433 @@
+# Copyright 2026 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Unit tests for the MicroovnTokenConsumer class."""
+
+import json
+import threading
+from subprocess import CompletedProcess
+from unittest.mock import patch
+
+import ops
+import pytest
+from ops import testing
+
+from charm import MicroovnCharm
+from command_runner import CommandRunner
+from constants import WORKER_RELATION
+
+
+@pytest.fixture(autouse=True)
+def mock_cluster_status():
+    """Mock the cluster status query, leaving every service change to microovn."""
+    with patch("utils._query_cluster_status", return_value=None) as mock:
+        yield mock
+
+
+def test_token_consumer_uses_command_runner(tmp_path):
+    """Test the cluster commands of the token consumer run with a timeout, capturing output."""
+    members = [{"name": "member", "role": "voter", "status": "ONLINE"}]
+    microovn = tmp_path / "microovn"
+    microovn.write_text(
+        "#!/bin/sh\n"
+        f"[ \"$2\" = list ] && echo '{json.dumps(members)}' && exit 0\n"
+        'echo "token-$3"\n'
+    )
+    microovn.chmod(0o755)
+
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(ctx.on.start(), testing.State()) as manager:
+        consumer = manager.charm.token_consumer
+        consumer.command_name = [str(microovn), "cluster"]
+
+        assert consumer._cluster_membership().communicator == "member"
+        assert consumer._generate_tokens(["new-unit"]) == {"new-unit": "token-new-unit"}
+        assert "microovn cluster list" in CommandRunner.latencies
+
+
+class FakeCluster:
+    """Answer the token consumer's cluster commands, recording them."""
+
+    def __init__(self, members):
+        self.members = members
+        self.calls = []
+
+    def __call__(self, args, **kwargs):
+        command = list(args[2:])
+        self.calls.append(command)
+        if command[0] == "list":
+            return CompletedProcess(args, 0, json.dumps(self.members), "")
+        if command[0] == "add":
+            self.members.append({"name": command[1], "role": "PENDING", "status": "ONLINE"})
+            return CompletedProcess(args, 0, f"token-{command[1]}\n", "")
+        return CompletedProcess(args, 0, "", "")
+
+    def count(self, command):
+        return sum(1 for call in self.calls if call[0] == command)
+
+
+def _cluster_relation(**mirror_data):
+    return testing.Relation(
+        endpoint=WORKER_RELATION,
+        remote_units_data={0: {"mirror": "up", **mirror_data}},
+    )
+
+
+def test_token_consumer_lists_cluster_once_per_hook(monkeypatch):
+    """Test the pending wait, the election and the tokens share one membership listing."""
+    relation = _cluster_relation(**{"mirror-new-unit": "empty", "mirror-member": "empty"})
+    cluster = FakeCluster(
+        [
+            {"name": "member", "role": "voter", "status": "ONLINE"},
+            {"name": "other", "role": "voter", "status": "ONLINE"},
+        ]
+    )
+    monkeypatch.setattr(CommandRunner, "run", cluster)
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch(
+            "token_consumer.get_hostname",
+            return_value="member",
+        ),
+        ctx(ctx.on.start(), testing.State(relations=[relation])) as manager,
+    ):
+        manager.charm.unit.status = ops.ActiveStatus()
+        consumer = manager.charm.token_consumer
+        consumer._stored.in_cluster = True
+
+        consumer._handle_mirror(manager.charm.model.get_relation(WORKER_RELATION))
+        local_data = manager.charm.model.get_relation(WORKER_RELATION).data[manager.charm.unit]
+
+        assert cluster.count("list") == 1
+        # Only the unit that is not a member yet gets a token.
+        assert cluster.calls[1:] == [["add", "new-unit"]]
+        assert local_data["mirror-new-unit"] == "token-new-unit"
+        assert "mirror-member" not in local_data
+
+
+def test_token_consumer_lists_again_after_mutation(monkeypatch):
+    """Test the membership is listed again once a cluster command changed it."""
+    cluster = FakeCluster([{"name": "member", "role": "voter", "status": "ONLINE"}])
+    monkeypatch.setattr(CommandRunner, "run", cluster)
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(ctx.on.start(), testing.State()) as manager:
+        consumer = manager.charm.token_consumer
+
+        assert consumer._cluster_membership().communicator == "member"
+        assert consumer._cluster_membership() is consumer._cluster_membership()
+        consumer._call_cluster_command("add", "new-unit")
+        membership = consumer._cluster_membership()
+
+    assert cluster.count("list") == 2
+    assert membership.pending
+    assert membership.names(role="PENDING") == ["new-unit"]
+
+
+def test_cluster_commands_invalidate_command_cache(monkeypatch):
+    """Test cluster list is memoized, and other cluster commands drop it and the cluster status."""
+    cluster = FakeCluster([{"name": "member", "role": "voter", "status": "ONLINE"}])
+    monkeypatch.setattr(CommandRunner, "run", cluster)
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch("utils.invalidate_cluster_status") as invalidate_cluster_status,
+        ctx(ctx.on.start(), testing.State()) as manager,
+    ):
+        consumer = manager.charm.token_consumer
+        consumer._call_cluster_command("list", "-f", "json")
+        consumer._call_cluster_command("list", "-f", "json")
+        invalidate_cluster_status.reset_mock()
+
+        consumer._call_cluster_command("add", "new-unit")
+        invalidate_cluster_status.assert_called_once()
+        consumer._call_cluster_command("list", "-f", "json")
+
+    assert cluster.count("list") == 2
+
+
+class FakeClock:
+    """Stand in for the time module of the token consumer, sleeping instantly."""
+
+    def __init__(self, on_sleep=None):
+        self.now = 1000.0
+        self.sleeps = []
+        self.on_sleep = on_sleep
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        if self.on_sleep is not None:
+            self.on_sleep()
+
+
+VOTER = {"name": "member", "role": "voter", "status": "ONLINE"}
+JOINER = {"name": "joiner", "role": "PENDING", "status": "ONLINE"}
+
+
+def _wait_for_pending(cluster, clock, **stored):
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch("token_consumer.time", clock),
+        patch.object(CommandRunner, "run", cluster),
+        ctx(ctx.on.start(), testing.State()) as manager,
+    ):
+        manager.charm.unit.status = ops.ActiveStatus()
+        consumer = manager.charm.token_consumer
+        for key, value in stored.items():
+            setattr(consumer._stored, key, value)
+        waited = consumer._wait_for_pending()
+        return waited, consumer._stored.pending_wait, manager.charm.unit.status
+
+
+def test_wait_for_pending_backs_off_until_joined():
+    """Test pending members are waited for with a growing delay until they join."""
+    cluster = FakeCluster([VOTER, dict(JOINER)])
+
+    def joined():
+        if len(clock.sleeps) == 3:
+            cluster.members[1]["role"] = "voter"
+
+    clock = FakeClock(joined)
+    waited, pending_wait, status = _wait_for_pending(cluster, clock)
+
+    assert waited
+    assert not pending_wait
+    assert clock.sleeps == [0.5, 1, 2]
+    assert status == ops.ActiveStatus()
+
+
+def test_wait_for_pending_deferred_at_deadline():
+    """Test a member still pending at the deadline defers the wait rather than blocking."""
+    clock = FakeClock()
+    waited, pending_wait, status = _wait_for_pending(FakeCluster([VOTER, JOINER]), clock)
+
+    assert not waited
+    assert pending_wait
+    assert sum(clock.sleeps) == 60
+    assert max(clock.sleeps) == 8
+    assert status == ops.WaitingStatus("Waiting on pending nodes: joiner (60s)")
+
+
+def test_wait_for_pending_skips_stuck_members():
+    """Test a member pending since earlier hooks for longer than the wait is not waited on."""
+    clock = FakeClock()
+    waited, pending_wait, status = _wait_for_pending(
+        FakeCluster([VOTER, JOINER]), clock, pending_since={"joiner": clock.now - 300}
+    )
+
+    assert waited
+    assert not pending_wait
+    assert clock.sleeps == []
+    assert status == ops.ActiveStatus()
+
+
+def test_wait_for_pending_waits_on_others_than_stuck_members():
+    """Test the members that are not stuck are still waited for."""
+    cluster = FakeCluster([VOTER, JOINER, {**JOINER, "name": "late-joiner"}])
+
+    def joined():
+        cluster.members[2]["role"] = "voter"
+
+    clock = FakeClock(joined)
+    waited, pending_wait, status = _wait_for_pending(
+        cluster, clock, pending_since={"joiner": clock.now - 300}
+    )
+
+    assert waited
+    assert not pending_wait
+    assert clock.sleeps == [0.5]
+    assert status == ops.ActiveStatus()
+
+
+def test_update_status_reports_pending_wait(monkeypatch):
+    """Test update-status reports the token work left waiting on pending nodes."""
+    cluster = FakeCluster([VOTER, JOINER])
+    monkeypatch.setattr(CommandRunner, "run", cluster)
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch("token_consumer.time", FakeClock()),
+        ctx(ctx.on.update_status(), testing.State(relations=[_cluster_relation()])) as manager,
+    ):
+        consumer = manager.charm.token_consumer
+        consumer._stored.in_cluster = True
+        consumer._stored.pending_wait = True
+
+    assert consumer._stored.pending_wait
+    assert manager.charm.unit.status == ops.WaitingStatus(
+        "Waiting on pending nodes to join the cluster"
+    )
+
+
+def test_update_status_resumes_pending_work(monkeypatch):
+    """Test the mirror work left by a pending wait is done on update-status."""
+    relation = _cluster_relation(**{"mirror-new-unit": "empty"})
+    cluster = FakeCluster([VOTER])
+    monkeypatch.setattr(CommandRunner, "run", cluster)
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch(
+            "token_consumer.get_hostname",
+            return_value="member",
+        ),
+        ctx(ctx.on.start(), testing.State(relations=[relation])) as manager,
+    ):
+        manager.charm.unit.status = ops.ActiveStatus()
+        consumer = manager.charm.token_consumer
+        consumer._stored.in_cluster = True
+        consumer._stored.pending_wait = True
+
+        consumer._on_update_status(None)
+
+        assert not consumer._stored.pending_wait
+        assert ["add", "new-unit"] in cluster.calls
+
+
+def test_tokens_generated_concurrently_and_written_at_once(monkeypatch):
+    """Test a bulk scale out generates tokens in parallel and adds them to the mirror at once."""
+    hostnames = [f"new-unit-{i}" for i in range(20)]
+    relation = _cluster_relation(**{f"mirror-{hostname}": "empty" for hostname in hostnames})
+    cluster = FakeCluster([VOTER])
+    running = []
+    overlapped = threading.Event()
+
+    def slow_add(args, **kwargs):
+        running.append(args)
+        if len(running) > 1:
+            overlapped.set()
+        overlapped.wait(timeout=1)
+        result = cluster(args)
+        running.remove(args)
+        return result
+
+    monkeypatch.setattr(CommandRunner, "run", slow_add)
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(ctx.on.start(), testing.State(relations=[relation])) as manager:
+        consumer = manager.charm.token_consumer
+        relation = manager.charm.model.get_relation(WORKER_RELATION)
+        with (
+            patch.object(consumer, "add_to_mirror", wraps=consumer.add_to_mirror) as add_to_mirror,
+            patch.object(consumer.on, "token_generated") as token_generated,
+        ):
+            assert consumer._update_tokens(relation)
+
+        local_data = relation.data[manager.charm.unit]
+        assert all(local_data[f"mirror-{h}"] == f"token-{h}" for h in hostnames)
+
+    assert overlapped.is_set()
+    add_to_mirror.assert_called_once()
+    assert token_generated.emit.call_count == len(hostnames)
+
+
+def test_failed_tokens_left_out(monkeypatch):
+    """Test a hostname whose token failed is left for a later hook."""
+    relation = _cluster_relation(**{"mirror-good": "empty", "mirror-bad": "empty"})
+    cluster = FakeCluster([VOTER])
+
+    def add(args, **kwargs):
+        if args[-1] == "bad":
+            return CompletedProcess(args, 1, "", "Error: failed")
+        return cluster(args)
+
+    monkeypatch.setattr(CommandRunner, "run", add)
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(ctx.on.start(), testing.State(relations=[relation])) as manager:
+        consumer = manager.charm.token_consumer
+
+        relation = manager.charm.model.get_relation(WORKER_RELATION)
+        assert consumer._update_tokens(relation)
+        local_data = relation.data[manager.charm.unit]
+
+        assert local_data["mirror-good"] == "token-good"
+        assert "mirror-bad" not in local_data
+
+
+def test_mirror_index():
+    """Test the mirror index corroborates the up mirrors and tracks empty and local keys."""
+    relation = testing.Relation(
+        endpoint=WORKER_RELATION,
+        remote_units_data={
+            0: {"mirror": "up", "mirror-a": "token-a", "mirror-b": "empty", "mirror-c": "empty"},
+            1: {"mirror": "up", "mirror-a": "token-a", "mirror-b": "empty", "mirror-d": "x"},
+            2: {"mirror": "up", "mirror-a": "stale", "mirror-b": "token-b"},
+            3: {"mirror": "down", "mirror-e": "token-e"},
+        },
+        local_unit_data={"mirror-c": "token-c", "mirror-b": "empty", "hostname": "host"},
+    )
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(ctx.on.start(), testing.State(relations=[relation])) as manager:
+        consumer = manager.charm.token_consumer
+        relation = manager.charm.model.get_relation(WORKER_RELATION)
+        index = consumer.mirror_index(relation)
+
+        assert sorted(unit.name for unit in index.mirrors) == [
+            "remote/0",
+            "remote/1",
+            "remote/2",
+        ]
+        assert dict(index.values) == {"a": "token-a", "b": "token-b", "c": "empty", "d": "x"}
+        assert index.empty == {"c"}
+        assert index.local_keys == {"b", "c"}
+        assert index.local_only == {"c"}
+        assert index.any_data
+        assert consumer.find_value(relation, "c") == "empty"
+        assert consumer.find_value(relation, "c", keep_empty=False) is False
+        assert consumer.find_value(relation, "e") is False
+        assert consumer.get_relevant_mirror_data(relation, keep_empty=False) == {
+            "a": "token-a",
+            "b": "token-b",
+            "d": "x",
+        }
+        assert consumer.mirror_index(relation) is index
+        with pytest.raises(AttributeError):
+            index.any_data = False
+
+        consumer.add_to_mirror(relation, {"d": "y"})
+        assert consumer.mirror_index(relation) is not index
+        assert "d" in consumer.mirror_index(relation).local_keys
+
+
+def test_mirror_index_without_data():
+    """Test only non empty remote values count as data, even outside the up mirrors."""
+    relation = testing.Relation(
+        endpoint=WORKER_RELATION,
+        remote_units_data={0: {"mirror": "up", "mirror-a": "empty"}, 1: {"mirror-b": "token"}},
+    )
+    ctx = testing.Context(MicroovnCharm)
+    with ctx(ctx.on.start(), testing.State(relations=[relation])) as manager:
+        consumer = manager.charm.token_consumer
+        relation = manager.charm.model.get_relation(WORKER_RELATION)
+
+        assert consumer.any_data_exists(relation)
+        assert consumer.mirror_index(relation).empty == {"a"}
+
+
+def test_add_to_mirror_writes_once():
+    """Test mirrored data is written in one relation-set."""
+    relation = testing.Relation(endpoint=WORKER_RELATION, local_unit_data={"mirror-a": "token-a"})
+    ctx = testing.Context(MicroovnCharm)
+    with (
+        patch.object(
+            ops.RelationDataContent,
+            "update",
+            autospec=True,
+            side_effect=ops.RelationDataContent.update,
+        ) as mock_update,
+        ctx(ctx.on.start(), testing.State(relations=[relation])) as manager,
+    ):
+        manager.charm.token_consumer.add_to_mirror(
+            manager.charm.model.get_relation(WORKER_RELATION),
+            {"a": "token-a", "b": "token-b", "c": "token-c"},
+        )
+        state = manager.run()
+
+    mock_update.assert_called_once()
+    assert state.get_relation(relation.id).local_unit_data == {
+        "mirror-a": "token-a",
+        "mirror-b": "token-b",
+        "mirror-c": "token-c",
+    }
@@ -3,18 +3,45 @@
 
 """Unit tests for the utilities in utils.py."""
 
+import http.server
+import socket
+import threading
+import time
+from subprocess import CompletedProcess
 from unittest.mock import MagicMock, patch
 
 import pytest
-from requests.exceptions import RequestException
 
+from command_runner import CommandRunner
+from microovn_client import ClusterMember, MicroovnAPIError, ServiceLocation
 from utils import (
+    CommandCache,
+    ProbeRunner,
     call_microovn_command,
+    call_ovs_vsctl,
     check_metrics_endpoint,
+    cluster_status,
     microovn_central_exists,
     wait_for_microovn_ready,
 )
 
+STATUS = """MicroOVN deployment summary:
+- node1 (10.0.0.1)
+  Services: central, chassis, switch
+- node2 (10.0.0.2)
+  Services: chassis, switch
+"""
+
+
+@pytest.fixture(autouse=True)
+def fresh_command_cache():
+    """Drop the commands, cluster status and latencies kept by the previous test."""
+    CommandCache.reset()
+    CommandRunner.reset()
+    yield
+    CommandCache.reset()
+    CommandRunner.reset()
+
 
 @pytest.fixture
 def mock_subprocess_run():
@@ -24,10 +51,56 @@ def mock_subprocess_run():
 
 
 @pytest.fixture
-def mock_requests_get():
-    """Mock requests.get."""
-    with patch("utils.requests.get") as mock_get:
-        yield mock_get
+def mock_microovn_client():
+    """Mock the MicroOVN REST client, with its control socket present."""
+    with patch("utils.MicroovnClient") as mock_client:
+        mock_client.return_value.available = True
+        yield mock_client.return_value
+
+
+def test_call_microovn_command_over_api(mock_subprocess_run, mock_microovn_client):
+    """Test commands covered by the REST client do not fork the CLI."""
+    mock_microovn_client.run_command.return_value = CompletedProcess(["status"], 0, "summary", "")
+
+    res = call_microovn_command("status")
+
+    mock_microovn_client.run_command.assert_called_once_with(("status",), None)
+    mock_subprocess_run.assert_not_called()
+    assert res.stdout == "summary"
+
+
+@pytest.mark.parametrize("status", [400, 500])
+def test_call_microovn_command_api_error(mock_subprocess_run, mock_microovn_client, status):
+    """Test daemon errors are returned like a failed CLI call, not run again by it."""
+    mock_microovn_client.run_command.side_effect = MicroovnAPIError(
+        status, "this service is not enabled"
+    )
+
+    res = call_microovn_command("disable", "central")
+
+    mock_subprocess_run.assert_not_called()
+    assert res.returncode == 1
+    assert "this service is not enabled" in res.stderr
+
+
+@pytest.mark.parametrize(
+    "api_result",
+    [None, MicroovnAPIError(404, "not found")],
+)
+def test_call_microovn_command_falls_back_to_cli(
+    mock_subprocess_run, mock_microovn_client, api_result
+):
+    """Test commands not covered or not implemented by the daemon use the CLI."""
+    if isinstance(api_result, Exception):
+        mock_microovn_client.run_command.side_effect = api_result
+    else:
+        mock_microovn_client.run_command.return_value = api_result
+    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout="cli")
+
+    res = call_microovn_command("cluster", "list")
+
+    mock_subprocess_run.assert_called_once()
+    assert res.stdout == "cli"
 
 
 def test_call_microovn_command_success(mock_subprocess_run):
@@ -37,6 +110,7 @@ def test_call_microovn_command_success(mock_subprocess_run):
 
     mock_subprocess_run.assert_called_once_with(
         ["microovn", "status"],
+        timeout=120.0,
         stdout=-1,
         stderr=-1,
         input=None,
@@ -93,61 +167,132 @@ def test_call_microovn_command_no_args(mock_subprocess_run):
     assert res.returncode == 0
 
 
-def test_wait_for_microovn_ready_success(mock_subprocess_run):
+def test_wait_for_microovn_ready_success(mock_subprocess_run, mock_microovn_client):
     """Test wait_for_microovn_ready when microovn is immediately ready."""
-    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout="")
+    mock_microovn_client.ready.return_value = True
 
     result = wait_for_microovn_ready()
 
     assert result is True
-    mock_subprocess_run.assert_called_once()
+    mock_microovn_client.ready.assert_called_once()
+    mock_subprocess_run.assert_not_called()
+    assert len(CommandRunner.latencies["microovn time-to-ready"]) == 1
 
 
-def test_wait_for_microovn_ready_failure(mock_subprocess_run):
-    """Test wait_for_microovn_ready when retries are exhausted."""
-    mock_subprocess_run.return_value = MagicMock(returncode=1, stdout="not ready")
+def test_wait_for_microovn_ready_becomes_ready(mock_subprocess_run, mock_microovn_client):
+    """Test readiness is checked again until the daemon is ready."""
+    mock_microovn_client.ready.side_effect = [False, False, True]
 
-    result = wait_for_microovn_ready()
+    assert wait_for_microovn_ready(timeout=5) is True
+    assert mock_microovn_client.ready.call_count == 3
+
+
+def test_wait_for_microovn_ready_failure(mock_subprocess_run, mock_microovn_client):
+    """Test wait_for_microovn_ready when the deadline passes."""
+    mock_microovn_client.ready.return_value = False
+
+    start = time.monotonic()
+    result = wait_for_microovn_ready(timeout=0.5)
 
     assert result is False
-    assert mock_subprocess_run.call_count == 10
+    assert time.monotonic() - start < 1
+    assert "microovn time-to-ready" not in CommandRunner.latencies
 
 
-def test_check_metrics_endpoint_success():
-    """Test successful metrics endpoint check."""
-    url = "http://example.com/metrics"
-    with patch("utils.requests.get") as mock_get:
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
+def test_wait_for_microovn_ready_no_socket(mock_subprocess_run, mock_microovn_client):
+    """Test nothing is asked before the daemon created its control socket."""
+    mock_microovn_client.available = False
+
+    assert wait_for_microovn_ready(timeout=0.3) is False
+    mock_microovn_client.ready.assert_not_called()
+    mock_subprocess_run.assert_not_called()
+
+
+def test_wait_for_microovn_ready_cli(mock_subprocess_run, mock_microovn_client):
+    """Test the CLI waits for older daemons without a readiness endpoint."""
+    mock_microovn_client.ready.side_effect = MicroovnAPIError(404, "not found")
+    mock_microovn_client.run_command.return_value = None
+    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout="")
+
+    assert wait_for_microovn_ready() is True
+    assert mock_subprocess_run.call_args[0][0] == ["microovn", "waitready"]
 
-        result = check_metrics_endpoint(url)
-        assert result is True
+
+@pytest.fixture
+def metrics_server():
+    """Serve a metrics exposition from a local HTTP server."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        status = 200
+        body = b"# HELP go_goroutines Goroutines.\ngo_goroutines 8\novn_northd_status 1\n"
+        requests = 0
+
+        def do_GET(self):  # noqa: N802
+            Handler.requests += 1
+            self.send_response(self.status)
+            self.send_header("Content-Length", str(len(self.body)))
+            self.end_headers()
+            self.wfile.write(self.body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+    server.handler = Handler
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_check_metrics_endpoint_success(metrics_server):
+    """Test successful metrics endpoint check."""
+    assert check_metrics_endpoint(metrics_server.url) is True
+    assert metrics_server.handler.requests == 1
 
 
-def test_check_metrics_endpoint_failure():
+def test_check_metrics_endpoint_failure(metrics_server):
     """Test failed metrics endpoint check."""
-    url = "http://example.com/metrics"
-    with patch("utils.requests.get") as mock_get:
-        mock_response = MagicMock()
-        mock_response.status_code = 500
-        mock_get.return_value = mock_response
+    metrics_server.handler.status = 500
+
+    start = time.monotonic()
+    result = check_metrics_endpoint(metrics_server.url, deadline=1)
+
+    assert result is False
+    assert time.monotonic() - start < 1.5
+    assert metrics_server.handler.requests > 1
 
-        result = check_metrics_endpoint(url)
-        assert result is False
+
+def test_check_metrics_endpoint_no_ovn_metrics(metrics_server):
+    """Test an exporter serving no OVN metrics fails the check."""
+    metrics_server.handler.body = b"go_goroutines 8\n"
+
+    assert check_metrics_endpoint(metrics_server.url, deadline=0.5) is False
+
+
+def test_check_metrics_endpoint_reads_bounded_prefix(metrics_server):
+    """Test the OVN metrics have to show up early in the exposition."""
+    metrics_server.handler.body = b"go_x 1\n" * 10_000 + b"ovn_northd_status 1\n"
+
+    with patch("utils.METRICS_PROBE_MAX_BYTES", 1024):
+        assert check_metrics_endpoint(metrics_server.url, deadline=0.5) is False
+    assert check_metrics_endpoint(metrics_server.url, deadline=0.5) is True
 
 
 def test_check_metrics_endpoint_exception():
     """Test metrics endpoint check with exception."""
-    url = "http://example.com/metrics"
-    with patch("utils.requests.get", side_effect=RequestException("Network error")):
-        result = check_metrics_endpoint(url)
-        assert result is False
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{sock.getsockname()[1]}/metrics"
+
+    assert check_metrics_endpoint(url, deadline=0.5) is False
 
 
 def test_microovn_central_exists_success(mock_subprocess_run):
     """Test microovn_central_exists when central node exists."""
-    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout="node1\ncentral\nnode2")
+    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout=STATUS)
 
     result = microovn_central_exists()
     assert result is True
@@ -155,7 +300,9 @@ def test_microovn_central_exists_success(mock_subprocess_run):
 
 def test_microovn_central_exists_no_central(mock_subprocess_run):
     """Test microovn_central_exists when no central node exists."""
-    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout="node1\nnode2")
+    mock_subprocess_run.return_value = MagicMock(
+        returncode=0, stdout=STATUS.replace("central, ", "")
+    )
 
     result = microovn_central_exists()
     assert result is False
@@ -167,3 +314,182 @@ def test_microovn_central_exists_failure(mock_subprocess_run):
 
     result = microovn_central_exists()
     assert result is False
+
+
+def test_microovn_central_exists_hostname(mock_subprocess_run):
+    """Test a member named after central is not taken for a central node."""
+    mock_subprocess_run.return_value = MagicMock(
+        returncode=0,
+        stdout="MicroOVN deployment summary:\n- central-1 (10.0.0.1)\n  Services: chassis\n",
+    )
+
+    assert microovn_central_exists() is False
+
+
+def test_microovn_central_exists_timeout_not_memoized(mock_subprocess_run):
+    """Test a probe with a timeout leaves the memoized status and commands alone."""
+    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout=STATUS)
+
+    assert microovn_central_exists(timeout=5) is True
+    assert microovn_central_exists(timeout=5) is True
+    assert mock_subprocess_run.call_count == 2
+    assert mock_subprocess_run.call_args.kwargs["timeout"] == 5
+    assert CommandCache.misses == {}
+
+    cluster_status()
+    assert mock_subprocess_run.call_count == 3
+
+
+def test_cluster_status_memoized(mock_subprocess_run):
+    """Test the status is queried once and shared until a command changes it."""
+    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout=STATUS)
+
+    assert cluster_status() is cluster_status()
+    assert mock_subprocess_run.call_count == 1
+
+    call_microovn_command("disable", "central")
+    cluster_status()
+    assert mock_subprocess_run.call_count == 3
+
+
+def test_cluster_status_failure_not_memoized(mock_subprocess_run):
+    """Test a failed status query is tried again by the next caller."""
+    mock_subprocess_run.return_value = MagicMock(returncode=1, stdout="", stderr="error")
+
+    assert cluster_status() is None
+    assert cluster_status() is None
+    assert mock_subprocess_run.call_count == 2
+
+
+def test_cluster_status_over_api(mock_subprocess_run, mock_microovn_client):
+    """Test the status is built from the daemon's members and services."""
+    mock_microovn_client.cluster_members.return_value = [
+        ClusterMember("node1", "10.0.0.1:6443", "voter", "ONLINE"),
+        ClusterMember("node2", "10.0.0.2:6443", "voter", "OFFLINE"),
+    ]
+    mock_microovn_client.services.return_value = [ServiceLocation("central", "node1")]
+
+    status = cluster_status()
+
+    mock_subprocess_run.assert_not_called()
+    assert status is not None
+    assert status.members_with("central") == ["node1"]
+    assert [member.online for member in status.members] == [True, False]
+
+
+def test_cluster_status_api_unsupported(mock_subprocess_run, mock_microovn_client):
+    """Test the CLI summary is parsed when the daemon lacks the endpoints."""
+    mock_microovn_client.cluster_members.side_effect = MicroovnAPIError(404, "not found")
+    mock_microovn_client.run_command.return_value = None
+    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout=STATUS)
+
+    status = cluster_status()
+
+    assert status is not None
+    assert status.members_with("central") == ["node1"]
+
+
+def test_read_only_commands_memoized(mock_subprocess_run):
+    """Test read-only commands run once until a mutating command is run."""
+    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout="value")
+
+    call_microovn_command("config", "get", "ovn.central-ips")
+    call_microovn_command("config", "get", "ovn.central-ips")
+    call_ovs_vsctl("get", "open_vswitch", ".", "external-ids:ovn-cms-options")
+    call_ovs_vsctl("get", "open_vswitch", ".", "external-ids:ovn-cms-options")
+    assert mock_subprocess_run.call_count == 2
+
+    call_ovs_vsctl("set", "open_vswitch", ".", "external-ids:ovn-cms-options=x")
+    call_microovn_command("config", "get", "ovn.central-ips")
+    call_ovs_vsctl("get", "open_vswitch", ".", "external-ids:ovn-cms-options")
+    assert mock_subprocess_run.call_count == 5
+
+    assert CommandCache.hits == {"microovn config get": 1, "microovn.ovs-vsctl get": 1}
+    assert CommandCache.misses == {"microovn config get": 2, "microovn.ovs-vsctl get": 2}
+
+
+def test_failed_read_only_command_not_memoized(mock_subprocess_run):
+    """Test a failed read-only command is run again."""
+    mock_subprocess_run.return_value = MagicMock(returncode=1, stdout="", stderr="no key")
+
+    call_ovs_vsctl("get", "open_vswitch", ".", "external-ids:ovn-cms-options")
+    call_ovs_vsctl("get", "open_vswitch", ".", "external-ids:ovn-cms-options")
+
+    assert mock_subprocess_run.call_count == 2
+
+
+def test_waitready_keeps_memoized_commands(mock_subprocess_run):
+    """Test waiting for the daemon does not drop the memoized results."""
+    mock_subprocess_run.return_value = MagicMock(returncode=0, stdout=STATUS)
+
+    call_microovn_command("status")
+    call_microovn_command("waitready")
+    call_microovn_command("status")
+
+    assert mock_subprocess_run.call_count == 2
+
+
+def test_command_cache_log_stats():
+    """Test the hit and miss counts are logged per command."""
+    CommandCache.hits = {"microovn status": 2}
+    CommandCache.misses = {"microovn status": 1, "microovn.ovs-vsctl get": 1}
+
+    with patch("utils.logger") as mock_logger:
+        CommandCache.log_stats()
+
+    assert [call.args[1:] for call in mock_logger.info.call_args_list] == [
+        ("microovn status", 2, 1),
+        ("microovn.ovs-vsctl get", 0, 1),
+    ]
+
+
+def test_probe_runner_concurrent():
+    """Test probes run at the same time and their results are gathered."""
+    # Each probe only finishes once the other one is running too.
+    both_running = threading.Barrier(2, timeout=5)
+    probes = ProbeRunner(10)
+    probes.start("passing", lambda: both_running.wait() is not None)
+    probes.start("failing", lambda: both_running.wait() is None)
+
+    assert probes.result("passing") is True
+    assert probes.result("failing") is False
+
+
+def test_probe_runner_deadline():
+    """Test a probe still running at its deadline is given up on."""
+    release = threading.Event()
+    probes = ProbeRunner(0.1)
+    probes.start("hung", lambda: release.wait(5))
+
+    try:
+        assert probes.result("hung") is None
+    finally:
+        release.set()
+
+
+def test_probe_runner_one_deadline():
+    """Test the deadline runs from when the runner is made, not from when each probe starts."""
+    release = threading.Event()
+    probes = ProbeRunner(0.2)
+    probes.start("first", lambda: True)
+    time.sleep(0.3)
+    probes.start("late", lambda: release.wait(5))
+
+    assert probes.remaining() == 0
+    try:
+        assert probes.result("first") is True
+        assert probes.result("late") is None
+    finally:
+        release.set()
+
+
+def test_probe_runner_exception():
+    """Test a probe raising counts as failed."""
+    probes = ProbeRunner(5)
+
+    def probe() -> bool:
+        raise RuntimeError("boom")
+
+    probes.start("raising", probe)
+
+    assert probes.result("raising") is False